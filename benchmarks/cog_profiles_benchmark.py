@@ -0,0 +1,155 @@
+"""
+COG encoding profile benchmark.
+
+Encodes one raster with each configured COG profile (configs/cog_profiles.json)
+and records encode time, throughput (uncompressed MB/s), output size and
+compression ratio, so codecs, predictors and thread counts can be compared on
+the same input. Uses a synthetic Sentinel-2-like band unless --input is given.
+With --concurrent N, N encodes run at once (as the pipeline's encode workers
+do) and share the CPUs between their GDAL threads.
+
+Usage (from the repository root):
+    python -m benchmarks.cog_profiles_benchmark --tile-px 4096 --threads 1,ALL_CPUS --output cog.json
+    python -m benchmarks.cog_profiles_benchmark --input scene_B04.tif --profiles deflate,zstd
+    python -m benchmarks.cog_profiles_benchmark --profiles deflate --concurrent 4
+    python -m benchmarks.cog_profiles_benchmark --baseline cog.json  # exits 1 on a regression
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from benchmarks.harness import BenchmarkRecorder, compare_with_baseline
+from benchmarks.standins import reset_dir
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default=None, help="Raster to encode (defaults to a synthetic uint16 band)")
+    parser.add_argument("--tile-px", type=int, default=4096, help="Size of the synthetic band in pixels")
+    parser.add_argument("--profiles", default=None, help="Comma-separated profile names (defaults to all configured)")
+    parser.add_argument("--threads", default=None, help="Comma-separated thread counts to run each profile with, e.g. 1,4,ALL_CPUS (defaults to the profile's own)")
+    parser.add_argument("--repeat", type=int, default=1, help="Encodes per profile; the stage reports the total")
+    parser.add_argument("--concurrent", type=int, default=1, help="Encodes running at once per repeat")
+    parser.add_argument("--workdir", default=None, help="Working directory (defaults to a temp dir)")
+    parser.add_argument("--output", default=None, help="Write results as JSON to this path")
+    parser.add_argument("--baseline", default=None, help="Previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown vs. baseline (fraction)")
+    return parser.parse_args(argv)
+
+
+def make_input(workdir: str, tile_px: int) -> str:
+    from rasterio.transform import from_origin
+
+    from benchmarks.synthetic import write_synthetic_cog
+
+    path = os.path.join(workdir, "input", "synthetic_B04.tif")
+    write_synthetic_cog(path, tile_px, tile_px, from_origin(300000, 5000000, 10, 10), "EPSG:32632")
+    return path
+
+
+def run(args: argparse.Namespace, workdir: str, recorder: BenchmarkRecorder) -> None:
+    from concurrent.futures import ThreadPoolExecutor
+
+    import numpy as np
+    import rasterio
+
+    from src.data_ingestion.geodata.cog_encoding import MemoryBudget, translate_to_cog
+    from src.data_ingestion.geodata.cog_profiles import load_cog_profiles, resolve_num_threads
+
+    profiles = load_cog_profiles()["profiles"]
+    names = [name.strip() for name in args.profiles.split(",")] if args.profiles else list(profiles)
+    unknown = set(names) - set(profiles)
+    if unknown:
+        raise ValueError(f"Unknown COG profiles {sorted(unknown)}; choose from {sorted(profiles)}")
+    thread_counts = [t.strip() for t in args.threads.split(",")] if args.threads else [None]
+
+    input_path = args.input or make_input(workdir, args.tile_px)
+    with rasterio.open(input_path) as src:
+        reference = src.read()
+    raw_bytes = reference.nbytes
+    print(f"Input {input_path}: {reference.shape}, {reference.dtype}, {raw_bytes / 1024 ** 2:.1f} MB uncompressed")
+
+    output_dir = reset_dir(os.path.join(workdir, "output"))
+    # A generous budget keeps every encode in memory and never makes one wait.
+    budget = MemoryBudget(total_bytes=max(8 * args.concurrent * raw_bytes, 1024 ** 3))
+    encodes = args.repeat * args.concurrent
+    for name in names:
+        for threads in thread_counts:
+            stage = f"encode_{name}" if threads is None else f"encode_{name}_t{threads}"
+            if args.concurrent > 1:
+                stage = f"{stage}_x{args.concurrent}"
+            output_paths = [os.path.join(output_dir, f"{stage}_{i}.tif") for i in range(args.concurrent)]
+            output_path = output_paths[0]
+            profile = {"name": name, **profiles[name]}
+            if threads is not None:
+                profile["num_threads"] = threads
+            with recorder.stage(stage) as m, ThreadPoolExecutor(max_workers=args.concurrent) as executor:
+                for _ in range(args.repeat):
+                    futures = [
+                        executor.submit(translate_to_cog, input_path, path, profile, budget, args.concurrent)
+                        for path in output_paths
+                    ]
+                    for future in futures:
+                        future.result()
+                m["items"] = encodes
+                m["bytes"] = raw_bytes * encodes
+            with rasterio.open(output_path) as dst:
+                m["lossless"] = bool(np.array_equal(dst.read(), reference))
+            m["codec"] = profile["codec"]
+            m["num_threads"] = resolve_num_threads(profile.get("num_threads", 1), args.concurrent)
+            m["output_bytes"] = os.path.getsize(output_path)
+            m["compression_ratio"] = raw_bytes / m["output_bytes"]
+            m["encode_seconds"] = m["seconds"] / encodes
+
+
+def format_sizes(recorder: BenchmarkRecorder) -> str:
+    lines = [f"{'stage':<28} {'codec':<10} {'threads':>8} {'output MB':>10} {'ratio':>7} {'s/encode':>9} {'lossless':>9}"]
+    for name, s in recorder.stages.items():
+        lines.append(
+            f"{name:<28} {s['codec']:<10} {s['num_threads']:>8} {s['output_bytes'] / 1024 ** 2:>10.2f} "
+            f"{s['compression_ratio']:>7.2f} {s['encode_seconds']:>9.3f} {str(s['lossless']):>9}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="cog-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    # Thread counts come from the profiles (or --threads), not from the environment.
+    os.environ.pop("COG_NUM_THREADS", None)
+
+    recorder = BenchmarkRecorder("cog_profiles", config=vars(args))
+    run(args, workdir, recorder)
+
+    print()
+    print(recorder.format_table())
+    print()
+    print(format_sizes(recorder))
+    results = recorder.to_dict()
+    if args.output:
+        recorder.write_json(args.output)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        workload = ("input", "tile_px")
+        if any(baseline.get("config", {}).get(k) != results["config"][k] for k in workload):
+            print("Warning: baseline was run with a different workload; comparisons may not be meaningful.")
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
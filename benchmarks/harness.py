@@ -0,0 +1,146 @@
+import json
+import os
+import platform
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+MiB = 1024 * 1024
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # ru_maxrss is in KiB on Linux and bytes on macOS; only the peak is available.
+        scale = 1 if platform.system() == "Darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class RSSSampler:
+    def __init__(self, interval: float = 0.05):
+        """
+        Samples the process RSS in a background thread to find the peak of a stage.
+        """
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+class BenchmarkRecorder:
+    def __init__(self, name: str, config: Optional[Dict] = None):
+        """
+        Collects per-stage measurements of a benchmark run.
+
+        Each stage records its wall time and peak RSS; the stage body fills in the
+        work it did (`items`, `bytes`) and any extra fields, from which items/s and
+        MB/s are derived.
+
+        Args:
+            name (str): Benchmark name.
+            config (dict, optional): Workload settings stored with the results.
+        """
+        self.name = name
+        self.config = config or {}
+        self.stages: Dict[str, Dict] = {}
+        self.started_at = time.time()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Measures one stage.
+
+        Example:
+            with recorder.stage("http_download") as m:
+                m["items"] = len(urls)
+                m["bytes"] = download_all(urls)
+        """
+        metrics: Dict = {"items": 0, "bytes": 0}
+        print(f"[{self.name}] {name} ...")
+        with RSSSampler() as rss:
+            start = time.perf_counter()
+            yield metrics
+            seconds = time.perf_counter() - start
+
+        metrics["seconds"] = seconds
+        metrics["peak_rss_mb"] = rss.peak / MiB
+        metrics["items_per_s"] = metrics["items"] / seconds if seconds > 0 else 0.0
+        metrics["mb_per_s"] = metrics["bytes"] / MiB / seconds if seconds > 0 else 0.0
+        self.stages[name] = metrics
+
+    def to_dict(self) -> Dict:
+        return {
+            "benchmark": self.name,
+            "started_at": self.started_at,
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "config": self.config,
+            "peak_rss_mb": max((s["peak_rss_mb"] for s in self.stages.values()), default=0.0),
+            "stages": self.stages,
+        }
+
+    def write_json(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        print(f"Results written to {path}")
+
+    def format_table(self) -> str:
+        lines = [
+            f"{'stage':<28} {'seconds':>9} {'items':>7} {'items/s':>9} {'MB':>9} {'MB/s':>8} {'peak RSS MB':>12}"
+        ]
+        for name, s in self.stages.items():
+            lines.append(
+                f"{name:<28} {s['seconds']:>9.3f} {s['items']:>7} {s['items_per_s']:>9.2f} "
+                f"{s['bytes'] / MiB:>9.1f} {s['mb_per_s']:>8.1f} {s['peak_rss_mb']:>12.1f}"
+            )
+        return "\n".join(lines)
+
+
+def compare_with_baseline(results: Dict, baseline: Dict, tolerance: float = 0.2) -> List[str]:
+    """
+    Lists the stages that got slower than a previous run by more than `tolerance`.
+
+    Throughput (items/s, else MB/s) is compared when the stage reports work,
+    otherwise wall time.
+
+    Returns:
+        List[str]: One message per regressed stage (empty if none).
+    """
+    regressions = []
+    for name, stage in results["stages"].items():
+        before: Optional[Dict] = baseline.get("stages", {}).get(name)
+        if not before:
+            continue
+        for metric in ("items_per_s", "mb_per_s"):
+            if before.get(metric) and stage.get(metric):
+                if stage[metric] < before[metric] * (1 - tolerance):
+                    regressions.append(
+                        f"{name}: {metric} {stage[metric]:.2f} < baseline {before[metric]:.2f}"
+                    )
+                break
+        else:
+            if before.get("seconds") and stage["seconds"] > before["seconds"] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: {stage['seconds']:.3f}s > baseline {before['seconds']:.3f}s"
+                )
+    return regressions
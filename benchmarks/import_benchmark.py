@@ -0,0 +1,154 @@
+"""
+Import-time benchmark of the ingestion entry points.
+
+Every entry point is imported in a fresh interpreter (`python -X importtime`),
+`--repeats` times, and the median wall time is reported, together with the heavy
+backends the import pulled in and the slowest modules by cumulative import time.
+This is the cold-start cost each Metaflow task pays before doing any work.
+
+Usage (from the repository root):
+    python -m benchmarks.import_benchmark --output imports.json
+    python -m benchmarks.import_benchmark --baseline imports.json  # exits 1 on a regression
+"""
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from benchmarks.harness import BenchmarkRecorder, compare_with_baseline
+
+ENTRY_POINTS = {
+    "flows_utils": "flows_utils",
+    "stac_clients": "src.data_ingestion.stac_clients",
+    "download_utils": "src.data_ingestion.geodata.download_utils",
+    "metadata_manager": "src.data_ingestion.metadata.manager",
+    "ingestion_log": "src.storage.ingestion_log",
+    "postgis_utils": "src.storage.postgis_utils",
+    "sentinel2_flow": "sentinel2_ingestion_flow",
+}
+
+HEAVY_MODULES = [
+    "boto3", "rasterio", "rio_cogeo", "rio_tiler", "pystac_client",
+    "planetary_computer", "pypgstac", "psycopg", "pandas", "google.cloud.storage",
+]
+
+_PROBE = """
+import sys, time
+sys.path[:0] = [{root!r}, {flows!r}]
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print("__RESULT__", elapsed, ",".join(heavy), file=sys.stderr)
+"""
+
+
+def _parse_importtime(stderr: str, top: int, skip: str) -> List[Dict]:
+    """
+    Slowest packages (by cumulative import time) from -X importtime output, other
+    than the probed module's own package and the interpreter start-up modules.
+    """
+    slowest: Dict[str, float] = {}
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \| \s*(\S+)", line)
+        if not match:
+            continue
+        package = match[3].split(".")[0]
+        if package in (skip, "site", "encodings") or package.startswith("_"):
+            continue
+        slowest[package] = max(slowest.get(package, 0.0), int(match[2]) / 1000)
+    rows = [{"module": package, "cumulative_ms": ms} for package, ms in slowest.items()]
+    return sorted(rows, key=lambda r: -r["cumulative_ms"])[:top]
+
+
+def measure(module: str, repeats: int, top: int) -> Dict:
+    """
+    Imports `module` in `repeats` fresh interpreters.
+
+    Returns:
+        Dict: `import_seconds` (median time of the import statement), `process_seconds`
+        (median wall time of the whole interpreter), `heavy_modules` loaded and
+        `slowest_imports` of the last run, or `error` if the import failed.
+    """
+    code = _PROBE.format(
+        root=str(REPO_ROOT), flows=str(REPO_ROOT / "metaflow_flows"), module=module, heavy=HEAVY_MODULES
+    )
+    import_seconds, process_seconds = [], []
+    heavy, slowest = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            capture_output=True, text=True, cwd=str(REPO_ROOT),
+        )
+        process_seconds.append(time.perf_counter() - start)
+        result = [line for line in proc.stderr.splitlines() if line.startswith("__RESULT__")]
+        if proc.returncode != 0 or not result:
+            return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"}
+        _, elapsed, loaded = (result[0].split(" ", 2) + [""])[:3]
+        import_seconds.append(float(elapsed))
+        heavy = [m for m in loaded.split(",") if m]
+        slowest = _parse_importtime(proc.stderr, top, module.split(".")[0])
+
+    return {
+        "import_seconds": statistics.median(import_seconds),
+        "process_seconds": statistics.median(process_seconds),
+        "heavy_modules": heavy,
+        "slowest_imports": slowest,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters per entry point")
+    parser.add_argument("--top", type=int, default=5, help="Slowest imports listed per entry point")
+    parser.add_argument("--entry-points", default=",".join(ENTRY_POINTS), help="Comma-separated entry point names")
+    parser.add_argument("--output", default=None, help="Write results as JSON to this path")
+    parser.add_argument("--baseline", default=None, help="Previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown vs. baseline (fraction)")
+    args = parser.parse_args(argv)
+
+    recorder = BenchmarkRecorder("imports", config=vars(args))
+    for name in [n.strip() for n in args.entry_points.split(",") if n.strip()]:
+        result = measure(ENTRY_POINTS[name], args.repeats, args.top)
+        if "error" in result:
+            print(f"  {name}: skipped ({result['error']})")
+            continue
+        with recorder.stage(name) as m:
+            m.update(result)
+        # The stage time is the measured import, not the time spent launching subprocesses.
+        stage = recorder.stages[name]
+        stage["seconds"] = result["import_seconds"]
+        print(f"  {name}: {result['import_seconds']:.3f}s import, {result['process_seconds']:.3f}s process, "
+              f"heavy: {', '.join(result['heavy_modules']) or '-'}")
+        for row in result["slowest_imports"]:
+            print(f"      {row['cumulative_ms']:>9.1f} ms  {row['module']}")
+
+    print()
+    print(recorder.format_table())
+    results = recorder.to_dict()
+    if args.output:
+        recorder.write_json(args.output)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
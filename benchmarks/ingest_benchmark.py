@@ -0,0 +1,258 @@
+"""
+Offline ingestion benchmark.
+
+Generates synthetic Sentinel-2-like COGs, serves them from a local HTTP server
+(which doubles as a path-style S3 endpoint) behind a fake STAC API, and measures
+each ingestion stage without touching Element84, Planetary Computer or pgSTAC.
+
+Usage (from the repository root):
+    python -m benchmarks.ingest_benchmark --scenes 4 --ports-per-scene 2 --output bench.json
+    python -m benchmarks.ingest_benchmark --baseline bench.json  # exits 1 on a regression
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "metaflow_flows"))
+
+from benchmarks.harness import BenchmarkRecorder, compare_with_baseline
+from benchmarks.standins import FakeSTACAPI, InMemoryPgStacLoader, RangeFileServer, reset_dir
+from benchmarks.synthetic import COLLECTION_ID, SENTINEL2_BANDS, make_port_aois, make_scenes, scene_to_item
+
+DATETIME_RANGE = "2025-01-01T00:00:00Z/2025-12-31T00:00:00Z"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenes", type=int, default=4, help="Number of synthetic scenes")
+    parser.add_argument("--ports-per-scene", type=int, default=2, help="Port AOIs placed in each scene")
+    parser.add_argument("--tile-px", type=int, default=1024, help="Size of the 10 m bands in pixels")
+    parser.add_argument("--assets", default="red,green,blue,rededge1", help="Comma-separated asset keys to ingest")
+    parser.add_argument("--asset-source", choices=["http", "s3"], default="http", help="Where the fake STAC items point")
+    parser.add_argument("--port-aoi-fraction", type=float, default=0.2, help="Port AOI size as a fraction of the scene; larger values make ports overlap")
+    parser.add_argument("--read-modes", default="asset,item,pipeline,coalesce", help="download_items read modes to run end to end")
+    parser.add_argument("--unit-max-assets", type=int, default=60, help="Assets per work unit in the end-to-end stages")
+    parser.add_argument("--search-latency", type=float, default=0.0, help="Artificial latency per STAC search page (s)")
+    parser.add_argument("--pgstac-dsn", default=None, help="Use a real pgSTAC instead of the in-memory stand-in")
+    parser.add_argument("--workdir", default=None, help="Working directory (defaults to a temp dir)")
+    parser.add_argument("--output", default=None, help="Write results as JSON to this path")
+    parser.add_argument("--baseline", default=None, help="Previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown vs. baseline (fraction)")
+    return parser.parse_args(argv)
+
+
+def run(args: argparse.Namespace, workdir: str, recorder: BenchmarkRecorder) -> None:
+    asset_keys = [key.strip() for key in args.assets.split(",")]
+    unknown = set(asset_keys) - set(SENTINEL2_BANDS)
+    if unknown:
+        raise ValueError(f"Unknown asset keys {sorted(unknown)}; choose from {sorted(SENTINEL2_BANDS)}")
+
+    data_dir = reset_dir(os.path.join(workdir, "data"))
+    with recorder.stage("generate_cogs") as m:
+        bands = {key: SENTINEL2_BANDS[key] for key in asset_keys}
+        scenes = make_scenes(data_dir, args.scenes, tile_px=args.tile_px, bands=bands)
+        m["items"] = len(scenes)
+        m["bytes"] = sum(a["size"] for s in scenes for a in s["assets"].values())
+    ports = make_port_aois(scenes, args.ports_per_scene, aoi_fraction=args.port_aoi_fraction)
+
+    with RangeFileServer(data_dir) as files:
+        files.warm_etags()
+        # Route boto3 and GDAL S3 access to the stand-in before any client is created.
+        os.environ.update(files.s3_environment())
+        os.environ["STAC_CACHE_DIR"] = reset_dir(os.path.join(workdir, "stac-cache"))
+        tile_cache_dir = os.path.join(workdir, "tile-cache")
+        os.environ["TILE_CACHE_DIR"] = reset_dir(tile_cache_dir)
+        if args.pgstac_dsn:
+            os.environ["PGSTAC_DSN"] = args.pgstac_dsn
+        else:
+            os.environ.pop("PGSTAC_DSN", None)
+
+        from src.data_ingestion import stac_clients
+        from src.data_ingestion.geodata.download_utils import STACAssetDownloaderUtils
+        from src.data_ingestion.metadata.manager import MetadataManager
+        from src.data_ingestion.stac_clients.element84 import Element84STACClient
+        import flows_utils
+
+        items = [
+            scene_to_item(scene, http_base=files.url, use_s3=args.asset_source == "s3")
+            for scene in scenes
+        ]
+        with FakeSTACAPI(items, COLLECTION_ID, latency_seconds=args.search_latency) as api:
+            client = Element84STACClient(api.url)
+            utils = STACAssetDownloaderUtils()
+
+            with recorder.stage("stac_search") as m:
+                found = {}
+                for port_name, bbox in ports.items():
+                    found[port_name] = client.search(
+                        aoi=bbox, product=COLLECTION_ID, datetime_range=DATETIME_RANGE,
+                        filters=None, max_items=1,
+                    )
+                m["items"] = sum(len(v) for v in found.values())
+                m["requests"] = len(ports)
+
+            with recorder.stage("stac_search_many") as m:
+                found_many = client.search_many(
+                    aois=ports, product=COLLECTION_ID, datetime_range=DATETIME_RANGE,
+                    filters=None, max_items=1,
+                )
+                m["items"] = sum(len(v) for v in found_many.values())
+                m["requests"] = client.last_search_many_stats["searches"]
+
+            scene_assets = [
+                (scene, key, asset) for scene in scenes for key, asset in scene["assets"].items()
+            ]
+
+            http_dir = reset_dir(os.path.join(workdir, "http"))
+            with recorder.stage("http_download") as m:
+                for scene, key, asset in scene_assets:
+                    utils._download_http(
+                        f"{files.url}/{asset['path']}", os.path.join(http_dir, f"{scene['id']}_{key}.tif")
+                    )
+                m["items"] = len(scene_assets)
+                m["bytes"] = sum(asset["size"] for _, _, asset in scene_assets)
+
+            s3_dir = reset_dir(os.path.join(workdir, "s3"))
+            with recorder.stage("s3_download") as m:
+                for scene, key, asset in scene_assets:
+                    utils._download_from_s3(
+                        f"s3://{asset['path']}", os.path.join(s3_dir, f"{scene['id']}_{key}.tif")
+                    )
+                m["items"] = len(scene_assets)
+                m["bytes"] = sum(asset["size"] for _, _, asset in scene_assets)
+
+            with recorder.stage("convert_to_cog") as m:
+                for scene, key, asset in scene_assets:
+                    raw = os.path.join(http_dir, f"{scene['id']}_{key}.tif")
+                    utils._convert_to_cog(raw, raw.replace(".tif", "_cog.tif"))
+                m["items"] = len(scene_assets)
+                m["bytes"] = sum(asset["size"] for _, _, asset in scene_assets)
+
+            bbox_dir = reset_dir(os.path.join(workdir, "bbox"))
+            scene_by_id = {item["id"]: item for item in items}
+            crops = {}
+            with recorder.stage("download_single_asset_bbox") as m:
+                for port_name, port_items in found_many.items():
+                    for stac_item in port_items:
+                        for key in asset_keys:
+                            href = scene_by_id[stac_item.id]["assets"][key]["href"]
+                            path = utils.download_single_asset(
+                                href, os.path.join(bbox_dir, f"{stac_item.id}_{port_name}_{key}.tif"),
+                                "bbox", ports[port_name],
+                            )
+                            crops[(stac_item.id, port_name, key)] = path
+                m["items"] = len(crops)
+                m["bytes"] = sum(os.path.getsize(path) for path in crops.values())
+
+            # The same crops again (as for a retried run): every one is a tile cache hit.
+            cached_dir = reset_dir(os.path.join(workdir, "bbox_cached"))
+            hits_before = utils.tile_cache.stats["hits"] if utils.tile_cache else 0
+            with recorder.stage("bbox_tile_cache_hits") as m:
+                for (item_id, port_name, key), path in crops.items():
+                    utils.download_single_asset(
+                        scene_by_id[item_id]["assets"][key]["href"],
+                        os.path.join(cached_dir, f"{item_id}_{port_name}_{key}.tif"),
+                        "bbox", ports[port_name],
+                    )
+                m["items"] = len(crops)
+                m["tile_cache_hits"] = (utils.tile_cache.stats["hits"] if utils.tile_cache else 0) - hits_before
+
+            catalog_dir = reset_dir(os.path.join(workdir, "catalog"))
+            with recorder.stage("metadata_manager") as m:
+                manager = MetadataManager(catalog_path=catalog_dir, pgstac_dsn=args.pgstac_dsn)
+                if not args.pgstac_dsn:
+                    manager.pypgstac_client = InMemoryPgStacLoader()
+                collection = manager.load_or_create_collection(COLLECTION_ID)
+                committed = 0
+                for port_name, port_items in found_many.items():
+                    for stac_item in port_items:
+                        with manager.assemble_item(
+                            collection, stac_item, f"{stac_item.id}_{port_name}",
+                            stac_item.geometry, ports[port_name], port_name,
+                        ) as catalog_item:
+                            for key in asset_keys:
+                                manager.add_band(catalog_item, key, crops[(stac_item.id, port_name, key)])
+                        committed += 1
+                manager.flush()
+                m["items"] = committed
+                m["pgstac_batches"] = len(manager.pypgstac_client.batch_stats)
+
+            # The flow utilities resolve clients through the collection config; point the
+            # configured endpoint's cached client at the fake API.
+            endpoint = stac_clients.load_collection_config("stac_collection.json")[COLLECTION_ID]
+            stac_clients._CLIENTS[endpoint] = client
+
+            for read_mode in [mode.strip() for mode in args.read_modes.split(",") if mode.strip()]:
+                metadata_dir = reset_dir(os.path.join(workdir, f"e2e_{read_mode}", "metadata"))
+                raster_dir = reset_dir(os.path.join(workdir, f"e2e_{read_mode}", "raster"))
+                # Every read mode starts with a cold tile cache and GDAL HTTP cache.
+                reset_dir(tile_cache_dir)
+                from rasterio import cache as gdal_http_cache
+
+                gdal_http_cache.invalidate_all()
+                with recorder.stage(f"end_to_end_{read_mode}") as m:
+                    planned = flows_utils.search_batch_and_compare_with_local_state(
+                        asset_list=asset_keys, collection_name=COLLECTION_ID,
+                        metadata_path=metadata_dir, ports=ports,
+                        datetime_range=DATETIME_RANGE, filters=None, max_items=1,
+                    )
+                    requests_before, bytes_before = files.requests, files.bytes_sent
+                    units = flows_utils.pack_work_units(
+                        planned, asset_keys, max_assets_per_unit=args.unit_max_assets,
+                        group_by_item=read_mode == "coalesce",
+                    )
+                    downloads = []
+                    for unit in units:
+                        downloads.extend(flows_utils.download_work_unit(
+                            unit, asset_keys, COLLECTION_ID, metadata_dir, raster_dir,
+                            read_mode=read_mode,
+                        ))
+                    assets = [a for d in downloads for a in d["downloaded_assets"]]
+                    m["items"] = len(downloads)
+                    m["bytes"] = sum(a["bytes"] or 0 for a in assets)
+                    m["assets"] = len(assets)
+                    m["work_units"] = len(units)
+                    m["asset_seconds"] = sum(a["seconds"] or 0 for a in assets)
+                    m["server_requests"] = files.requests - requests_before
+                    m["bytes_served"] = files.bytes_sent - bytes_before
+
+        recorder.stages["stac_search"]["api_requests"] = api.search_requests
+        recorder.stages["http_download"]["server_requests"] = files.requests
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ingest-bench-")
+    os.makedirs(workdir, exist_ok=True)
+
+    recorder = BenchmarkRecorder("ingest", config=vars(args))
+    run(args, workdir, recorder)
+
+    print()
+    print(recorder.format_table())
+    results = recorder.to_dict()
+    if args.output:
+        recorder.write_json(args.output)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        workload = ("scenes", "ports_per_scene", "tile_px", "assets", "asset_source")
+        if any(baseline.get("config", {}).get(k) != results["config"][k] for k in workload):
+            print("Warning: baseline was run with a different workload; comparisons may not be meaningful.")
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
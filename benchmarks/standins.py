@@ -0,0 +1,367 @@
+import email.utils
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+from src.data_ingestion.metadata.manager import PgStacLoader, pgstac_item_id
+
+
+class _BackgroundServer:
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self):
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def netloc(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler_class)
+        self._server.daemon_threads = True
+        self._server.standin = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class _RangeFileHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _resolve(self) -> Optional[str]:
+        path = unquote(urlparse(self.path).path).lstrip("/")
+        full_path = os.path.normpath(os.path.join(self.server.standin.root, path))
+        if not full_path.startswith(self.server.standin.root) or not os.path.isfile(full_path):
+            return None
+        return full_path
+
+    def _not_found(self) -> None:
+        body = b"<Error><Code>NoSuchKey</Code></Error>"
+        self.send_response(404)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_file(self, head: bool) -> None:
+        full_path = self._resolve()
+        if full_path is None:
+            self._not_found()
+            return
+
+        size = os.path.getsize(full_path)
+        start, end, status = 0, size - 1, 200
+        range_header = self.headers.get("Range")
+        if range_header:
+            match = re.match(r"bytes=(\d*)-(\d*)", range_header)
+            if match and match[1]:
+                start = int(match[1])
+                end = min(int(match[2]), size - 1) if match[2] else size - 1
+            elif match and match[2]:
+                start = max(size - int(match[2]), 0)
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Content-Type", "image/tiff")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", self.server.standin.etag(full_path))
+        self.send_header("Last-Modified", email.utils.formatdate(os.path.getmtime(full_path), usegmt=True))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if head:
+            return
+
+        remaining = end - start + 1
+        with open(full_path, "rb") as f:
+            f.seek(start)
+            while remaining > 0:
+                chunk = f.read(min(remaining, 1024 * 1024))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+        self.server.standin.record(end - start + 1)
+
+    def do_HEAD(self):
+        self._send_file(head=True)
+
+    def do_GET(self):
+        self._send_file(head=False)
+
+
+class RangeFileServer(_BackgroundServer):
+    handler_class = _RangeFileHandler
+
+    def __init__(self, root: str):
+        """
+        Local HTTP server for a directory, with Range requests, ETags and keep-alive.
+
+        It also acts as the S3 stand-in: path-style GET/HEAD of `/<bucket>/<key>`
+        is all boto3 downloads and GDAL's /vsis3/ reads need. Point them at it with
+        `s3_environment()`.
+
+        Args:
+            root (str): Directory served at `/`.
+        """
+        super().__init__()
+        self.root = os.path.abspath(root)
+        self.requests = 0
+        self.bytes_sent = 0
+        self._etags: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def etag(self, full_path: str) -> str:
+        with self._lock:
+            if full_path not in self._etags:
+                md5 = hashlib.md5()
+                with open(full_path, "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        md5.update(chunk)
+                self._etags[full_path] = f'"{md5.hexdigest()}"'
+            return self._etags[full_path]
+
+    def warm_etags(self) -> None:
+        """Hashes every served file up front so ETag cost stays out of measurements."""
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                self.etag(os.path.join(dirpath, filename))
+
+    def record(self, nbytes: int) -> None:
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += nbytes
+
+    def s3_environment(self) -> Dict[str, str]:
+        """
+        Environment variables routing boto3 and GDAL S3 access to this server.
+        Must be applied before the shared boto3 client is created.
+        """
+        return {
+            "AWS_ENDPOINT_URL_S3": self.url,
+            "AWS_S3_ENDPOINT": self.netloc,
+            "AWS_HTTPS": "NO",
+            "AWS_VIRTUAL_HOSTING": "FALSE",
+            "AWS_NO_SIGN_REQUEST": "YES",
+            "AWS_DEFAULT_REGION": "us-east-1",
+            "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+        }
+
+
+class _STACHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, payload: Dict, status: int = 200) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        api = self.server.standin
+        parsed = urlparse(self.path)
+        path = parsed.path.rstrip("/")
+        if path == "":
+            self._json(api.landing_page())
+        elif path == "/conformance":
+            self._json({"conformsTo": api.CONFORMANCE})
+        elif path == "/collections":
+            self._json({"collections": [api.collection()], "links": []})
+        elif path == f"/collections/{api.collection_id}":
+            self._json(api.collection())
+        elif path == "/search":
+            params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+            if "bbox" in params:
+                params["bbox"] = [float(v) for v in params["bbox"].split(",")]
+            if "collections" in params:
+                params["collections"] = params["collections"].split(",")
+            self._json(api.search(params))
+        else:
+            self._json({"code": "NotFound"}, status=404)
+
+    def do_POST(self):
+        api = self.server.standin
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if urlparse(self.path).path.rstrip("/") == "/search":
+            self._json(api.search(body))
+        else:
+            self._json({"code": "NotFound"}, status=404)
+
+
+class FakeSTACAPI(_BackgroundServer):
+    handler_class = _STACHandler
+
+    CONFORMANCE = [
+        "https://api.stacspec.org/v1.0.0/core",
+        "https://api.stacspec.org/v1.0.0/collections",
+        "https://api.stacspec.org/v1.0.0/item-search",
+        "http://www.opengis.net/spec/ogcapi-features-1/conf/core",
+    ]
+
+    def __init__(self, items: List[Dict], collection_id: str, latency_seconds: float = 0.0):
+        """
+        Minimal STAC API (landing page, collections, paged item search) over a fixed item list.
+
+        Search filters by collection and bbox intersection and pages with a `token`
+        in POST next links, which is what pystac-client follows.
+
+        Args:
+            items: STAC Item dicts to serve.
+            collection_id (str): The single collection offered.
+            latency_seconds (float): Artificial delay per search page, to mimic a remote API.
+        """
+        super().__init__()
+        self.items = items
+        self.collection_id = collection_id
+        self.latency_seconds = latency_seconds
+        self.search_requests = 0
+        self._lock = threading.Lock()
+
+    def landing_page(self) -> Dict:
+        return {
+            "type": "Catalog",
+            "stac_version": "1.0.0",
+            "id": "benchmark-stac",
+            "description": "Local STAC API stand-in for benchmarks",
+            "conformsTo": self.CONFORMANCE,
+            "links": [
+                {"rel": "self", "href": self.url, "type": "application/json"},
+                {"rel": "root", "href": self.url, "type": "application/json"},
+                {"rel": "data", "href": f"{self.url}/collections", "type": "application/json"},
+                {"rel": "search", "href": f"{self.url}/search", "type": "application/geo+json", "method": "GET"},
+                {"rel": "search", "href": f"{self.url}/search", "type": "application/geo+json", "method": "POST"},
+            ],
+        }
+
+    def collection(self) -> Dict:
+        return {
+            "type": "Collection",
+            "stac_version": "1.0.0",
+            "id": self.collection_id,
+            "description": "Synthetic Sentinel-2-like scenes",
+            "license": "proprietary",
+            "extent": {
+                "spatial": {"bbox": [[-180.0, -90.0, 180.0, 90.0]]},
+                "temporal": {"interval": [[None, None]]},
+            },
+            "links": [],
+        }
+
+    def search(self, params: Dict) -> Dict:
+        with self._lock:
+            self.search_requests += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+        collections = params.get("collections")
+        bbox = params.get("bbox")
+        matches = [
+            item for item in self.items
+            if (not collections or item["collection"] in collections)
+            and (not bbox or (
+                item["bbox"][0] <= bbox[2] and bbox[0] <= item["bbox"][2]
+                and item["bbox"][1] <= bbox[3] and bbox[1] <= item["bbox"][3]
+            ))
+        ]
+
+        limit = int(params.get("limit") or 10)
+        offset = int(params.get("token") or 0)
+        page = matches[offset : offset + limit]
+        links = []
+        if offset + limit < len(matches):
+            links.append({
+                "rel": "next",
+                "href": f"{self.url}/search",
+                "type": "application/geo+json",
+                "method": "POST",
+                "body": {**params, "token": str(offset + limit)},
+            })
+        return {
+            "type": "FeatureCollection",
+            "features": page,
+            "numberMatched": len(matches),
+            "numberReturned": len(page),
+            "links": links,
+        }
+
+
+class InMemoryPgStacLoader(PgStacLoader):
+    def __init__(self, batch_size: int = 100):
+        """
+        pgSTAC stand-in: keeps PgStacLoader's buffering and dedup but, instead of a
+        database round trip, serialises each batch the way it would be sent.
+        """
+        super().__init__(dsn=None, batch_size=batch_size)
+        self.loaded: Dict[tuple, dict] = {}
+
+    def load_collection(self, collection_path):
+        self._loaded_collections.add(os.path.basename(os.path.dirname(collection_path)))
+
+    def flush(self) -> Optional[Dict]:
+        with self._lock:
+            if not self._pending_items:
+                return None
+            items = self._pending_items
+            self._pending_items = {}
+            start = time.perf_counter()
+            payload = "\n".join(json.dumps(item) for item in items.values())
+            self.loaded.update(items)
+            stats = {"items": len(items), "bytes": len(payload), "seconds": time.perf_counter() - start}
+            self.batch_stats.append(stats)
+            return stats
+
+    def existing_assets(self, collection_id, pairs):
+        found = {}
+        for item_id, port in pairs:
+            item = self.loaded.get((collection_id, pgstac_item_id(item_id, port)))
+            if item:
+                found[(item_id, port or "")] = set(item.get("assets", {}))
+        return found
+
+
+def reset_dir(path: str) -> str:
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,174 @@
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from rasterio.io import MemoryFile
+from rasterio.transform import from_origin
+from rasterio.warp import transform_bounds
+from rio_cogeo.cogeo import cog_translate
+from rio_cogeo.profiles import cog_profiles
+
+# Asset key -> (Sentinel-2 band file name, resolution in metres)
+SENTINEL2_BANDS = {
+    "blue": ("B02", 10),
+    "green": ("B03", 10),
+    "red": ("B04", 10),
+    "nir": ("B08", 10),
+    "rededge1": ("B05", 20),
+    "swir16": ("B11", 20),
+}
+
+COLLECTION_ID = "sentinel-2-l2a"
+BUCKET = "bench"
+
+
+def write_synthetic_cog(
+    path: str, width: int, height: int, transform, crs: str, seed: int = 0, blocksize: int = 512
+) -> int:
+    """
+    Writes a uint16 reflectance-like COG (smooth pattern plus noise, so it compresses
+    like real imagery rather than like a constant).
+
+    Returns:
+        int: Size of the written file in bytes.
+    """
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width]
+    data = (
+        1500
+        + 600 * np.sin(xx / 37.0 + seed)
+        + 600 * np.cos(yy / 53.0)
+        + rng.normal(0, 80, (height, width))
+    ).clip(1, 10000).astype("uint16")[np.newaxis]
+
+    profile = cog_profiles.get("deflate")
+    profile.update(blockxsize=blocksize, blockysize=blocksize)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with MemoryFile() as memfile:
+        with memfile.open(
+            driver="GTiff",
+            width=width,
+            height=height,
+            count=1,
+            dtype="uint16",
+            crs=crs,
+            transform=transform,
+            nodata=0,
+        ) as dst:
+            dst.write(data)
+        with memfile.open() as src:
+            cog_translate(src, path, profile, in_memory=True, quiet=True)
+    return os.path.getsize(path)
+
+
+def make_scenes(
+    data_dir: str,
+    n_scenes: int,
+    tile_px: int = 1024,
+    bands: Optional[Dict[str, tuple]] = None,
+    crs: str = "EPSG:32632",
+) -> List[Dict]:
+    """
+    Generates Sentinel-2-like scenes: one COG per band, laid out on a grid in UTM 32N.
+
+    Files are written to `<data_dir>/<BUCKET>/scenes/<scene_id>/<band>.tif`, so the
+    same tree can be served over HTTP and as a path-style S3 bucket.
+
+    Args:
+        data_dir (str): Root directory of the generated data.
+        n_scenes (int): Number of scenes.
+        tile_px (int): Width/height of the 10 m bands in pixels (20 m bands get half).
+        bands: Asset key -> (band name, resolution). Defaults to SENTINEL2_BANDS.
+        crs (str): Projected CRS of the scenes.
+
+    Returns:
+        List[Dict]: Per scene its `id`, WGS84 `bbox`, `datetime` and `assets`
+        (asset key -> {"path": path relative to data_dir, "size": bytes}).
+    """
+    bands = bands or SENTINEL2_BANDS
+    extent_m = tile_px * 10
+    spacing = extent_m + 20000
+    scenes = []
+    for i in range(n_scenes):
+        scene_id = f"S2B_32TMT_2025010{i % 9 + 1}_0_L2A_{i:04d}"
+        x0 = 300000 + (i % 10) * spacing
+        y0 = 5100000 - (i // 10) * spacing
+        assets = {}
+        for b, (asset_key, (band, resolution)) in enumerate(bands.items()):
+            size_px = extent_m // resolution
+            rel_path = f"{BUCKET}/scenes/{scene_id}/{band}.tif"
+            size = write_synthetic_cog(
+                os.path.join(data_dir, rel_path),
+                size_px,
+                size_px,
+                from_origin(x0, y0, resolution, resolution),
+                crs,
+                seed=i * 16 + b,
+            )
+            assets[asset_key] = {"path": rel_path, "size": size}
+
+        bbox = list(transform_bounds(crs, "EPSG:4326", x0, y0 - extent_m, x0 + extent_m, y0))
+        scenes.append({
+            "id": scene_id,
+            "bbox": bbox,
+            "datetime": (datetime(2025, 1, 10) + timedelta(days=i)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "assets": assets,
+        })
+    return scenes
+
+
+def make_port_aois(scenes: List[Dict], ports_per_scene: int = 2, aoi_fraction: float = 0.2) -> Dict[str, List[float]]:
+    """
+    Places `ports_per_scene` small AOIs inside each scene, along its diagonal.
+
+    Returns:
+        Dict[str, List[float]]: Port name -> [min_lon, min_lat, max_lon, max_lat].
+    """
+    ports = {}
+    for i, scene in enumerate(scenes):
+        min_x, min_y, max_x, max_y = scene["bbox"]
+        width, height = (max_x - min_x) * aoi_fraction, (max_y - min_y) * aoi_fraction
+        for j in range(ports_per_scene):
+            offset = (j + 1) / (ports_per_scene + 1)
+            cx, cy = min_x + (max_x - min_x) * offset, min_y + (max_y - min_y) * offset
+            ports[f"PORT_{i:03d}_{j}"] = [cx - width / 2, cy - height / 2, cx + width / 2, cy + height / 2]
+    return ports
+
+
+def scene_to_item(scene: Dict, http_base: Optional[str] = None, use_s3: bool = False) -> Dict:
+    """
+    Builds the STAC Item JSON of a scene.
+
+    Asset hrefs point at `http_base` (the local HTTP server) or, with `use_s3`, at
+    s3://<BUCKET>/... (the local S3 stand-in).
+    """
+    min_x, min_y, max_x, max_y = scene["bbox"]
+    assets = {}
+    for asset_key, asset in scene["assets"].items():
+        if use_s3:
+            href = "s3://" + asset["path"]
+        else:
+            href = f"{http_base.rstrip('/')}/{asset['path']}"
+        assets[asset_key] = {
+            "href": href,
+            "type": "image/tiff; application=geotiff; profile=cloud-optimized",
+            "roles": ["data"],
+            "file:size": asset["size"],
+        }
+    return {
+        "type": "Feature",
+        "stac_version": "1.0.0",
+        "stac_extensions": [],
+        "id": scene["id"],
+        "collection": COLLECTION_ID,
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [[[min_x, min_y], [max_x, min_y], [max_x, max_y], [min_x, max_y], [min_x, min_y]]],
+        },
+        "bbox": scene["bbox"],
+        "properties": {"datetime": scene["datetime"], "eo:cloud_cover": 5.0},
+        "assets": assets,
+        "links": [],
+    }
@@ -1,27 +1,17 @@
 from pathlib import Path
-import pandas as pd
-from typing import List, Optional, Dict
-import json
+from typing import Callable, Dict, Iterable, List, Optional
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from src.data_ingestion.stac_clients import get_stac_client_from_collection
 from src.data_ingestion.geodata import download_utils
-from src.data_ingestion.metadata.manager import MetadataManager
-
-def get_item_by_id(collection_path: Path, item_id: str) -> Optional[dict]:
-    """
-    Check if a STAC item with the given ID exists in the collection.
-    If found, returns the item as a dict; otherwise returns None.
-    """
-    for item_file in collection_path.glob("*.json"):
-        try:
-            with open(item_file, "r") as f:
-                item = json.load(f)
-                if item.get("id") == item_id:
-                    return item
-        except Exception as e:
-            print(f"Error reading {item_file}: {e}")
-            continue
-    return None
+from src.data_ingestion.geodata.coalesce import CoalescingDownloader
+from src.data_ingestion.geodata.cog_profiles import get_cog_profile
+from src.data_ingestion.geodata.concurrent_downloader import ConcurrentAssetDownloader, HostLimiter
+from src.data_ingestion.geodata.pipeline import AssetPipeline
+from src.data_ingestion.metadata.manager import MetadataManager, PgStacLoader
+from src.data_ingestion.metadata.state_index import LocalStateIndex, open_state_index
+from src import metrics
 
 def search_items_and_compare_with_local_state(
     asset_list: List[str],
@@ -31,8 +21,16 @@ def search_items_and_compare_with_local_state(
     bbox: list,
     datetime_range: str = "2025-01-05T00:00:00Z/2025-08-05T00:00:00Z",
     filters: Optional[dict] = None,
-    max_items: int = 1
+    max_items: int = 1,
+    state_index: Optional[LocalStateIndex] = None,
 ) -> List[Dict]:
+    """
+    Searches one port and returns the items that still need downloading.
+
+    Args:
+        state_index: Open state index to check against. If omitted, the index of
+            `metadata_path` is opened and closed for this call.
+    """
     stac_client = get_stac_client_from_collection(collection_name)
     items = stac_client.search(
         aoi=bbox,
@@ -42,20 +40,92 @@ def search_items_and_compare_with_local_state(
         max_items=max_items,
     )
 
-    metadata_dir = Path(metadata_path) / collection_name
+    existing = _existing_assets(
+        metadata_path, state_index, collection_name, [(item.id, port_name) for item in items]
+    )
+    return _compare_with_local_state(items, asset_list, existing, port_name, bbox)
+
+
+def search_batch_and_compare_with_local_state(
+    asset_list: List[str],
+    collection_name: str,
+    metadata_path: str,
+    ports: Dict[str, list],
+    datetime_range: str = "2025-01-05T00:00:00Z/2025-08-05T00:00:00Z",
+    filters: Optional[dict] = None,
+    max_items: int = 1,
+    max_cluster_extent: float = 1.0,
+    state_index: Optional[LocalStateIndex] = None,
+) -> List[Dict]:
+    """
+    Batched variant of `search_items_and_compare_with_local_state` for many ports.
+
+    Neighbouring ports are searched together over a merged extent and each
+    returned item is assigned to every port whose bbox it intersects.
+
+    Args:
+        ports: Mapping of port name to bbox [minx, miny, maxx, maxy].
+        max_cluster_extent: Maximum width/height in degrees of a merged search extent.
+        state_index: Open state index to check against. If omitted, the index of
+            `metadata_path` is opened and closed for this call.
+    """
+    stac_client = get_stac_client_from_collection(collection_name)
+    items_by_port = stac_client.search_many(
+        aois=ports,
+        product=collection_name,
+        datetime_range=datetime_range,
+        filters=filters,
+        max_items=max_items,
+        max_cluster_extent=max_cluster_extent,
+    )
+    print(
+        f"Searched {len(ports)} ports with {stac_client.last_search_many_stats['searches']} STAC searches."
+    )
+
+    # One index query resolves the local state of every (item, port) pair of the batch.
+    existing = _existing_assets(
+        metadata_path,
+        state_index,
+        collection_name,
+        [(item.id, port_name) for port_name, items in items_by_port.items() for item in items],
+    )
     results = []
+    for port_name, items in items_by_port.items():
+        results.extend(
+            _compare_with_local_state(items, asset_list, existing, port_name, ports[port_name])
+        )
+    return results
 
-    for item in items:
-        item_filename = f"{item.id}_{port_name.replace('/', '_').replace('\\', '_').replace(' ', '_')}"
-        item_path = metadata_dir / item_filename
 
-        existing_item = get_item_by_id(item_path, item.id)
+def _existing_assets(
+    metadata_path: str, state_index: Optional[LocalStateIndex], collection_name: str, pairs: List
+) -> Dict:
+    if state_index is not None:
+        return state_index.existing_assets(collection_name, pairs)
+    with open_state_index(metadata_path) as index:
+        return index.existing_assets(collection_name, pairs)
+
+
+def _compare_with_local_state(
+    items, asset_list: List[str], existing: Dict, port_name: str, bbox: list
+) -> List[Dict]:
+    """
+    Keeps the items that still miss some of `asset_list` for the port.
+
+    Args:
+        existing: Asset keys already ingested per (item_id, port), as returned by
+            `LocalStateIndex.existing_assets`.
+    """
+    results = []
 
-        if existing_item:
-            existing_assets = existing_item.get("assets", {}).keys()
+    for item in items:
+        existing_assets = existing.get((item.id, port_name or ""))
+
+        if existing_assets:
             needed_assets = set(asset_list)
             if needed_assets.issubset(existing_assets):
                 print(f"Skipping item {item.id} for port {port_name} — all assets already present.")
+                metrics.inc("items_skipped_local")
                 continue
             else:
                 print(f"Item {item.id} for port {port_name} exists, but some assets are missing.")
@@ -67,6 +137,265 @@ def search_items_and_compare_with_local_state(
     return results
 
 
+@metrics.timed("filter_missing_in_pgstac")
+def filter_missing_in_pgstac(
+    candidates: List[Dict], asset_list: List[str], collection_name: str, pgstac_dsn: str
+) -> List[Dict]:
+    """
+    Drops the planned items whose assets are all already loaded in pgSTAC.
+
+    The whole candidate list is resolved with one set-based query, so tasks that
+    do not share a local metadata directory still skip work done by earlier runs.
+
+    Args:
+        candidates: Planned work as returned by the search functions ({"port", "item", "bbox"}).
+        asset_list: Asset keys each item must have to be skipped.
+        collection_name: STAC collection name.
+        pgstac_dsn: pgSTAC connection string.
+
+    Returns:
+        List[Dict]: The candidates that still need to be downloaded.
+    """
+    if not candidates:
+        return []
+
+    try:
+        existing = PgStacLoader(pgstac_dsn).existing_assets(
+            collection_name, [(c["item"].id, c["port"]) for c in candidates]
+        )
+    except Exception as e:
+        print(f"pgSTAC existence check failed, keeping all {len(candidates)} candidates: {e}")
+        return candidates
+
+    needed_assets = set(asset_list)
+    missing = [
+        c for c in candidates
+        if not needed_assets.issubset(existing.get((c["item"].id, c["port"] or ""), set()))
+    ]
+    print(f"pgSTAC already has {len(candidates) - len(missing)} of {len(candidates)} planned items.")
+    metrics.inc("items_skipped_pgstac", len(candidates) - len(missing))
+    return missing
+
+
+def estimate_item_bytes(item, asset_list: List[str]) -> Optional[int]:
+    """
+    Estimates the bytes to fetch for an item from the `file:size` of its assets.
+
+    Returns:
+        Optional[int]: Sum of the known asset sizes, or None if no asset reports one.
+    """
+    sizes = [
+        item.assets[key].extra_fields.get("file:size")
+        for key in asset_list
+        if key in item.assets
+    ]
+    sizes = [size for size in sizes if size]
+    return sum(sizes) if sizes else None
+
+
+def pack_work_units(
+    items: List[Dict],
+    asset_list: List[str],
+    max_assets_per_unit: int = 60,
+    max_bytes_per_unit: Optional[int] = None,
+    group_by_item: bool = False,
+) -> List[List[Dict]]:
+    """
+    Groups planned items into download work units.
+
+    A unit is closed when adding the next item would exceed `max_assets_per_unit`
+    assets or, when set, `max_bytes_per_unit` estimated bytes. Items whose size
+    is unknown only count towards the asset limit. An item larger than a limit
+    gets a unit of its own.
+
+    Args:
+        items: Planned work ({"port", "item", "bbox"}).
+        asset_list: Asset keys downloaded per item.
+        max_assets_per_unit: Maximum number of assets per unit.
+        max_bytes_per_unit: Maximum estimated bytes per unit (None to disable).
+        group_by_item: Order the work by item id first, so the ports sharing a scene
+            end up in the same unit (where read_mode="coalesce" can merge their reads).
+
+    Returns:
+        List[List[Dict]]: Work units, in the order of `items` (or of item ids).
+    """
+    if group_by_item:
+        items = sorted(items, key=lambda planned: planned["item"].id)
+
+    units: List[List[Dict]] = []
+    unit: List[Dict] = []
+    unit_assets = 0
+    unit_bytes = 0
+
+    for planned in items:
+        n_assets = len([key for key in asset_list if key in planned["item"].assets]) or 1
+        n_bytes = estimate_item_bytes(planned["item"], asset_list) or 0
+
+        too_many_assets = unit_assets + n_assets > max_assets_per_unit
+        too_many_bytes = max_bytes_per_unit is not None and unit_bytes + n_bytes > max_bytes_per_unit
+        if unit and (too_many_assets or too_many_bytes):
+            units.append(unit)
+            unit, unit_assets, unit_bytes = [], 0, 0
+
+        unit.append(planned)
+        unit_assets += n_assets
+        unit_bytes += n_bytes
+
+    if unit:
+        units.append(unit)
+    return units
+
+
+@metrics.timed("download_work_unit")
+def download_work_unit(
+    unit: List[Dict],
+    asset_list: List[str],
+    collection_name: str,
+    metadata_path: str,
+    local_storage_path: str,
+    download_type: str = "bbox",
+    item_workers: int = 4,
+    max_workers: int = 4,
+    max_per_host: int = 4,
+    read_mode: str = "asset",
+    encode_workers: Optional[int] = None,
+) -> List[Dict]:
+    """
+    Downloads every item of a work unit with a pool of `item_workers` threads.
+
+    All items share one MetadataManager, so their pgSTAC writes are batched and
+    flushed once at the end of the unit. A failing item is reported and does not
+    stop the others. The item threads also share one HostLimiter, so `max_workers`
+    and `max_per_host` cap the downloads of the whole unit, not of each item.
+
+    With read_mode="pipeline" the assets of all items instead go through one staged
+    pipeline (`max_workers` fetch threads, `encode_workers` COG encoding threads)
+    so downloads and encoding overlap across the whole unit.
+
+    With read_mode="coalesce" the bbox reads of all items are grouped per asset:
+    overlapping or neighbouring port AOIs are read once as a merged window and
+    split in memory (`max_workers` windows at a time).
+
+    Returns:
+        List[Dict]: The `download_items` result of each successful item, in completion order.
+    """
+    pgstac_dsn = os.getenv("PGSTAC_DSN")
+    manager = MetadataManager(catalog_path=metadata_path, pgstac_dsn=pgstac_dsn)
+    # Create the collection up front so the item threads only ever read it.
+    collection = manager.load_or_create_collection(collection_name)
+
+    if read_mode in ("pipeline", "coalesce"):
+        downloader_utils = download_utils.STACAssetDownloaderUtils()
+        if read_mode == "pipeline":
+            run = AssetPipeline(
+                downloader_utils, fetch_workers=max_workers,
+                encode_workers=encode_workers or os.cpu_count() or 2,
+            ).run
+        else:
+            run = CoalescingDownloader(downloader_utils, max_workers=max_workers).download
+        results = _download_unit_batched(
+            unit, asset_list, local_storage_path, download_type, manager, collection,
+            downloader_utils, run,
+        )
+        manager.flush()
+        print(f"Work unit done: {len(results)} of {len(unit)} items downloaded.")
+        return results
+
+    limiter = HostLimiter(max_workers=max_workers, max_per_host=max_per_host)
+    results = []
+    with ThreadPoolExecutor(max_workers=item_workers) as executor:
+        futures = {
+            executor.submit(
+                download_items,
+                asset_list=asset_list,
+                collection_name=collection_name,
+                metadata_path=metadata_path,
+                local_storage_path=local_storage_path,
+                item=planned["item"],
+                port_name=planned.get("port"),
+                bbox=planned.get("bbox"),
+                download_type=download_type,
+                max_workers=max_workers,
+                max_per_host=max_per_host,
+                read_mode=read_mode,
+                manager=manager,
+                limiter=limiter,
+                encode_concurrency=max(item_workers, max_workers),
+            ): planned
+            for planned in unit
+        }
+        for future in as_completed(futures):
+            planned = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"Failed to download item {planned['item'].id} for port {planned.get('port')}: {e}")
+
+    manager.flush()
+    print(f"Work unit done: {len(results)} of {len(unit)} items downloaded.")
+    return results
+
+
+def _download_unit_batched(
+    unit: List[Dict],
+    asset_list: List[str],
+    local_storage_path: str,
+    download_type: str,
+    manager: MetadataManager,
+    collection,
+    downloader_utils,
+    run: Callable[[List[Dict]], Iterable[Dict]],
+) -> List[Dict]:
+    """
+    Runs the assets of every item of a unit through one downloader (`AssetPipeline.run`
+    or `CoalescingDownloader.download`).
+
+    Each item is recorded in the catalog as soon as the last of its assets is done.
+    """
+    local_storage = Path(local_storage_path)
+
+    requests = []
+    pending: Dict[int, List[Dict]] = {}
+    expected: Dict[int, int] = {}
+    for index, planned in enumerate(unit):
+        item_requests = _asset_requests(
+            downloader_utils, planned["item"], _item_filename_base(planned["item"], planned.get("port")),
+            asset_list, local_storage, download_type, planned.get("bbox"), collection.id,
+        )
+        for request in item_requests:
+            request["unit_index"] = index
+        requests.extend(item_requests)
+        pending[index] = []
+        expected[index] = len(item_requests)
+
+    results = []
+
+    def record(index: int) -> None:
+        planned = unit[index]
+        results.append(_record_item(
+            manager, collection, planned["item"],
+            _item_filename_base(planned["item"], planned.get("port")),
+            planned.get("port"), planned.get("bbox"), pending.pop(index),
+        ))
+
+    for index, count in expected.items():
+        if count == 0:
+            # No asset could be requested: report the item, but leave the catalog alone.
+            planned = unit[index]
+            pending.pop(index)
+            results.append({"port": planned.get("port"), "item_id": planned["item"].id, "downloaded_assets": []})
+
+    for result in run(requests):
+        metrics.inc("assets_failed" if result["error"] is not None else "assets_downloaded")
+        index = result["unit_index"]
+        pending[index].append(result)
+        if len(pending[index]) == expected[index]:
+            record(index)
+
+    return results
+
+
+@metrics.timed("download_item")
 def download_items(
     asset_list: List[str],
     collection_name: str,
@@ -75,50 +404,145 @@ def download_items(
     item,
     port_name: str,
     bbox,
-    download_type: str = "bbox"
+    download_type: str = "bbox",
+    max_workers: int = 4,
+    max_per_host: int = 4,
+    read_mode: str = "asset",
+    manager: Optional[MetadataManager] = None,
+    limiter: Optional[HostLimiter] = None,
+    encode_concurrency: int = 1,
 ) -> Dict:
-    downloader_utils = download_utils.STACAssetDownloaderUtils()
-    pgstac_dsn = os.getenv("PGSTAC_DSN")
-    manager = MetadataManager(catalog_path=metadata_path, pgstac_dsn=pgstac_dsn)
+    """
+    Download the requested assets of one item for one port and record them in the catalog.
+
+    Args:
+        read_mode: How bbox downloads are read. "asset" crops each asset separately
+            (concurrently), "item" reads all assets through one multi-asset reader and
+            writes one COG per asset, "item_stack" does the same but writes a single
+            multi-band COG per item/port. Ignored for download_type="all".
+        manager: Shared MetadataManager. When given, the caller is responsible for
+            flushing it; otherwise a manager is created and flushed for this item.
+        limiter: HostLimiter shared with other items downloaded at the same time.
+        encode_concurrency: COG encodes running at once in the process, including
+            those of other items; their GDAL threads share the CPUs.
+    """
+    downloader_utils = download_utils.STACAssetDownloaderUtils(encode_concurrency=encode_concurrency)
+    owns_manager = manager is None
+    if owns_manager:
+        manager = MetadataManager(catalog_path=metadata_path, pgstac_dsn=os.getenv("PGSTAC_DSN"))
     collection = manager.load_or_create_collection(collection_name)
     local_storage = Path(local_storage_path)
 
-    item_filename_base = f"{item.id}_{port_name.replace('/', '_').replace('\\', '_').replace(' ', '_')}" if port_name else f"{item.id}"
-    downloaded_assets = []
+    item_filename_base = _item_filename_base(item, port_name)
+    requests = _asset_requests(
+        downloader_utils, item, item_filename_base, asset_list, local_storage, download_type, bbox,
+        collection_name,
+    )
+
+    results = None
+    if download_type == "bbox" and read_mode in ("item", "item_stack") and requests:
+        try:
+            start = time.perf_counter()
+            paths = downloader_utils.download_item_assets(
+                item,
+                [r["asset"] for r in requests],
+                {r["asset"]: r["local_path"] for r in requests},
+                bbox,
+                stack_path=str(local_storage / f"{item_filename_base}_stack.tif") if read_mode == "item_stack" else None,
+                cog_profiles={r["asset"]: r["cog_profile"] for r in requests},
+            )
+            # One read serves every asset, so its time is split evenly between them.
+            seconds = (time.perf_counter() - start) / len(requests)
+            results = [
+                {**r, "filepath": paths[r["asset"]], "error": None, "seconds": seconds}
+                for r in requests
+            ]
+        except Exception as e:
+            print(f"Item-level read failed for item {item.id}, falling back to per-asset downloads: {e}")
+
+    if results is None:
+        concurrent_downloader = ConcurrentAssetDownloader(
+            downloader_utils, max_workers=max_workers, max_per_host=max_per_host, limiter=limiter
+        )
+        results = list(concurrent_downloader.download(requests))
+
+    for result in results:
+        metrics.inc("assets_failed" if result["error"] is not None else "assets_downloaded")
 
+    download_result = _record_item(
+        manager, collection, item, item_filename_base, port_name, bbox, results
+    )
+
+    if owns_manager:
+        manager.flush()
+
+    return download_result
+
+
+def _item_filename_base(item, port_name: Optional[str]) -> str:
+    return f"{item.id}_{port_name.replace('/', '_').replace('\\', '_').replace(' ', '_')}" if port_name else f"{item.id}"
+
+
+def _asset_requests(
+    downloader_utils, item, item_filename_base: str, asset_list: List[str],
+    local_storage: Path, download_type: str, bbox, collection_name: Optional[str] = None
+) -> List[Dict]:
+    """
+    Builds one download request per asset of an item, with the COG output profile
+    configured for the asset (see `cog_profiles.get_cog_profile`).
+    """
+    requests = []
     for asset_key in asset_list:
         try:
             asset_url = downloader_utils.get_asset_url(item, asset_key)
             band_basename = downloader_utils.get_filename_from_url(asset_url).split(".")[0]
             item_filename_with_ext = f"{item_filename_base}_{band_basename}.tif"
-            filepath = local_storage / item_filename_with_ext
+            requests.append({
+                "asset": asset_key,
+                "url": asset_url,
+                "local_path": str(local_storage / item_filename_with_ext),
+                "download_type": download_type,
+                "aoi": bbox,
+                "cog_profile": get_cog_profile(collection_name, asset_key),
+            })
+        except Exception as e:
+            print(f"Failed to process asset '{asset_key}' for item {item.id}: {e}")
+    return requests
 
-            downloader_utils.download_single_asset(
-                url=asset_url,
-                local_path=str(filepath),
-                download_type=download_type,
-                aoi=bbox
-            )
 
-            manager.load_or_create_item(
-                collection=collection,
-                item=item,
-                item_filename=item_filename_base,
-                aoi_geojson=item.geometry,
-                aoi=bbox,
-                new_band_key=asset_key,
-                new_band_path=str(filepath),
-                port_name=port_name,
-            )
+def _record_item(
+    manager: MetadataManager, collection, item, item_filename_base: str,
+    port_name: Optional[str], bbox, results
+) -> Dict:
+    """
+    Adds the downloaded assets of an item to the catalog and returns its download result.
+    """
+    downloaded_assets = []
+    with manager.assemble_item(
+        collection=collection,
+        item=item,
+        item_filename=item_filename_base,
+        aoi_geojson=item.geometry,
+        aoi=bbox,
+        port_name=port_name,
+    ) as stac_item:
+        for result in results:
+            asset_key = result["asset"]
+            if result["error"] is not None:
+                print(f"Failed to process asset '{asset_key}' for item {item.id}: {result['error']}")
+                continue
+
+            manager.add_band(stac_item, asset_key, str(result["filepath"]))
 
+            filepath = str(result["filepath"])
             downloaded_assets.append({
                 "asset": asset_key,
-                "filepath": str(filepath)
+                "filepath": filepath,
+                "bytes": os.path.getsize(filepath) if os.path.exists(filepath) else None,
+                "seconds": result.get("seconds"),
             })
 
-            print(f"Prepared {item_filename_with_ext} for port {port_name}, asset: {asset_key}")
-        except Exception as e:
-            print(f"Failed to process asset '{asset_key}' for item {item.id}: {e}")
+            print(f"Prepared {Path(result['local_path']).name} for port {port_name}, asset: {asset_key}")
 
     return {
         "port": port_name,
@@ -1,15 +1,17 @@
 import os
 import sys
 from pathlib import Path
-import pandas as pd
 from typing import List, Optional, Dict
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from metaflow import FlowSpec, Parameter,  step, kubernetes, conda_base
+from metaflow import FlowSpec, Parameter,  step, kubernetes, conda_base, current
 import json
-from flows_utils import  search_items_and_compare_with_local_state
+from flows_utils import  search_items_and_compare_with_local_state, search_batch_and_compare_with_local_state, filter_missing_in_pgstac
+from src import metrics
+from src.data_ingestion.metadata.state_index import open_state_index
+from src.profiling import profile_step
 
 def chunk_list(lst, n):
     """Yield successive n-sized chunks from lst."""
@@ -29,6 +31,7 @@ def chunk_list(lst, n):
         "rasterio": "1.4.3",
         "rio-cogeo": "5.4.2",
         "rio-tiler": "7.8.1",
+        "shapely": "2.1.1",
         "pandas": "2.3",
     }
 )
@@ -70,9 +73,87 @@ class Sentinel2IngestionFlow(FlowSpec):
         type=str,
     )
 
+    download_workers = Parameter(
+        "download_workers",
+        help="Number of assets downloaded concurrently in each download task",
+        default=4,
+        type=int,
+    )
+
+    per_host_downloads = Parameter(
+        "per_host_downloads",
+        help="Maximum number of concurrent downloads against a single host",
+        default=4,
+        type=int,
+    )
+
+    batched_search = Parameter(
+        "batched_search",
+        help="Search all ports of a batch with a few merged-extent STAC queries instead of one per port",
+        default=False,
+        type=bool,
+    )
+
+    read_mode = Parameter(
+        "read_mode",
+        help="How bbox assets are read: 'asset' (one read per asset), 'item' (one multi-asset read per item), 'item_stack' (same, written as one multi-band COG), 'pipeline' (staged fetch/encode pipeline per download task) or 'coalesce' (one read per merged window of overlapping ports, split per port)",
+        default="asset",
+        type=str,
+    )
+
+    encode_workers = Parameter(
+        "encode_workers",
+        help="COG encoding threads per download task with read_mode=pipeline, 0 for one per CPU",
+        default=0,
+        type=int,
+    )
+
+    unit_max_assets = Parameter(
+        "unit_max_assets",
+        help="Maximum number of assets packed into one download task",
+        default=60,
+        type=int,
+    )
+
+    unit_max_mb = Parameter(
+        "unit_max_mb",
+        help="Maximum estimated megabytes (from asset file:size) packed into one download task, 0 to disable",
+        default=0,
+        type=int,
+    )
+
+    item_workers = Parameter(
+        "item_workers",
+        help="Number of items downloaded concurrently within one download task",
+        default=4,
+        type=int,
+    )
+
+    metrics_dir = Parameter(
+        "metrics_dir",
+        help="Directory receiving per-task metrics as Prometheus textfiles (.prom) and JSON; empty keeps them only as run artifacts",
+        default=os.environ.get("INGEST_METRICS_DIR", ""),
+        type=str,
+    )
+
+    def _export_metrics(self) -> Dict:
+        """
+        Snapshots this task's spans and counters, writing them to `metrics_dir` when set.
+        """
+        labels = {
+            "flow": current.flow_name,
+            "run_id": current.run_id,
+            "step": current.step_name,
+            "task_id": current.task_id,
+        }
+        name = f"{current.flow_name}_{current.run_id}_{current.step_name}_{current.task_id}"
+        return metrics.export_task_metrics(self.metrics_dir or None, name, labels)
+
 
     @step
     def start(self):
+        import pandas as pd
+
         df = pd.read_csv(self.csv_path)[:2]
         ports = df.to_dict(orient="records")
         print(f"Loaded {len(ports)} ports from {self.csv_path}")
@@ -86,98 +167,144 @@ class Sentinel2IngestionFlow(FlowSpec):
 
     
     @step
+    @profile_step
     def process_batch(self):
         self.asset_list = [x.strip() for x in self.asset_list.split(",")]
         batch = self.input
         self.items = []  # Store items instead of download results
 
-        for port in batch:
-            port_name = port["PORT_NAME"]
-            bbox = [port["minx"], port["miny"], port["maxx"], port["maxy"]]
+        # One connection to the local state index for every search of the batch.
+        with open_state_index(self.metadata_path) as state_index:
+            if self.batched_search:
+                ports = {
+                    port["PORT_NAME"]: [port["minx"], port["miny"], port["maxx"], port["maxy"]]
+                    for port in batch
+                }
+                self.items = search_batch_and_compare_with_local_state(
+                    asset_list=self.asset_list,
+                    collection_name=self.collection_name,
+                    metadata_path=self.metadata_path,
+                    state_index=state_index,
+                    ports=ports,
+                    datetime_range="2025-01-05T00:00:00Z/2025-08-05T00:00:00Z",
+                    filters=None,
+                    max_items=1,
+                )
+            else:
+                for port in batch:
+                    port_name = port["PORT_NAME"]
+                    bbox = [port["minx"], port["miny"], port["maxx"], port["maxy"]]
             
-            port_items = search_items_and_compare_with_local_state(
+                    port_items = search_items_and_compare_with_local_state(
 
-                asset_list=self.asset_list,
-                collection_name=self.collection_name,
-                metadata_path=self.metadata_path,
+                        asset_list=self.asset_list,
+                        collection_name=self.collection_name,
+                        metadata_path=self.metadata_path,
+                        state_index=state_index,
 
-                port_name=port_name,
-                bbox=bbox,
-                datetime_range="2025-01-05T00:00:00Z/2025-08-05T00:00:00Z",
-                filters=None,
-                max_items=1,
-            )
-            self.items.extend(port_items)
+                        port_name=port_name,
+                        bbox=bbox,
+                        datetime_range="2025-01-05T00:00:00Z/2025-08-05T00:00:00Z",
+                        filters=None,
+                        max_items=1,
+                    )
+                    self.items.extend(port_items)
 
+        self.metrics = self._export_metrics()
         self.next(self.join_items)
 
     
 
     @step
+    @profile_step
     def join_items(self, inputs):
          
         self.all_items = [item for inp in inputs for item in inp.items]
+
+        pgstac_dsn = os.environ.get("PGSTAC_DSN")
+        if pgstac_dsn:
+            self.all_items = filter_missing_in_pgstac(
+                candidates=self.all_items,
+                asset_list=[x.strip() for x in self.asset_list.split(",")],
+                collection_name=self.collection_name,
+                pgstac_dsn=pgstac_dsn,
+            )
         print(f"Total items to process: {len(self.all_items)}")
+
+        # Search task metrics plus this step's pgSTAC check.
+        self.search_metrics = metrics.merge_snapshots(
+            [inp.metrics for inp in inputs] + [self._export_metrics()]
+        )
         self.next(self.split_for_download)
 
     @step
     def split_for_download(self):
+        from flows_utils import pack_work_units
+
+        # Pack items into work units so the task count follows data volume, not item count.
+        self.work_units = pack_work_units(
+            self.all_items,
+            [x.strip() for x in self.asset_list.split(",")],
+            max_assets_per_unit=self.unit_max_assets,
+            max_bytes_per_unit=self.unit_max_mb * 1024 * 1024 if self.unit_max_mb else None,
+            group_by_item=self.read_mode == "coalesce",
+        )
+        print(f"Packed {len(self.all_items)} items into {len(self.work_units)} download tasks")
         # If empty, add a dummy no-op element
-        self.real_items = self.all_items if self.all_items else [None]
-        self.empty_list = len(self.all_items) == 0
-        self.next(self.download_assets, foreach="real_items")
+        self.empty_list = len(self.work_units) == 0
+        if self.empty_list:
+            self.work_units = [None]
+        self.next(self.download_assets, foreach="work_units")
 
     @step
+    @profile_step
     def download_assets(self):
-        from flows_utils import download_items
+        from flows_utils import download_work_unit
         self.asset_list = [x.strip() for x in self.asset_list.split(",")]
         if self.input is None:
             # no-op task
             print("No items to process. Skipping download.")
-            self.download_result = None
+            self.download_results = []
         else:
-           
-            self.download_result = download_items(
-
-                asset_list= self.asset_list,
+            self.download_results = download_work_unit(
+                unit=self.input,
+                asset_list=self.asset_list,
                 collection_name=self.collection_name,
                 metadata_path=self.metadata_path,
                 local_storage_path=self.local_path,
-
-                item=self.input["item"],
-                port_name=self.input.get("port", None),
-                bbox=self.input.get("bbox", None),
-                download_type="bbox" 
+                download_type="bbox",
+                item_workers=self.item_workers,
+                max_workers=self.download_workers,
+                max_per_host=self.per_host_downloads,
+                read_mode=self.read_mode,
+                encode_workers=self.encode_workers or None,
             )
+        self.metrics = self._export_metrics()
+        print(metrics.format_summary(self.metrics))
         self.next(self.download_join)
 
     @step
     def download_join(self, inputs):
-        self.all_downloads = [inp.download_result for inp in inputs]
+        self.all_downloads = [rec for inp in inputs for rec in inp.download_results]
+        self.download_metrics = metrics.merge_snapshots(inp.metrics for inp in inputs)
+        self.search_metrics = inputs[0].search_metrics
         self.next(self.write_to_db)
 
     @step
+    @profile_step
     def write_to_db(self):
         import os
         import psycopg2
+        from src.storage.ingestion_log import IngestionLogWriter
 
         dsn = os.environ.get("INGEST_DB_DSN")
         if dsn is None:
             raise RuntimeError("INGEST_DB_DSN environment variable is required")
 
-        with psycopg2.connect(dsn) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "CREATE TABLE IF NOT EXISTS ingestion_log (item_id TEXT PRIMARY KEY, port TEXT)"
-                )
-                for rec in self.all_downloads:
-                    if rec:
-                        cur.execute(
-                            "INSERT INTO ingestion_log (item_id, port) VALUES (%s, %s) ON CONFLICT (item_id) DO NOTHING",
-                            (rec["item_id"], rec["port"]),
-                        )
-                cur.execute("SELECT COUNT(*) FROM ingestion_log")
-                self.ingest_count = cur.fetchone()[0]
+        # COPY into a staging table and merge in one statement, keyed on (item_id, port, asset).
+        writer = IngestionLogWriter(dsn)
+        self.ingest_count = writer.write(self.all_downloads)
+        self.ingest_write_stats = writer.last_write_stats
 
         pgstac_dsn = os.environ.get("PGSTAC_DSN")
         if pgstac_dsn:
@@ -192,6 +319,12 @@ class Sentinel2IngestionFlow(FlowSpec):
     @step
     def end(self):
         print("Flow completed.")
+        if hasattr(self, "search_metrics"):
+            print("Search metrics:")
+            print(metrics.format_summary(self.search_metrics))
+        if hasattr(self, "download_metrics"):
+            print(f"Download metrics ({self.download_metrics['tasks']} tasks):")
+            print(metrics.format_summary(self.download_metrics))
         if hasattr(self, "ingest_count"):
             print(f"Ingestion log rows: {self.ingest_count}")
         if hasattr(self, "pgstac_collections"):
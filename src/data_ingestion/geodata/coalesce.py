@@ -0,0 +1,232 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
+
+from ... import metrics
+from .download_utils import STACAssetDownloaderUtils
+
+if TYPE_CHECKING:
+    from rio_tiler.models import ImageData
+
+
+def bbox_area(bbox: List[float]) -> float:
+    return max(bbox[2] - bbox[0], 0.0) * max(bbox[3] - bbox[1], 0.0)
+
+
+def union_bbox(bboxes: Iterable[List[float]]) -> List[float]:
+    bboxes = list(bboxes)
+    return [
+        min(b[0] for b in bboxes),
+        min(b[1] for b in bboxes),
+        max(b[2] for b in bboxes),
+        max(b[3] for b in bboxes),
+    ]
+
+
+def coalesce_requests(requests: Iterable[Dict], max_overhead: float = 0.25) -> List[Dict]:
+    """
+    Groups bbox requests against the same asset into merged read windows.
+
+    Requests of one URL are merged greedily: a request joins a group when the group's
+    window grown to include it covers no more than `(1 + max_overhead)` times the
+    area the members would read separately. AOIs that largely overlap (their shared
+    area is counted once per member when read separately) merge, and AOIs far apart
+    never do. AOIs that overlap only at a corner can stay separate, because the
+    window around them is mostly empty.
+
+    Args:
+        requests: Download requests with `url` and `aoi`.
+        max_overhead (float): Extra area a merged window may read, as a fraction of
+            the sum of its members' areas.
+
+    Returns:
+        List[Dict]: Groups with `url`, `window` (the merged bbox) and `requests`.
+    """
+    by_url: Dict[str, List[Dict]] = {}
+    for request in requests:
+        by_url.setdefault(request["url"], []).append(request)
+
+    groups = []
+    for url, url_requests in by_url.items():
+        url_groups: List[Dict] = []
+        for request in sorted(url_requests, key=lambda r: (r["aoi"][0], r["aoi"][1])):
+            for group in url_groups:
+                window = union_bbox([group["window"], request["aoi"]])
+                separate = group["separate_area"] + bbox_area(request["aoi"])
+                if bbox_area(window) <= (1 + max_overhead) * separate:
+                    group["window"] = window
+                    group["separate_area"] = separate
+                    group["requests"].append(request)
+                    break
+            else:
+                url_groups.append({
+                    "url": url,
+                    "window": list(request["aoi"]),
+                    "separate_area": bbox_area(request["aoi"]),
+                    "requests": [request],
+                })
+        groups.extend(url_groups)
+    return groups
+
+
+def clip_image(img: "ImageData", bbox: List[float]) -> "ImageData":
+    """
+    Cuts the part of `img` covering `bbox` (in the image's CRS).
+
+    The window is snapped to whole pixels of `img` and the result's bounds are those
+    of the snapped window, so its georeferencing stays exact.
+
+    Raises:
+        RuntimeError: If `bbox` does not overlap the image.
+    """
+    from rasterio import windows
+
+    window = windows.from_bounds(*bbox, transform=img.transform)
+    window = window.round_offsets().round_lengths()
+    full = windows.Window(0, 0, img.width, img.height)
+    try:
+        window = window.intersection(full)
+    except windows.WindowError:
+        raise RuntimeError(f"bbox {bbox} does not overlap the image bounds {img.bounds}")
+    if window.width < 1 or window.height < 1:
+        raise RuntimeError(f"bbox {bbox} does not overlap the image bounds {img.bounds}")
+    return img.clip(windows.bounds(window, img.transform))
+
+
+class CoalescingDownloader:
+    def __init__(
+        self,
+        downloader_utils: Optional[STACAssetDownloaderUtils] = None,
+        max_workers: int = 4,
+        max_overhead: float = 0.25,
+    ):
+        """
+        Crops many (item, port, asset) bbox requests with one remote read per merged window.
+
+        Requests against the same asset whose AOIs overlap or lie close together (see
+        `coalesce_requests`) are read once through `COGReader` over their merged
+        window; each port's array is then sliced out in memory and encoded to its
+        own COG. Requests already in the tile cache are served from it, and
+        non-bbox requests go through `download_single_asset` unchanged.
+
+        Args:
+            downloader_utils: Used for reads, encoding and the tile cache.
+            max_workers (int): Merged windows read and encoded at once.
+            max_overhead (float): See `coalesce_requests`.
+        """
+        self.downloader_utils = downloader_utils or STACAssetDownloaderUtils()
+        self.downloader_utils.encode_concurrency = max(self.downloader_utils.encode_concurrency, max_workers)
+        self.max_workers = max_workers
+        self.max_overhead = max_overhead
+        self.last_stats: Optional[Dict] = None
+
+    def download(self, requests: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Downloads the requests and yields one result per request as groups complete.
+
+        Yields:
+            Dict: The request merged with `filepath`, `seconds` and `error`, as from
+            `ConcurrentAssetDownloader.download`. A group's read time is split evenly
+            between its members.
+        """
+        utils = self.downloader_utils
+        to_read = []
+        singles = []
+        cached = 0
+        for request in requests:
+            if request.get("download_type", "bbox") != "bbox":
+                singles.append(request)
+                continue
+            start = time.perf_counter()
+            # Crops cut from a merged window are snapped to its pixel grid, which can
+            # differ from that of a direct read of the AOI, so they get their own keys.
+            cache_key = utils.tile_cache_key(
+                request["url"], request["aoi"], request.get("cog_profile"), coalesced=True
+            )
+            cog_path = utils._get_cog_filepath(request["local_path"])
+            if cache_key and utils.tile_cache.get(cache_key, cog_path):
+                cached += 1
+                yield {**request, "filepath": cog_path, "error": None, "seconds": time.perf_counter() - start}
+            else:
+                to_read.append({**request, "tile_cache_key": cache_key})
+
+        groups = coalesce_requests(to_read, self.max_overhead)
+        self.last_stats = {
+            "requests": len(to_read) + cached + len(singles),
+            "cached": cached,
+            "reads": len(groups) + len(singles),
+            "merged_groups": sum(len(g["requests"]) > 1 for g in groups),
+        }
+        metrics.inc("coalesced_requests", len(to_read))
+        metrics.inc("coalesced_reads", len(groups))
+        print(
+            f"Coalesced {len(to_read)} bbox requests into {len(groups)} reads "
+            f"({cached} from the tile cache)"
+        )
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._read_group, group) for group in groups]
+            futures += [executor.submit(self._read_single, request) for request in singles]
+            for future in as_completed(futures):
+                yield from future.result()
+
+    def _read_single(self, request: Dict) -> List[Dict]:
+        request.pop("tile_cache_key", None)
+        start = time.perf_counter()
+        try:
+            filepath = self.downloader_utils.download_single_asset(
+                url=request["url"],
+                local_path=request["local_path"],
+                download_type=request.get("download_type", "bbox"),
+                aoi=request.get("aoi"),
+                cog_profile=request.get("cog_profile"),
+            )
+            error = None
+        except Exception as e:
+            logging.error(f"Failed to download {request['url']}: {e}")
+            filepath, error = None, e
+        return [{
+            **request,
+            "filepath": filepath or (request["local_path"] if error is None else None),
+            "error": error,
+            "seconds": time.perf_counter() - start,
+        }]
+
+    def _read_group(self, group: Dict) -> List[Dict]:
+        """
+        Reads a group's merged window once and writes one COG per member.
+
+        If the merged read fails, each member falls back to its own read.
+        """
+        utils = self.downloader_utils
+        members = group["requests"]
+        start = time.perf_counter()
+        try:
+            with metrics.span("coalesced_read"):
+                img = utils.read_bbox(group["url"], group["window"])
+        except Exception as e:
+            if len(members) == 1:
+                return self._read_single(members[0])
+            logging.warning(f"Merged read of {group['url']} failed, reading {len(members)} AOIs separately: {e}")
+            return [result for request in members for result in self._read_single(request)]
+
+        read_seconds = (time.perf_counter() - start) / len(members)
+        results = []
+        for request in members:
+            start = time.perf_counter()
+            cache_key = request.pop("tile_cache_key", None)
+            try:
+                part = img if len(members) == 1 else clip_image(img, request["aoi"])
+                cog_path = utils._get_cog_filepath(request["local_path"])
+                utils._write_image_cog(part, cog_path, request.get("cog_profile"))
+                if cache_key:
+                    utils.tile_cache.put(cache_key, cog_path)
+                results.append({
+                    **request, "filepath": cog_path, "error": None,
+                    "seconds": read_seconds + time.perf_counter() - start,
+                })
+            except Exception as e:
+                logging.error(f"Failed to encode {request['url']} for bbox {request['aoi']}: {e}")
+                results.append({**request, "filepath": None, "error": e, "seconds": None})
+        return results
@@ -0,0 +1,223 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from ... import metrics
+
+MiB = 1024 * 1024
+
+# Overviews add up to a third of the full-resolution size (1/4 + 1/16 + ...).
+OVERVIEW_FACTOR = 4 / 3
+# Memory held by a tempfile-backed conversion besides GDAL's block cache: the
+# blocks being copied and compressed.
+TEMPFILE_WORKING_SET = 64 * MiB
+
+
+def _cgroup_memory_limit() -> Optional[int]:
+    """Memory limit of the container (cgroup v2 or v1), or None when unlimited or unknown."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path, "r") as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value)
+    return None
+
+
+def _physical_memory() -> Optional[int]:
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def default_memory_budget() -> int:
+    """
+    Bytes that COG conversions may hold at once: `COG_MEMORY_BUDGET_MB` if set,
+    otherwise half of the container memory limit (or a quarter of physical memory
+    when there is none), and 2 GiB if neither is known.
+    """
+    if os.environ.get("COG_MEMORY_BUDGET_MB"):
+        return int(float(os.environ["COG_MEMORY_BUDGET_MB"]) * MiB)
+    limit = _cgroup_memory_limit()
+    if limit:
+        return limit // 2
+    physical = _physical_memory()
+    if physical:
+        return physical // 4
+    return 2048 * MiB
+
+
+def estimate_cog_bytes(width: int, height: int, count: int, itemsize: int) -> int:
+    """Uncompressed size of a raster plus its overviews."""
+    return int(width * height * count * itemsize * OVERVIEW_FACTOR)
+
+
+class MemoryBudget:
+    def __init__(self, total_bytes: Optional[int] = None, gdal_cachemax_bytes: Optional[int] = None):
+        """
+        Shares a memory budget between the COG conversions running in a process.
+
+        A conversion reserves its estimated footprint before starting and blocks
+        until enough of the budget is free, so concurrent full-scene conversions
+        queue up instead of pushing the pod over its memory limit. A reservation
+        larger than the whole budget still runs, but only once nothing else holds
+        a reservation.
+
+        GDAL's block cache is process-wide and sized once, on first use, so it is
+        set here through `GDAL_CACHEMAX` (unless already configured) and taken off
+        the budget up front.
+
+        Args:
+            total_bytes (int, optional): Budget. Defaults to `default_memory_budget()`.
+            gdal_cachemax_bytes (int, optional): GDAL block cache size. Defaults to
+                `COG_GDAL_CACHEMAX_MB`, or 256 MiB capped at a quarter of the budget.
+        """
+        total = total_bytes if total_bytes is not None else default_memory_budget()
+        if gdal_cachemax_bytes is None:
+            if os.environ.get("COG_GDAL_CACHEMAX_MB"):
+                gdal_cachemax_bytes = int(float(os.environ["COG_GDAL_CACHEMAX_MB"]) * MiB)
+            else:
+                gdal_cachemax_bytes = min(256 * MiB, total // 4)
+        self.gdal_cachemax_bytes = gdal_cachemax_bytes
+        os.environ.setdefault("GDAL_CACHEMAX", str(max(gdal_cachemax_bytes // MiB, 1)))
+
+        self.total_bytes = total
+        self.available_bytes = max(total - gdal_cachemax_bytes, 0)
+        self.in_use = 0
+        self.peak_in_use = 0
+        self._holders = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, nbytes: int) -> float:
+        """
+        Blocks until `nbytes` fit in the budget and reserves them.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        start = time.perf_counter()
+        with self._condition:
+            while self._holders and self.in_use + nbytes > self.available_bytes:
+                self._condition.wait()
+            self.in_use += nbytes
+            self._holders += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+        waited = time.perf_counter() - start
+        metrics.observe("cog_budget_wait", waited)
+        return waited
+
+    def release(self, nbytes: int) -> None:
+        with self._condition:
+            self.in_use -= nbytes
+            self._holders -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def reserve(self, nbytes: int):
+        self.acquire(nbytes)
+        try:
+            yield
+        finally:
+            self.release(nbytes)
+
+    def plan(self, estimated_bytes: int) -> Dict:
+        """
+        Chooses how to convert a raster of `estimated_bytes` (see `estimate_cog_bytes`).
+
+        Rasters up to `COG_IN_MEMORY_FRACTION` (default 0.25) of the budget are
+        converted in memory and reserve their estimate. Larger ones go through a
+        temporary file next to the output, written block by block, and reserve
+        only a working set of a few blocks per band.
+
+        Returns:
+            Dict: `in_memory` (bool) and `reserve_bytes` (int).
+        """
+        fraction = float(os.environ.get("COG_IN_MEMORY_FRACTION", 0.25))
+        if estimated_bytes <= self.available_bytes * fraction:
+            return {"in_memory": True, "reserve_bytes": estimated_bytes}
+        return {"in_memory": False, "reserve_bytes": min(estimated_bytes, TEMPFILE_WORKING_SET)}
+
+    def stats(self) -> Dict:
+        with self._condition:
+            return {
+                "total_bytes": self.total_bytes,
+                "available_bytes": self.available_bytes,
+                "gdal_cachemax_bytes": self.gdal_cachemax_bytes,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+            }
+
+
+_BUDGET: Optional[MemoryBudget] = None
+_BUDGET_LOCK = threading.Lock()
+
+
+def get_memory_budget() -> MemoryBudget:
+    """Returns the process-wide COG conversion memory budget."""
+    global _BUDGET
+    with _BUDGET_LOCK:
+        if _BUDGET is None:
+            _BUDGET = MemoryBudget()
+            logging.info(
+                f"COG memory budget {_BUDGET.total_bytes // MiB} MiB "
+                f"(GDAL_CACHEMAX {os.environ['GDAL_CACHEMAX']} MiB)"
+            )
+        return _BUDGET
+
+
+def translate_to_cog(
+    input_path: str,
+    output_path: str,
+    profile: Dict,
+    budget: Optional[MemoryBudget] = None,
+    concurrent_encodes: int = 1,
+) -> Dict:
+    """
+    Converts a raster file to a COG within the process memory budget.
+
+    The input's uncompressed size decides between in-memory and tempfile-backed
+    conversion (see `MemoryBudget.plan`), and the conversion waits for its
+    reservation, so concurrent conversions never hold more than the budget.
+
+    Args:
+        input_path (str): Raster to convert.
+        output_path (str): Destination COG.
+        profile (dict): COG output profile (see `cog_profiles.get_cog_profile`).
+        budget (MemoryBudget, optional): Defaults to the process-wide budget.
+        concurrent_encodes (int): Encodes running at the same time, which share the
+            CPUs (see `cog_profiles.resolve_num_threads`).
+
+    Returns:
+        Dict: `in_memory`, `estimated_bytes` and `wait_seconds`.
+    """
+    import numpy as np
+    import rasterio
+    from rio_cogeo.cogeo import cog_translate
+
+    from .cog_profiles import rio_cogeo_options
+
+    budget = budget or get_memory_budget()
+    with rasterio.open(input_path) as src:
+        estimated = estimate_cog_bytes(
+            src.width, src.height, src.count, max(np.dtype(dtype).itemsize for dtype in src.dtypes)
+        )
+        plan = budget.plan(estimated)
+        wait_seconds = budget.acquire(plan["reserve_bytes"])
+        try:
+            cog_translate(
+                src,
+                output_path,
+                in_memory=plan["in_memory"],
+                quiet=True,
+                **rio_cogeo_options(profile, src.dtypes[0], concurrent_encodes),
+            )
+        finally:
+            budget.release(plan["reserve_bytes"])
+    metrics.inc("cog_in_memory" if plan["in_memory"] else "cog_tempfile")
+    return {"in_memory": plan["in_memory"], "estimated_bytes": estimated, "wait_seconds": wait_seconds}
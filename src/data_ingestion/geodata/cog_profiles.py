@@ -0,0 +1,151 @@
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional
+
+CODECS = {
+    # codec -> (rio-cogeo base profile, creation option of `level`)
+    "deflate": ("deflate", "ZLEVEL"),
+    "zstd": ("zstd", "ZSTD_LEVEL"),
+    "lzw": ("lzw", None),
+    "lerc": ("lerc", None),
+    "lerc_deflate": ("lerc_deflate", "ZLEVEL"),
+    "lerc_zstd": ("lerc_zstd", "ZSTD_LEVEL"),
+    "none": ("raw", None),
+}
+
+# Codecs that apply a PREDICTOR; GDAL warns that it is ignored for the others.
+PREDICTOR_CODECS = ("deflate", "lzw", "zstd")
+
+OVERVIEW_RESAMPLING = ("nearest", "bilinear", "cubic", "cubic_spline", "lanczos", "average", "mode", "gauss", "rms")
+
+
+def _validate_profile(name: str, profile: Dict) -> None:
+    if profile.get("codec") not in CODECS:
+        raise ValueError(f"COG profile '{name}': unknown codec {profile.get('codec')!r}, expected one of {list(CODECS)}")
+    if profile.get("overview_resampling", "nearest") not in OVERVIEW_RESAMPLING:
+        raise ValueError(f"COG profile '{name}': unknown overview_resampling {profile['overview_resampling']!r}")
+    if profile.get("predictor", "auto") not in ("auto", 1, 2, 3):
+        raise ValueError(f"COG profile '{name}': predictor must be 'auto', 1, 2 or 3")
+
+
+@lru_cache(maxsize=None)
+def load_cog_profiles(config_filename: str = "cog_profiles.json") -> Dict:
+    """
+    Loads the COG output profiles and their per-collection / per-asset assignment.
+
+    Args:
+        config_filename (str): JSON file in the repository's `configs` directory.
+
+    Raises:
+        FileNotFoundError: If the config file does not exist.
+        ValueError: If a profile is invalid or an assignment names an unknown profile.
+
+    Returns:
+        dict: `default_profile`, `profiles` (name -> settings) and `collections`
+        (collection prefix -> {"default": name, "assets": {asset key: name}}).
+    """
+    config_path = Path(__file__).resolve().parents[3] / "configs" / config_filename
+    if not config_path.exists():
+        raise FileNotFoundError(f"Config file not found: {config_path}")
+
+    with config_path.open("r") as f:
+        config = json.load(f)
+
+    profiles = config.get("profiles", {})
+    for name, profile in profiles.items():
+        _validate_profile(name, profile)
+
+    referenced = [config.get("default_profile")]
+    for collection in config.get("collections", {}).values():
+        referenced.append(collection.get("default"))
+        referenced.extend(collection.get("assets", {}).values())
+    unknown = {name for name in referenced if name is not None and name not in profiles}
+    if unknown or config.get("default_profile") not in profiles:
+        raise ValueError(f"{config_path} references unknown COG profiles: {sorted(unknown) or [None]}")
+    return config
+
+
+def get_cog_profile(
+    collection: Optional[str] = None,
+    asset: Optional[str] = None,
+    config_filename: str = "cog_profiles.json",
+) -> Dict:
+    """
+    Returns the COG output profile for an asset of a collection.
+
+    Collections are matched by prefix, as in `stac_collection.json`, so an entry for
+    "sentinel-2" covers both "sentinel-2-l2a" and "sentinel-2-l1c". The asset's own
+    entry wins over the collection default, which wins over `default_profile`.
+
+    Returns:
+        dict: The profile settings plus its `name`.
+    """
+    config = load_cog_profiles(config_filename)
+    name = config["default_profile"]
+    if collection:
+        collection = collection.lower()
+        for prefix, entry in config.get("collections", {}).items():
+            if collection.startswith(prefix):
+                name = entry.get("assets", {}).get((asset or "").lower()) or entry.get("default") or name
+                break
+    return {"name": name, **config["profiles"][name]}
+
+
+def resolve_num_threads(num_threads, concurrent_encodes: int = 1) -> str:
+    """
+    GDAL thread count of one encode when `concurrent_encodes` encodes run at once.
+
+    The CPUs are split between the concurrent encodes, so `"ALL_CPUS"` means all
+    of them for a lone encode and `cpu_count // concurrent_encodes` (at least 1)
+    for each of several; a numeric `num_threads` is capped at the same share.
+    `COG_NUM_THREADS` overrides the result, e.g. to match the pod's CPU limit.
+    """
+    if os.environ.get("COG_NUM_THREADS"):
+        return os.environ["COG_NUM_THREADS"]
+    cpus = os.cpu_count() or 1
+    share = max(cpus // max(concurrent_encodes, 1), 1)
+    requested = cpus if str(num_threads).upper() == "ALL_CPUS" else int(num_threads)
+    return str(max(min(requested, share), 1))
+
+
+def rio_cogeo_options(profile: Dict, dtype: str, concurrent_encodes: int = 1) -> Dict:
+    """
+    Translates a profile into `cog_translate` keyword arguments for data of `dtype`.
+
+    `predictor: "auto"` uses horizontal differencing (2) for integer data and the
+    floating point predictor (3) for floats. Only deflate, LZW and ZSTD take a
+    predictor; LERC codecs get `max_z_error` instead and "none" neither.
+    `num_threads` is used both for the GTiff encoder (`NUM_THREADS`) and for
+    overview computation (`GDAL_NUM_THREADS`), split between `concurrent_encodes`
+    encodes (see `resolve_num_threads`).
+
+    Returns:
+        dict: `dst_kwargs`, `overview_resampling` and `config`.
+    """
+    import numpy as np
+    from rio_cogeo.profiles import cog_profiles
+
+    base, level_option = CODECS[profile["codec"]]
+    dst_kwargs = cog_profiles.get(base)
+    blocksize = int(profile.get("blocksize", 512))
+    dst_kwargs.update(blockxsize=blocksize, blockysize=blocksize)
+
+    if level_option and profile.get("level") is not None:
+        dst_kwargs[level_option.lower()] = int(profile["level"])
+    if profile["codec"].startswith("lerc"):
+        dst_kwargs["max_z_error"] = float(profile.get("max_z_error", 0))
+    elif profile["codec"] in PREDICTOR_CODECS:
+        predictor = profile.get("predictor", "auto")
+        if predictor == "auto":
+            predictor = 3 if np.issubdtype(np.dtype(dtype), np.floating) else 2
+        dst_kwargs["predictor"] = int(predictor)
+
+    num_threads = resolve_num_threads(profile.get("num_threads", 1), concurrent_encodes)
+    dst_kwargs["num_threads"] = num_threads
+    return {
+        "dst_kwargs": dst_kwargs,
+        "overview_resampling": profile.get("overview_resampling", "nearest"),
+        "config": {"GDAL_NUM_THREADS": num_threads},
+    }
@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, Optional
+from urllib.parse import urlparse
+
+from .download_utils import STACAssetDownloaderUtils
+
+
+class HostLimiter:
+    def __init__(self, max_workers: int = 8, max_per_host: int = 4):
+        """
+        Caps downloads in flight overall and per host across several downloaders.
+
+        Each `ConcurrentAssetDownloader.download` call schedules only its own
+        requests; downloaders running side by side (e.g. one per item thread of a
+        work unit) share one limiter so their combined load stays within the limits.
+
+        Args:
+            max_workers (int): Maximum number of downloads in flight overall.
+            max_per_host (int): Maximum number of downloads in flight against one host.
+        """
+        if max_workers < 1 or max_per_host < 1:
+            raise ValueError("max_workers and max_per_host must be at least 1")
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self._total = threading.Semaphore(max_workers)
+        self._hosts: Dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, host: str):
+        """Blocks until a download against `host` may start, and holds its slot."""
+        with self._lock:
+            host_slots = self._hosts.setdefault(host, threading.Semaphore(self.max_per_host))
+        # Host first, so a request waiting on a busy host does not hold an overall slot.
+        with host_slots, self._total:
+            yield
+
+
+class ConcurrentAssetDownloader:
+    def __init__(
+        self,
+        downloader_utils: Optional[STACAssetDownloaderUtils] = None,
+        max_workers: int = 8,
+        max_per_host: int = 4,
+        task: Optional[Callable[[Dict], Optional[str]]] = None,
+        limiter: Optional[HostLimiter] = None,
+    ):
+        """
+        Runs `STACAssetDownloaderUtils.download_single_asset` for many assets at once.
+
+        Args:
+            downloader_utils: Downloader used for each asset (a new one is created if omitted).
+            max_workers (int): Maximum number of downloads in flight overall.
+            max_per_host (int): Maximum number of downloads in flight against one host
+                (the bucket name for s3:// URLs).
+            task (Callable, optional): Replaces `download_single_asset`. Called with the
+                request dict; returns the resulting path or URL.
+            limiter (HostLimiter, optional): Limits shared with other downloaders, applied
+                on top of this downloader's own.
+        """
+        if max_workers < 1 or max_per_host < 1:
+            raise ValueError("max_workers and max_per_host must be at least 1")
+
+        self.downloader_utils = downloader_utils or STACAssetDownloaderUtils()
+        # Each worker may encode a COG; their GDAL threads share the CPUs.
+        self.downloader_utils.encode_concurrency = max(self.downloader_utils.encode_concurrency, max_workers)
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.task = task
+        self.limiter = limiter
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return urlparse(url).netloc
+
+    def _run(self, request: Dict) -> Dict:
+        if self.limiter is not None:
+            with self.limiter.slot(self._host(request["url"])):
+                return self._download(request)
+        return self._download(request)
+
+    def _download(self, request: Dict) -> Dict:
+        start = time.perf_counter()
+        if self.task is not None:
+            filepath = self.task(request)
+        else:
+            filepath = self.downloader_utils.download_single_asset(
+                url=request["url"],
+                local_path=request["local_path"],
+                download_type=request.get("download_type", "bbox"),
+                aoi=request.get("aoi"),
+                cog_profile=request.get("cog_profile"),
+            )
+        return {
+            **request,
+            "filepath": filepath or request["local_path"],
+            "error": None,
+            "seconds": time.perf_counter() - start,
+        }
+
+    def download(self, requests: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Download assets concurrently and yield results as they complete.
+
+        Args:
+            requests: Dicts with `url` and `local_path`, plus optional `download_type`
+                and `aoi`. Any extra keys (e.g. `asset`) are passed through to the result.
+                May be a lazy iterator; it is consumed as download slots free up.
+
+        Yields:
+            Dict: The request merged with `filepath`, `seconds` and `error`. `error` is
+            None on success, otherwise the exception raised for that asset.
+        """
+        requests = iter(requests)
+        exhausted = False
+        buffered = 0
+        max_buffered = self.max_workers * 4
+        pending_by_host: "OrderedDict[str, deque]" = OrderedDict()
+        in_flight_by_host: Dict[str, int] = {}
+        futures = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+
+            def submit_ready():
+                nonlocal exhausted, buffered
+                while len(futures) < self.max_workers:
+                    for host, queue in pending_by_host.items():
+                        while (
+                            queue
+                            and len(futures) < self.max_workers
+                            and in_flight_by_host[host] < self.max_per_host
+                        ):
+                            request = queue.popleft()
+                            buffered -= 1
+                            futures[executor.submit(self._run, request)] = (host, request)
+                            in_flight_by_host[host] += 1
+
+                    # Requests are pulled lazily so a streaming producer (e.g. a paged
+                    # STAC search) gets its first downloads started straight away.
+                    if exhausted or buffered >= max_buffered or len(futures) >= self.max_workers:
+                        return
+                    request = next(requests, None)
+                    if request is None:
+                        exhausted = True
+                        continue
+                    host = self._host(request["url"])
+                    pending_by_host.setdefault(host, deque()).append(request)
+                    in_flight_by_host.setdefault(host, 0)
+                    buffered += 1
+
+            submit_ready()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    host, request = futures.pop(future)
+                    in_flight_by_host[host] -= 1
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logging.error(f"Failed to download {request['url']}: {e}")
+                        result = {**request, "filepath": None, "error": e, "seconds": None}
+                    yield result
+                submit_ready()
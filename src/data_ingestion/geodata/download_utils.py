@@ -1,30 +1,72 @@
 import logging
 import os
-import subprocess
-from typing import List, Optional
+import warnings
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, List, Optional
 from urllib.parse import unquote, urlparse
 
-import boto3
-import rasterio
-from botocore import UNSIGNED
-from botocore.config import Config
-from botocore.exceptions import NoCredentialsError, PartialCredentialsError
-from rasterio.transform import from_bounds
-from rio_cogeo.cogeo import cog_translate
-from rio_cogeo.profiles import cog_profiles
-from rio_tiler.io import COGReader
+from ... import metrics
+from ...profiling import profile_method
+from .cog_encoding import estimate_cog_bytes, get_memory_budget, translate_to_cog
+from .cog_profiles import get_cog_profile, rio_cogeo_options
+from .http_transfer import HTTPTransfer
+from .s3_transfer import S3Downloader, get_s3_client
+from .tile_cache import TileCache, get_tile_cache
+
+# rasterio, rio-cogeo, rio-tiler and botocore are imported inside the methods that
+# use them, so tasks that only plan or write to the database don't load GDAL.
+if TYPE_CHECKING:
+    from rio_tiler.models import ImageData
 
 
 class STACAssetDownloaderUtils:
-    def __init__(self):
+    def __init__(
+        self,
+        http_transfer: Optional[HTTPTransfer] = None,
+        s3_downloader: Optional[S3Downloader] = None,
+        tile_cache: Optional[TileCache] = None,
+        cog_profile: Optional[Dict] = None,
+        encode_concurrency: int = 1,
+    ):
         """
         storage: instance of BaseStorage subclass to save files
+        http_transfer: HTTP downloader used for full-file downloads
+        s3_downloader: S3 downloader (transfer settings) used for s3:// assets
+        tile_cache: Cache of encoded bbox COGs. Defaults to the process-wide cache
+            (disabled with TILE_CACHE_MAX_BYTES=0).
+        cog_profile: COG output profile used when a call does not pass its own (see
+            `cog_profiles.get_cog_profile`). Defaults to the configured default profile.
+        encode_concurrency: COG encodes that may run at once through this instance;
+            their GDAL threads share the CPUs. Raised by the concurrent downloaders
+            and the pipeline that use it.
+        """
+
+        self.http_transfer = http_transfer or HTTPTransfer()
+        self.s3_downloader = s3_downloader or S3Downloader()
+        self.tile_cache = tile_cache if tile_cache is not None else get_tile_cache()
+        self.cog_profile = cog_profile or get_cog_profile()
+        self.encode_concurrency = encode_concurrency
+        # Created before the first raster read, so its GDAL_CACHEMAX takes effect.
+        self.memory_budget = get_memory_budget()
+
+    def tile_cache_key(
+        self, url: str, aoi: List[float], cog_profile: Optional[Dict] = None, **extra
+    ) -> Optional[str]:
+        """
+        Tile cache key of a bbox COG of `url`, or None when caching is disabled.
         """
+        if self.tile_cache is None:
+            return None
+        # The thread count changes how fast a COG is encoded, not its content.
+        profile = {k: v for k, v in (cog_profile or self.cog_profile).items() if k != "num_threads"}
+        return self.tile_cache.key(url, aoi, profile, **extra)
 
-        pass
+    def _cog_options(self, dtype, cog_profile: Optional[Dict] = None) -> Dict:
+        """`cog_translate` keyword arguments of a COG profile for data of `dtype`."""
+        return rio_cogeo_options(cog_profile or self.cog_profile, str(dtype), self.encode_concurrency)
 
     def _get_s3_client(self):
-        return boto3.client("s3", config=Config(signature_version=UNSIGNED))
+        return get_s3_client()
 
     def get_asset_url(self, item, asset_key: str) -> Optional[str]:
         """
@@ -58,9 +100,16 @@ class STACAssetDownloaderUtils:
         logging.warning(f"No valid URL found for asset '{asset_key}' in item {item.id}")
         return None
 
+    @profile_method
+    @metrics.timed("download_asset")
     def download_single_asset(
-        self, url: str, local_path: str, download_type: str, aoi: List[float]
-    ) -> None:
+        self,
+        url: str,
+        local_path: str,
+        download_type: str,
+        aoi: List[float],
+        cog_profile: Optional[Dict] = None,
+    ) -> str:
         """
         Download a single asset from a URL to a local path, with optional AOI cropping.
         Args:
@@ -68,10 +117,12 @@ class STACAssetDownloaderUtils:
             local_path (str): Local file path to save the downloaded asset.
             download_type (str): Type of download ('all' for full download, 'bbox' for AOI cropping).
             aoi (List[float]): Bounding box as [min_lon, min_lat, max_lon, max_lat] for cropping.
+            cog_profile (dict, optional): COG output profile of this asset.
         Raises:
-            RuntimeError: If the download fails or the URL scheme is unsupported.
+            RuntimeError: If the download or the bbox read fails, or the URL scheme
+                is unsupported.
         Returns:
-            None
+            str: Path of the resulting COG (or of the raw file if COG conversion failed).
 
         """
         if download_type == "all":
@@ -82,21 +133,30 @@ class STACAssetDownloaderUtils:
                 self._download_from_s3(url, local_path)
                 print(f"Done - Downloaded via S3: {local_path}")
             else:
-                print(f"Unsupported URL scheme for download: {url}")
-                return None
+                raise RuntimeError(f"Unsupported URL scheme for download: {url}")
         elif download_type == "bbox" and (
             "tif" in url or "TIF" in url or "tiff" in url or "jp2" in url
         ):
-            self._tile_cog(url, local_path, aoi)
+            cog_filepath = self._get_cog_filepath(local_path)
+            cache_key = self.tile_cache_key(url, aoi, cog_profile)
+            if cache_key and self.tile_cache.get(cache_key, cog_filepath):
+                print(f"Tile cache hit: {cog_filepath}")
+                return cog_filepath
+            try:
+                self._tile_cog_to_cog(url, cog_filepath, aoi, cog_profile)
+                if cache_key:
+                    self.tile_cache.put(cache_key, cog_filepath)
+                return cog_filepath
+            except Exception as e:
+                print(f"Direct bbox COG failed, falling back to GeoTIFF + conversion: {e}")
+                self._tile_cog(url, local_path, aoi)
         else:
             print(f"Unsupported URL scheme for download: {url}")
             self._download_http(url, local_path)
 
-        cog_filepath = local_path.replace(".tif", "_cog.tif").replace(
-            ".TIF", "_cog.tif"
-        )
+        cog_filepath = self._get_cog_filepath(local_path)
         try:
-            self._convert_to_cog(local_path, cog_filepath)
+            self._convert_to_cog(local_path, cog_filepath, cog_profile)
             print(f"COG saved to {cog_filepath}")
             try:
                 os.remove(local_path)
@@ -108,53 +168,144 @@ class STACAssetDownloaderUtils:
 
         return cog_filepath
 
+    @profile_method
+    def download_item_assets(
+        self,
+        item,
+        asset_keys: List[str],
+        local_paths: Dict[str, str],
+        aoi: List[float],
+        stack_path: Optional[str] = None,
+        cog_profiles: Optional[Dict[str, Dict]] = None,
+    ) -> Dict[str, str]:
+        """
+        Read several assets of one STAC item for an AOI through a single reader session.
+
+        All bands are fetched concurrently by rio-tiler's STACReader and resampled
+        onto the grid of the finest band, so 10 m and 20 m bands line up pixel for pixel.
+
+        Args:
+            item: STAC Item object containing the assets.
+            asset_keys (List[str]): Asset keys to read.
+            local_paths (Dict[str, str]): Output path per asset key (used when not stacking).
+            aoi (List[float]): Bounding box as [min_lon, min_lat, max_lon, max_lat].
+            stack_path (str, optional): If given, write all bands to this single multi-band COG.
+            cog_profiles (Dict[str, dict], optional): COG output profile per asset key. A
+                stack uses the profile of its first asset.
+
+        Raises:
+            RuntimeError: If no data could be extracted for the AOI.
+
+        Returns:
+            Dict[str, str]: COG path per asset key (the same path for every key when stacking).
+        """
+        cog_profiles = cog_profiles or {}
+        cache_keys = self._item_cache_keys(item, asset_keys, local_paths, aoi, stack_path, cog_profiles)
+        if cache_keys and all(self.tile_cache.get(key, path) for path, key in cache_keys.items()):
+            print(f"Tile cache hit for {asset_keys} of item {item.id}")
+            if stack_path:
+                return {asset_key: self._get_cog_filepath(stack_path) for asset_key in asset_keys}
+            return {asset_key: self._get_cog_filepath(local_paths[asset_key]) for asset_key in asset_keys}
+
+        from rio_tiler.io import STACReader
+        from rio_tiler.models import ImageData
+
+        print(f"Reading {asset_keys} of item {item.id} for bbox {aoi}")
+        with warnings.catch_warnings():
+            # Bands of different resolution are resized to the largest one; that is the intent here.
+            warnings.simplefilter("ignore", UserWarning)
+            with metrics.span("item_read"), STACReader(None, item=item) as stac:
+                img = stac.part(aoi, assets=asset_keys)
+
+        if img.data is None or img.data.size == 0:
+            raise RuntimeError(f"No data extracted from bbox for item {item.id}")
+
+        if stack_path:
+            cog_filepath = self._get_cog_filepath(stack_path)
+            self._write_image_cog(img, cog_filepath, cog_profiles.get(asset_keys[0]))
+            if cache_keys:
+                self.tile_cache.put(cache_keys[cog_filepath], cog_filepath)
+            print(f"Saved {len(asset_keys)}-asset stack COG to {cog_filepath}")
+            return {asset_key: cog_filepath for asset_key in asset_keys}
+
+        results = {}
+        for asset_key in asset_keys:
+            band_indexes = [
+                i for i, name in enumerate(img.band_names) if name.startswith(f"{asset_key}_")
+            ]
+            band = ImageData(
+                img.array[band_indexes[0] : band_indexes[-1] + 1],
+                bounds=img.bounds,
+                crs=img.crs,
+            )
+            cog_filepath = self._get_cog_filepath(local_paths[asset_key])
+            self._write_image_cog(band, cog_filepath, cog_profiles.get(asset_key))
+            if cache_keys:
+                self.tile_cache.put(cache_keys[cog_filepath], cog_filepath)
+            results[asset_key] = cog_filepath
+            print(f"Saved bbox COG to {cog_filepath}")
+
+        return results
+
+    def _item_cache_keys(
+        self,
+        item,
+        asset_keys: List[str],
+        local_paths: Dict[str, str],
+        aoi: List[float],
+        stack_path: Optional[str],
+        cog_profiles: Dict[str, Dict],
+    ) -> Optional[Dict[str, str]]:
+        """
+        Tile cache keys of the COGs `download_item_assets` writes, by output path.
+
+        Bands are resampled onto the grid of the finest band read, so each key also
+        covers the hrefs of every asset read together.
+        """
+        if self.tile_cache is None:
+            return None
+        hrefs = [item.assets[asset_key].href for asset_key in asset_keys]
+        if stack_path:
+            key = self.tile_cache_key(
+                ",".join(hrefs), aoi, cog_profiles.get(asset_keys[0]), assets=list(asset_keys), stacked=True
+            )
+            return {self._get_cog_filepath(stack_path): key}
+        return {
+            self._get_cog_filepath(local_paths[asset_key]): self.tile_cache_key(
+                href, aoi, cog_profiles.get(asset_key), read_with=sorted(hrefs)
+            )
+            for asset_key, href in zip(asset_keys, hrefs)
+        }
+
     def _download_http(self, url: str, local_path: str):
         """
-        Download a file from the given HTTP URL to the specified local path using curl.
+        Download a file from the given HTTP URL to the specified local path.
+
+        Uses a shared keep-alive connection pool, parallel range requests for
+        large objects and resumes from a previous `.part` file when possible.
 
         Args:
             url (str): The HTTP URL of the file to download.
             local_path (str): The local filesystem path where the file will be saved.
 
         Raises:
-            subprocess.CalledProcessError: If the curl command fails.
-            OSError: If directory creation fails.
+            ConnectionError: If the server returns an error or the transfer keeps failing.
+            OSError: If the file cannot be written or fails size/ETag verification.
 
         """
-        os.makedirs(os.path.dirname(local_path), exist_ok=True)
         try:
-            subprocess.run(
-                [
-                    "curl",
-                    "--fail",
-                    "--location",
-                    "--max-time",
-                    "3600",
-                    "-o",
-                    local_path,
-                    url,
-                ],
-                check=True,
-            )
+            self.http_transfer.download(url, local_path)
             print(f"Downloaded via HTTP: {local_path}")
-
-        except subprocess.CalledProcessError as e:
-            logging.error(
-                f"Failed to download {url} to {local_path}: {e.stderr.decode().strip()}"
-            )
-            raise
         except OSError as e:
-            logging.error(f"Failed to create directory for {local_path}: {e}")
+            logging.error(f"Failed to download {url} to {local_path}: {e}")
             raise
 
     def _download_from_s3(self, s3_url: str, local_path: str) -> None:
         """Download a file from S3 to a local path."""
-        self.s3_client = self._get_s3_client()
+        from botocore.exceptions import NoCredentialsError, PartialCredentialsError
+
         try:
-            os.makedirs(os.path.dirname(local_path), exist_ok=True)
-            bucket, *key_parts = s3_url.replace("s3://", "").split("/")
-            key = "/".join(key_parts)
-            self.s3_client.download_file(bucket, key, local_path)
+            self.s3_downloader.download(s3_url, local_path)
             print(f"Downloaded via S3: {local_path}")
         except NoCredentialsError:
             print("AWS credentials not found.")
@@ -168,18 +319,151 @@ class STACAssetDownloaderUtils:
         parsed_url = urlparse(url)
         return unquote(parsed_url.path.split("/")[-1])
 
+    def _get_cog_filepath(self, local_path: str) -> str:
+        return local_path.replace(".tif", "_cog.tif").replace(".TIF", "_cog.tif")
+
+    def _tile_cog_to_cog(
+        self, url: str, cog_path: str, aoi: List[float], cog_profile: Optional[Dict] = None
+    ) -> None:
+        """
+        Crop a COG to the AOI bounding box and encode the result straight to a COG.
+
+        The cropped array goes through an in-memory dataset, so the only file written
+        is the final COG (no intermediate GeoTIFF to write, re-read and delete).
+
+        Raises:
+            RuntimeError: If no data could be extracted for the AOI.
+        """
+        print(f"Creating bbox COG from COG: {url} to {cog_path}")
+        img = self.read_bbox(url, aoi)
+        self._write_image_cog(img, cog_path, cog_profile)
+        print(f"Saved bbox COG to {cog_path}")
+
+    @profile_method
+    def crop_to_cog_bytes(
+        self, url: str, aoi: List[float], cog_profile: Optional[Dict] = None
+    ) -> bytes:
+        """
+        Crop a COG to the AOI bounding box and return the encoded COG bytes.
+
+        Nothing is written to local disk, so the result can be streamed straight
+        to object storage (see `save_bytes` on the storage backends).
+
+        Raises:
+            RuntimeError: If no data could be extracted for the AOI.
+        """
+        cache_key = self.tile_cache_key(url, aoi, cog_profile)
+        if cache_key:
+            data = self.tile_cache.get_bytes(cache_key)
+            if data is not None:
+                return data
+        data = self._encode_image_cog(self.read_bbox(url, aoi), cog_profile)
+        if cache_key:
+            self.tile_cache.put_bytes(cache_key, data)
+        return data
+
+    @profile_method
+    def read_bbox(self, url: str, aoi: List[float]) -> "ImageData":
+        """
+        Read the AOI window of a COG into memory.
+
+        Raises:
+            RuntimeError: If no data could be extracted for the AOI.
+        """
+        from rio_tiler.io import COGReader
+
+        with metrics.span("bbox_read"), COGReader(url) as cog:
+            img = cog.part(aoi)
+
+        if img.data is None or img.data.size == 0:
+            raise RuntimeError(f"No data extracted from bbox: {url}")
+
+        return img
+
+    @contextmanager
+    def _open_image_dataset(self, img):
+        """
+        Yields a rio-tiler ImageData as a read-only in-memory rasterio dataset.
+        """
+        from rasterio.io import MemoryFile
+        from rasterio.transform import from_bounds
+
+        data = img.data
+        transform = from_bounds(*img.bounds, width=data.shape[2], height=data.shape[1])
+
+        with MemoryFile() as memfile:
+            with memfile.open(
+                driver="GTiff",
+                height=data.shape[1],
+                width=data.shape[2],
+                count=data.shape[0],
+                dtype=data.dtype,
+                crs=img.crs,
+                transform=transform,
+            ) as dst:
+                dst.write(data)
+
+            with memfile.open() as src:
+                yield src
+
+    @staticmethod
+    def _image_cog_bytes(img) -> int:
+        """Memory an in-memory COG encode of `img` holds on top of the array itself."""
+        count, height, width = img.data.shape
+        return estimate_cog_bytes(width, height, count, img.data.dtype.itemsize)
+
+    @profile_method
+    def _write_image_cog(self, img, cog_path: str, cog_profile: Optional[Dict] = None) -> None:
+        """
+        Encode a rio-tiler ImageData to a COG using an in-memory source dataset.
+        """
+        from rio_cogeo.cogeo import cog_translate
+
+        os.makedirs(os.path.dirname(cog_path) or ".", exist_ok=True)
+        with self.memory_budget.reserve(self._image_cog_bytes(img)), metrics.span("cog_encode"), \
+                self._open_image_dataset(img) as src:
+            cog_translate(
+                src, cog_path, in_memory=True, quiet=True,
+                **self._cog_options(img.data.dtype, cog_profile),
+            )
+        metrics.inc("cog_bytes_written", os.path.getsize(cog_path))
+
+    @profile_method
+    def _encode_image_cog(self, img, cog_profile: Optional[Dict] = None) -> bytes:
+        """
+        Encode a rio-tiler ImageData to COG bytes, entirely in memory.
+        """
+        from rasterio.io import MemoryFile
+        from rio_cogeo.cogeo import cog_translate
+
+        with self.memory_budget.reserve(2 * self._image_cog_bytes(img)), metrics.span("cog_encode"), \
+                self._open_image_dataset(img) as src, MemoryFile() as output:
+            cog_translate(
+                src, output.name, in_memory=True, quiet=True,
+                **self._cog_options(img.data.dtype, cog_profile),
+            )
+            data = output.read()
+        metrics.inc("cog_bytes_written", len(data))
+        return data
+
     def _tile_cog(self, url: str, local_path: str, aoi: List[float]) -> None:
         """
         Crop a COG file to the AOI bounding box and save as a new GeoTIFF.
+
+        Raises:
+            RuntimeError: If the bbox could not be read or held no data.
         """
+        import rasterio
+        from rasterio.transform import from_bounds
+        from rio_tiler.io import COGReader
+
         print(f"Creating bbox GeoTIFF from COG: {url} to {local_path}")
         try:
-            with COGReader(url) as cog:
+            with metrics.span("bbox_read"), COGReader(url) as cog:
                 img = cog.part(aoi)
 
                 if img.data is None or img.data.size == 0:
-                    print(f" No data extracted from bbox: {local_path}")
-                    return
+                    raise ValueError("no data in bbox")
 
                 data = img.data
                 bounds = img.bounds
@@ -203,20 +487,39 @@ class STACAssetDownloaderUtils:
                     dst.write(data)
                 print(f"Saved bbox data to {local_path}")
         except Exception as e:
-            print(f"Failed to create bbox GeoTIFF: {e}")
+            raise RuntimeError(f"Failed to create bbox GeoTIFF from {url}: {e}") from e
 
-    def _convert_to_cog(self, input_path: str, output_path: str) -> None:
+    def _convert_to_cog(
+        self, input_path: str, output_path: str, cog_profile: Optional[Dict] = None
+    ) -> None:
         """
-        Convert a GeoTIFF to a Cloud-Optimized GeoTIFF (COG) using deflate compression.
+        Convert a GeoTIFF to a Cloud-Optimized GeoTIFF (COG).
 
         Parameters:
             input_path (str): Path to the input GeoTIFF file.
             output_path (str): Path to the output COG file.
+            cog_profile (dict, optional): COG output profile. Defaults to `self.cog_profile`.
         """
         try:
-            profile = cog_profiles.get("deflate")
-            with rasterio.open(input_path) as src:
-                cog_translate(src, output_path, profile, in_memory=True)
+            self._translate_to_cog(input_path, output_path, cog_profile)
             print(f"Successfully converted {input_path} to COG: {output_path}")
         except Exception as e:
             print(f"Error converting {input_path} to COG: {e}")
+
+    @profile_method
+    def _translate_to_cog(
+        self, input_path: str, output_path: str, cog_profile: Optional[Dict] = None
+    ) -> None:
+        """
+        Convert a GeoTIFF to a COG, raising on failure.
+
+        Small rasters are converted in memory; full scenes that would not fit the
+        process memory budget go through a temporary file, block by block (see
+        `cog_encoding.translate_to_cog`).
+        """
+        with metrics.span("cog_encode"):
+            translate_to_cog(
+                input_path, output_path, cog_profile or self.cog_profile, self.memory_budget,
+                self.encode_concurrency,
+            )
+        metrics.inc("cog_bytes_written", os.path.getsize(output_path))
@@ -1,12 +1,15 @@
+import itertools
 import logging
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 
-from storage import get_storage
-
-from metadata.manager import MetadataManager
-from stac_clients import get_stac_client_from_collection
-from download_utils import STACAssetDownloaderUtils
+from ...storage import get_storage
+from ..metadata.manager import MetadataManager
+from ..stac_clients import get_stac_client_from_collection
+from .cog_profiles import get_cog_profile
+from .concurrent_downloader import ConcurrentAssetDownloader
+from .download_utils import STACAssetDownloaderUtils
+from .pipeline import AssetPipeline
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,14 +23,47 @@ class STACDownloaderService:
         pgstac_dsn: str,
         storage_type: str = "local",
         catalog_metadata_path: str = "./metadata/catalog",
-        
+        max_workers: int = 8,
+        max_per_host: int = 4,
+        storage_prefix: Optional[str] = None,
+        stream_to_storage: bool = False,
+        upload_batch_size: int = 32,
+        pipeline_workers: Optional[Dict[str, int]] = None,
     ):
+        """
+        Args:
+            storage_prefix: Destination prefix (e.g. "gs://bucket/raster") mirroring
+                `output_dir`. Defaults to the local paths themselves.
+            stream_to_storage: For bbox downloads, encode each COG in memory and upload
+                it directly instead of writing a local file first.
+            upload_batch_size: Number of downloaded files uploaded together in parallel.
+            pipeline_workers: If given, run assets through the staged fetch -> encode ->
+                persist -> index pipeline instead, with these worker counts per stage
+                (keys "fetch", "encode", "persist", plus optional "queue_size").
+        """
         self.collection_name = collection_name
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
         self.storage = get_storage(storage_type)
         self.downloader_utils = STACAssetDownloaderUtils()
+        self.concurrent_downloader = ConcurrentAssetDownloader(
+            self.downloader_utils, max_workers=max_workers, max_per_host=max_per_host
+        )
+        self.streaming_downloader = (
+            ConcurrentAssetDownloader(
+                self.downloader_utils,
+                max_workers=max_workers,
+                max_per_host=max_per_host,
+                task=self._crop_to_storage,
+            )
+            if stream_to_storage
+            else None
+        )
+        self.storage_prefix = storage_prefix
+        self.upload_batch_size = upload_batch_size
+        self.pipeline_workers = pipeline_workers
+        self.stream_to_storage = stream_to_storage
         self.manager = MetadataManager(catalog_path=catalog_metadata_path,pgstac_dsn = pgstac_dsn)
         self.stac_client = get_stac_client_from_collection(collection_name)
 
@@ -43,6 +79,7 @@ class STACDownloaderService:
         download_type: str = "all",
         max_items: int = 10,
         port_name: Optional[str] = None,
+        page_size: int = 100,
     ) -> None:
         """
         Download specified assets from STAC items matching the AOI and datetime range.
@@ -55,27 +92,30 @@ class STACDownloaderService:
             download_type: Type of download ('all' for full download, 'bbox' for AOI cropping).
             max_items: Maximum number of items to process.
             port_name: Name of the port for filename purposes.
+            page_size: STAC search page size; downloads start as soon as the first page arrives.
 
         Raises:
             ValueError: If no valid asset keys are found.
             RuntimeError: If no items are found.
         """
         try:
-            items = self.stac_client.search(
+            items = self.stac_client.iter_search(
                 aoi=aoi,
-                product=self.collection,
+                product=self.collection_name,
                 datetime_range=datetime_range,
                 filters=filters,
                 max_items=max_items,
+                page_size=page_size,
             )
+            first_item = next(items, None)
         except Exception as e:
             logging.error(f"STAC search failed: {e}")
             raise RuntimeError("Failed to search STAC items.") from e
 
-        if not items:
+        if first_item is None:
             raise RuntimeError("No items found for the given parameters.")
 
-        available_assets = list(items[0].assets.keys())
+        available_assets = list(first_item.assets.keys())
         logging.info(f"Available assets in the collection: {available_assets}")
 
         if not asset_keys:
@@ -89,12 +129,133 @@ class STACDownloaderService:
                 "None of the specified asset keys are present in the item."
             )
 
-        logging.info(f"Found {len(items)} items. Downloading: {asset_keys}")
+        logging.info(f"Streaming search results. Downloading: {asset_keys}")
+
+        stac_items = {}
+        requests = self._asset_requests(
+            itertools.chain([first_item], items),
+            asset_keys,
+            aoi,
+            download_type,
+            port_name,
+            stac_items,
+        )
+
+        if self.pipeline_workers is not None:
+            self._run_pipeline(requests, stac_items)
+        else:
+            streaming = self.streaming_downloader is not None and download_type == "bbox"
+            downloader = self.streaming_downloader if streaming else self.concurrent_downloader
+            to_upload = []
+            for result in downloader.download(requests):
+                asset_key, item_id = result["asset"], result["item_id"]
+                if result["error"] is not None:
+                    self._log_asset_error(asset_key, item_id, result["error"])
+                elif streaming:
+                    self.manager.add_band(stac_items[item_id][1], asset_key, result["filepath"])
+                else:
+                    to_upload.append(result)
+                    if len(to_upload) >= self.upload_batch_size:
+                        self._upload(to_upload, stac_items)
+                        to_upload = []
+            self._upload(to_upload, stac_items)
+
+        for item_filename, stac_item in stac_items.values():
+            # Items whose downloads all failed have no assets and are not written.
+            if stac_item.assets:
+                self.manager.commit_item(self.collection, stac_item, item_filename)
 
+        self.manager.flush()
+        logging.info(
+            f"Processed {len(stac_items)} items from "
+            f"{self.stac_client.last_search_stats['pages']} search pages."
+        )
+
+    def _run_pipeline(self, requests: Iterator[Dict], stac_items: Dict) -> None:
+        """
+        Runs the requests through the staged pipeline; the index stage adds each stored band.
+        """
+        workers = self.pipeline_workers
+        pipeline = AssetPipeline(
+            self.downloader_utils,
+            storage=self.storage,
+            index=lambda r: self.manager.add_band(
+                stac_items[r["item_id"]][1], r["asset"], str(r["filepath"])
+            ),
+            target_for=self._storage_target,
+            fetch_workers=workers.get("fetch", 8),
+            encode_workers=workers.get("encode", 2),
+            persist_workers=workers.get("persist", 4),
+            queue_size=workers.get("queue_size", 8),
+            in_memory=self.stream_to_storage,
+        )
+        for result in pipeline.run(requests):
+            if result["error"] is not None:
+                self._log_asset_error(result["asset"], result["item_id"], result["error"])
+
+    def _storage_target(self, filepath) -> str:
+        if not self.storage_prefix:
+            return str(filepath)
+        relative = Path(filepath).relative_to(self.output_dir).as_posix()
+        return f"{self.storage_prefix.rstrip('/')}/{relative}"
+
+    def _upload(self, results: List[Dict], stac_items: Dict) -> None:
+        """
+        Uploads a batch of downloaded files in parallel and adds the stored bands to their items.
+        """
+        uploads = self.storage.save_files(
+            [(str(r["filepath"]), self._storage_target(r["filepath"])) for r in results]
+        )
+        for result, upload in zip(results, uploads):
+            if upload["error"] is not None:
+                self._log_asset_error(result["asset"], result["item_id"], upload["error"])
+                continue
+            self.manager.add_band(stac_items[result["item_id"]][1], result["asset"], upload["target"])
+
+    def _crop_to_storage(self, request: Dict) -> str:
+        """
+        Crops an asset to the AOI and uploads the encoded COG without touching local disk.
+        """
+        data = self.downloader_utils.crop_to_cog_bytes(
+            request["url"], request["aoi"], request.get("cog_profile")
+        )
+        target = self._storage_target(
+            self.downloader_utils._get_cog_filepath(request["local_path"])
+        )
+        return self.storage.save_bytes(data, target)
+
+    def _asset_requests(
+        self,
+        items: Iterator,
+        asset_keys: List[str],
+        aoi: List[float],
+        download_type: str,
+        port_name: Optional[str],
+        stac_items: Dict,
+    ) -> Iterator[Dict]:
+        """
+        Lazily turns streamed search results into download requests.
+
+        Opens the catalog item for each search result (stored in `stac_items`) and
+        yields one request per asset that is not already on disk.
+        """
         for item in items:
             logging.info(f"Processing item: {item.id}")
             item_dir = Path(self.output_dir) / item.id
             item_dir.mkdir(exist_ok=True)
+            item_filename = f"{item.id}_{port_name}" if port_name else f"{item.id}"
+
+            stac_items[item.id] = (
+                item_filename,
+                self.manager.open_item(
+                    collection=self.collection,
+                    item=item,
+                    item_filename=item_filename,
+                    aoi_geojson=item.geometry,
+                    aoi=aoi,
+                    port_name=port_name,
+                ),
+            )
 
             for asset_key in asset_keys:
                 try:
@@ -102,43 +263,37 @@ class STACDownloaderService:
                     band_basename = self.downloader_utils.get_filename_from_url(
                         asset_url
                     ).split(".")[0]
-                    item_filename = (
-                        f"{item.id}_{port_name}" if port_name else f"{item.id}"
-                    )
                     item_filename_with_ext = f"{item_filename}_{band_basename}.tif"
                     filepath = item_dir / item_filename_with_ext
 
-                    if filepath.exists():
-                        logging.info(f"Skipping download: {filepath} already exists.")
-                    else:
-                        final_filepath = self.downloader_utils.download_single_asset(
-                            asset_url,
-                            str(filepath),
-                            download_type=download_type,
-                            aoi=aoi,
-                        )
-                        self.storage.save_file(str(final_filepath), str(final_filepath))
-
-                    self.manager.load_or_create_item(
-                        collection=self.collection,
-                        item=item,
-                        item_filename=item_filename,
-                        aoi_geojson=item.geometry,
-                        aoi=aoi,
-                        new_band_key=asset_key,
-                        new_band_path=str(final_filepath),
-                        port_name=port_name
-                    )
-
-                except FileNotFoundError as e:
-                    logging.error(
-                        f"Local file system error for {asset_key} in {item.id}: {e}"
-                    )
-                except ConnectionError as e:
-                    logging.error(
-                        f"Network error downloading {asset_key} in {item.id}: {e}"
-                    )
-                except TimeoutError as e:
-                    logging.error(f"Timeout downloading {asset_key} in {item.id}: {e}")
+                    # Downloads end up as `<name>_cog.tif`; the plain name only remains
+                    # when COG conversion failed.
+                    cog_filepath = Path(self.downloader_utils._get_cog_filepath(str(filepath)))
+                    existing = next((p for p in (cog_filepath, filepath) if p.exists()), None)
+                    if existing is not None:
+                        logging.info(f"Skipping download: {existing} already exists.")
+                        self.manager.add_band(stac_items[item.id][1], asset_key, str(existing))
+                        continue
+
+                    yield {
+                        "item_id": item.id,
+                        "asset": asset_key,
+                        "url": asset_url,
+                        "local_path": str(filepath),
+                        "download_type": download_type,
+                        "aoi": aoi,
+                        "cog_profile": get_cog_profile(self.collection_name, asset_key),
+                    }
                 except Exception as e:
-                    logging.error(f"Unexpected error for {asset_key} in {item.id}: {e}")
+                    self._log_asset_error(asset_key, item.id, e)
+
+    @staticmethod
+    def _log_asset_error(asset_key: str, item_id: str, e: Exception) -> None:
+        if isinstance(e, FileNotFoundError):
+            logging.error(f"Local file system error for {asset_key} in {item_id}: {e}")
+        elif isinstance(e, ConnectionError):
+            logging.error(f"Network error downloading {asset_key} in {item_id}: {e}")
+        elif isinstance(e, TimeoutError):
+            logging.error(f"Timeout downloading {asset_key} in {item_id}: {e}")
+        else:
+            logging.error(f"Unexpected error for {asset_key} in {item_id}: {e}")
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import urllib3
+
+from ... import metrics
+
+MiB = 1024 * 1024
+
+_POOL_MANAGER: Optional[urllib3.PoolManager] = None
+_POOL_MANAGER_LOCK = threading.Lock()
+
+
+def get_pool_manager(maxsize: int = 32) -> urllib3.PoolManager:
+    """
+    Returns the process-wide keep-alive connection pool used for HTTP downloads.
+
+    Args:
+        maxsize (int): Connections kept alive per host. Only used when the pool is first created.
+    """
+    global _POOL_MANAGER
+    with _POOL_MANAGER_LOCK:
+        if _POOL_MANAGER is None:
+            _POOL_MANAGER = urllib3.PoolManager(
+                num_pools=16,
+                maxsize=maxsize,
+                retries=urllib3.Retry(
+                    total=3,
+                    backoff_factor=0.5,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                ),
+                timeout=urllib3.Timeout(connect=10.0, read=60.0),
+            )
+        return _POOL_MANAGER
+
+
+class HTTPTransfer:
+    def __init__(
+        self,
+        part_size: int = 16 * MiB,
+        parallel_threshold: int = 64 * MiB,
+        max_parallel_ranges: int = 8,
+        max_attempts: int = 3,
+        verify_etag: bool = True,
+    ):
+        """
+        Native HTTP downloader with ranged parallel transfers and resume.
+
+        Data is written to `<local_path>.part` and renamed once it has been verified.
+        Large objects are split into `part_size` ranges fetched in parallel; the
+        completed ranges are tracked in `<local_path>.part.json` so an interrupted
+        download only refetches what is missing.
+
+        Args:
+            part_size (int): Size in bytes of each ranged GET.
+            parallel_threshold (int): Objects at least this large are fetched with parallel ranges.
+            max_parallel_ranges (int): Maximum number of ranges fetched at once for one object.
+            max_attempts (int): Attempts per range (or per stream) before giving up.
+            verify_etag (bool): Check the MD5 of the result when the ETag is a plain MD5 digest.
+        """
+        self.part_size = part_size
+        self.parallel_threshold = parallel_threshold
+        self.max_parallel_ranges = max_parallel_ranges
+        self.max_attempts = max_attempts
+        self.verify_etag = verify_etag
+        self.http = get_pool_manager()
+
+    def _head(self, url: str) -> Tuple[Optional[int], Optional[str], bool]:
+        metrics.inc("http_requests")
+        try:
+            response = self.http.request("HEAD", url, redirect=True)
+        except urllib3.exceptions.HTTPError as e:
+            logging.warning(f"HEAD request failed for {url}: {e}")
+            return None, None, False
+
+        if response.status >= 400:
+            return None, None, False
+
+        length = response.headers.get("Content-Length")
+        etag = response.headers.get("ETag")
+        accepts_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+        return (int(length) if length is not None else None), etag, accepts_ranges
+
+    @staticmethod
+    def _load_state(state_path: str) -> Dict:
+        try:
+            with open(state_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _save_state(state_path: str, state: Dict) -> None:
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+
+    @metrics.timed("http_download")
+    def download(self, url: str, local_path: str) -> str:
+        """
+        Download `url` to `local_path`, resuming any previous partial transfer.
+
+        Args:
+            url (str): HTTP(S) URL of the object.
+            local_path (str): Destination path.
+
+        Raises:
+            ConnectionError: If the server answers with an error status.
+            OSError: If the result does not match the advertised size or ETag.
+
+        Returns:
+            str: The destination path.
+        """
+        os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+        part_path = f"{local_path}.part"
+        state_path = f"{part_path}.json"
+
+        size, etag, accepts_ranges = self._head(url)
+
+        parallel = size is not None and accepts_ranges and size >= self.parallel_threshold
+
+        # A state file means the .part was preallocated for ranged writes; it can
+        # only be reused by another ranged transfer of the very same object.
+        state = self._load_state(state_path)
+        if state and (not parallel or state.get("size") != size or state.get("etag") != etag):
+            logging.info(f"Discarding partial download of {local_path}, restarting")
+            state = {}
+            for path in (part_path, state_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        if parallel:
+            state.setdefault("size", size)
+            state.setdefault("etag", etag)
+            state.setdefault("done", [])
+            self._download_ranges(url, part_path, state_path, state)
+        else:
+            self._download_stream(url, part_path, accepts_ranges)
+
+        try:
+            self._verify(part_path, size, etag, url)
+        except OSError:
+            # Neither the data nor the record of which ranges are done can be trusted.
+            for path in (part_path, state_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+        os.replace(part_path, local_path)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        return local_path
+
+    def _download_stream(self, url: str, part_path: str, accepts_ranges: bool) -> None:
+        for attempt in range(1, self.max_attempts + 1):
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            headers = {"Range": f"bytes={offset}-"} if offset and accepts_ranges else {}
+            metrics.inc("http_requests")
+            if headers:
+                metrics.inc("http_range_requests")
+            try:
+                response = self.http.request(
+                    "GET", url, headers=headers, preload_content=False, redirect=True
+                )
+                try:
+                    if response.status == 416:
+                        return
+                    if response.status >= 400:
+                        raise ConnectionError(f"HTTP {response.status} for {url}")
+                    mode = "ab" if response.status == 206 else "wb"
+                    with open(part_path, mode) as f:
+                        for chunk in response.stream(MiB):
+                            f.write(chunk)
+                            metrics.inc("bytes_downloaded", len(chunk))
+                finally:
+                    response.release_conn()
+                return
+            except (urllib3.exceptions.HTTPError, OSError) as e:
+                if attempt == self.max_attempts:
+                    raise ConnectionError(f"Failed to download {url}: {e}") from e
+                logging.warning(f"Download of {url} interrupted ({e}), resuming (attempt {attempt})")
+
+    def _download_ranges(self, url: str, part_path: str, state_path: str, state: Dict) -> None:
+        size = state["size"]
+        ranges: List[Tuple[int, int, int]] = [
+            (index, start, min(start + self.part_size, size) - 1)
+            for index, start in enumerate(range(0, size, self.part_size))
+        ]
+        if not os.path.exists(part_path):
+            # Ranges recorded as done are lost with the file they were written to.
+            state["done"] = []
+            with open(part_path, "wb") as f:
+                f.truncate(size)
+            self._save_state(state_path, state)
+
+        done = set(state["done"])
+        todo = [r for r in ranges if r[0] not in done]
+
+        state_lock = threading.Lock()
+        fd = os.open(part_path, os.O_WRONLY)
+        try:
+
+            def fetch(byte_range: Tuple[int, int, int]) -> None:
+                index, start, end = byte_range
+                for attempt in range(1, self.max_attempts + 1):
+                    metrics.inc("http_requests")
+                    metrics.inc("http_range_requests")
+                    try:
+                        response = self.http.request(
+                            "GET",
+                            url,
+                            headers={"Range": f"bytes={start}-{end}"},
+                            preload_content=False,
+                            redirect=True,
+                        )
+                        try:
+                            if response.status != 206:
+                                raise ConnectionError(
+                                    f"Expected HTTP 206 for range {start}-{end} of {url}, got {response.status}"
+                                )
+                            offset = start
+                            for chunk in response.stream(MiB):
+                                os.pwrite(fd, chunk, offset)
+                                offset += len(chunk)
+                                metrics.inc("bytes_downloaded", len(chunk))
+                            if offset != end + 1:
+                                raise OSError(f"Short read for range {start}-{end} of {url}")
+                        finally:
+                            response.release_conn()
+                        break
+                    except (urllib3.exceptions.HTTPError, OSError) as e:
+                        if attempt == self.max_attempts:
+                            raise ConnectionError(f"Failed to download range {start}-{end} of {url}: {e}") from e
+                        logging.warning(f"Range {start}-{end} of {url} failed ({e}), retrying")
+
+                with state_lock:
+                    state["done"].append(index)
+                    self._save_state(state_path, state)
+
+            with ThreadPoolExecutor(max_workers=self.max_parallel_ranges) as executor:
+                for future in [executor.submit(fetch, r) for r in todo]:
+                    future.result()
+        finally:
+            os.close(fd)
+
+    def _verify(self, part_path: str, size: Optional[int], etag: Optional[str], url: str) -> None:
+        actual_size = os.path.getsize(part_path)
+        if size is not None and actual_size != size:
+            raise OSError(f"Size mismatch for {url}: expected {size} bytes, got {actual_size}")
+
+        digest = (etag or "").strip('"')
+        if not self.verify_etag or len(digest) != 32 or etag.startswith("W/"):
+            return
+        try:
+            int(digest, 16)
+        except ValueError:
+            return
+
+        md5 = hashlib.md5()
+        with open(part_path, "rb") as f:
+            for chunk in iter(lambda: f.read(8 * MiB), b""):
+                md5.update(chunk)
+        if md5.hexdigest() != digest.lower():
+            raise OSError(f"ETag mismatch for {url}: expected {digest}, got {md5.hexdigest()}")
@@ -0,0 +1,328 @@
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .download_utils import STACAssetDownloaderUtils
+
+_DONE = object()
+# How often blocked queue operations check whether the run was stopped.
+_POLL_SECONDS = 0.1
+
+
+class StagedPipeline:
+    def __init__(self, stages: List[Tuple[str, Callable[[Dict], Dict], int]], queue_size: int = 8):
+        """
+        Runs records through a chain of stages, each with its own worker threads.
+
+        Stages are connected by bounded queues, so a slow stage pushes back on the
+        ones before it (down to the input iterator) instead of buffering without
+        limit. A record whose stage raises is passed on with `error` and
+        `failed_stage` set, and the remaining stages let it through untouched.
+        Each record collects the time spent in every stage under `stage_seconds`.
+
+        Args:
+            stages: (name, function, workers) per stage, in order. The function takes
+                a record dict and returns the (updated) record.
+            queue_size (int): Capacity of each queue between stages.
+        """
+        if not stages or any(workers < 1 for _, _, workers in stages):
+            raise ValueError("At least one stage with one or more workers is required")
+        self.stages = stages
+        self.queue_size = queue_size
+        self.last_stats: Optional[Dict] = None
+
+    def run(self, records: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Feeds `records` through the stages and yields them as they leave the last one.
+
+        Statistics of the run are stored in `last_stats` once the output is exhausted:
+        per stage the record and error counts, busy time, utilisation (busy time over
+        workers x wall time) and the peak / mean depth of the stage's input queue.
+        Closing the generator early (e.g. breaking out of a loop over it) stops the
+        input and the workers; records still in flight are dropped.
+
+        Raises:
+            Exception: Whatever iterating `records` raised, once the records read
+                before the failure have gone through every stage.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        output: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        stats = {
+            name: {"workers": workers, "records": 0, "errors": 0, "busy_seconds": 0.0,
+                   "max_queue_depth": 0, "_depth_sum": 0}
+            for name, _, workers in self.stages
+        }
+        lock = threading.Lock()
+        remaining = [workers for _, _, workers in self.stages]
+        feed_error: List[BaseException] = []
+        stop = threading.Event()
+
+        def put(target: queue.Queue, record) -> bool:
+            while not stop.is_set():
+                try:
+                    target.put(record, timeout=_POLL_SECONDS)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def get(source: queue.Queue):
+            while not stop.is_set():
+                try:
+                    return source.get(timeout=_POLL_SECONDS)
+                except queue.Empty:
+                    pass
+            return None
+
+        def feed():
+            try:
+                for record in records:
+                    if not put(queues[0], record):
+                        return
+            except BaseException as e:
+                logging.error(f"Pipeline input failed: {e}")
+                feed_error.append(e)
+            finally:
+                put(queues[0], _DONE)
+
+        def work(index: int):
+            name, func, _ = self.stages[index]
+            inbox = queues[index]
+            outbox = queues[index + 1] if index + 1 < len(queues) else output
+            stage_stats = stats[name]
+            while True:
+                depth = inbox.qsize()
+                record = get(inbox)
+                if record is None:
+                    return
+                if record is _DONE:
+                    # Let the other workers of this stage see the end marker too;
+                    # the last one to stop closes the next queue.
+                    put(inbox, _DONE)
+                    with lock:
+                        remaining[index] -= 1
+                        last = remaining[index] == 0
+                    if last:
+                        put(outbox, _DONE)
+                    return
+
+                start = time.perf_counter()
+                if record.get("error") is None:
+                    try:
+                        record = func(record)
+                    except Exception as e:
+                        logging.error(f"Pipeline stage '{name}' failed for {record.get('url')}: {e}")
+                        record = {**record, "error": e, "failed_stage": name}
+                elapsed = time.perf_counter() - start
+                record.setdefault("stage_seconds", {})[name] = elapsed
+
+                with lock:
+                    stage_stats["records"] += 1
+                    stage_stats["errors"] += record.get("failed_stage") == name
+                    stage_stats["busy_seconds"] += elapsed
+                    stage_stats["max_queue_depth"] = max(stage_stats["max_queue_depth"], depth)
+                    stage_stats["_depth_sum"] += depth
+                if not put(outbox, record):
+                    return
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=feed, daemon=True)]
+        for index, (_, _, workers) in enumerate(self.stages):
+            threads.extend(
+                threading.Thread(target=work, args=(index,), daemon=True) for _ in range(workers)
+            )
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                record = output.get()
+                if record is _DONE:
+                    break
+                yield record
+        finally:
+            # Also runs when the consumer abandons the generator: unblock every
+            # thread, drop what is still queued and wait for them to exit.
+            stop.set()
+            for pending in queues + [output]:
+                while True:
+                    try:
+                        pending.get_nowait()
+                    except queue.Empty:
+                        break
+            for thread in threads:
+                thread.join()
+
+        wall = time.perf_counter() - start
+        for stage_stats in stats.values():
+            depth_sum = stage_stats.pop("_depth_sum")
+            stage_stats["mean_queue_depth"] = depth_sum / stage_stats["records"] if stage_stats["records"] else 0.0
+            stage_stats["utilisation"] = (
+                stage_stats["busy_seconds"] / (stage_stats["workers"] * wall) if wall > 0 else 0.0
+            )
+        self.last_stats = {"wall_seconds": wall, "stages": stats}
+        print(format_pipeline_stats(self.last_stats))
+        if feed_error:
+            raise feed_error[0]
+
+
+def format_pipeline_stats(stats: Dict) -> str:
+    lines = [f"Pipeline finished in {stats['wall_seconds']:.2f}s"]
+    for name, s in stats["stages"].items():
+        lines.append(
+            f"  {name:<8} workers={s['workers']} records={s['records']} errors={s['errors']} "
+            f"utilisation={s['utilisation']:.0%} queue max={s['max_queue_depth']} "
+            f"mean={s['mean_queue_depth']:.1f}"
+        )
+    return "\n".join(lines)
+
+
+class AssetPipeline:
+    def __init__(
+        self,
+        downloader_utils: Optional[STACAssetDownloaderUtils] = None,
+        storage=None,
+        index: Optional[Callable[[Dict], None]] = None,
+        target_for: Optional[Callable[[str], str]] = None,
+        fetch_workers: int = 8,
+        encode_workers: int = os.cpu_count() or 2,
+        persist_workers: int = 4,
+        queue_size: int = 8,
+        in_memory: bool = False,
+    ):
+        """
+        Download -> COG encode -> storage upload -> catalog index, as overlapping stages.
+
+        Fetching is network bound and encoding CPU bound, so giving each stage its
+        own workers keeps both the NIC and the cores busy.
+
+        Args:
+            downloader_utils: Used for reads, downloads and COG encoding.
+            storage: Storage backend (`save_file` / `save_bytes`). If omitted, COGs stay
+                on local disk.
+            index: Called once per successfully stored asset with its record, from a
+                single thread (e.g. to add the band to a STAC item).
+            target_for: Maps a local COG path to its storage destination. Defaults to
+                the path itself.
+            fetch_workers / encode_workers / persist_workers (int): Threads per stage.
+            queue_size (int): Capacity of each queue between stages.
+            in_memory (bool): For bbox records, encode to bytes and upload them with
+                `storage.save_bytes` without writing a local file.
+        """
+        self.downloader_utils = downloader_utils or STACAssetDownloaderUtils()
+        # Encode workers split the CPUs between their GDAL threads.
+        self.downloader_utils.encode_concurrency = max(self.downloader_utils.encode_concurrency, encode_workers)
+        self.storage = storage
+        self.index = index
+        self.target_for = target_for or str
+        self.in_memory = in_memory and storage is not None
+        self.pipeline = StagedPipeline(
+            [
+                ("fetch", self._fetch, fetch_workers),
+                ("encode", self._encode, encode_workers),
+                ("persist", self._persist, persist_workers),
+                ("index", self._index, 1),
+            ],
+            queue_size=queue_size,
+        )
+
+    @property
+    def last_stats(self) -> Optional[Dict]:
+        return self.pipeline.last_stats
+
+    def run(self, requests: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Processes download requests and yields one result per request.
+
+        Args:
+            requests: Dicts with `url`, `local_path`, `download_type` and `aoi`, as used
+                by `ConcurrentAssetDownloader`. Extra keys are passed through.
+
+        Yields:
+            Dict: The request with `filepath` (stored location), `seconds` (time spent in
+            all stages) and `error` (None on success), plus `failed_stage` on failure and
+            `cached` when the COG came from the tile cache.
+        """
+        for record in self.pipeline.run(requests):
+            record.pop("image", None)
+            record.pop("data", None)
+            record.setdefault("error", None)
+            record.setdefault("filepath", None)
+            record["seconds"] = sum(record.get("stage_seconds", {}).values())
+            yield record
+
+    def _fetch(self, record: Dict) -> Dict:
+        utils = self.downloader_utils
+        url, local_path = record["url"], record["local_path"]
+        if record.get("download_type", "bbox") == "bbox":
+            cache_key = utils.tile_cache_key(url, record["aoi"], record.get("cog_profile"))
+            if cache_key and self._from_tile_cache(record, cache_key):
+                return record
+            record["tile_cache_key"] = cache_key
+            record["image"] = utils.read_bbox(url, record["aoi"])
+        elif url.startswith("s3://"):
+            utils._download_from_s3(url, local_path)
+            record["raw_path"] = local_path
+        else:
+            utils._download_http(url, local_path)
+            record["raw_path"] = local_path
+        return record
+
+    def _from_tile_cache(self, record: Dict, cache_key: str) -> bool:
+        """
+        Fills `data` or `cog_path` of a bbox record from the tile cache. Returns False on a miss.
+        """
+        tile_cache = self.downloader_utils.tile_cache
+        if self.in_memory:
+            data = tile_cache.get_bytes(cache_key)
+            if data is None:
+                return False
+            record["data"] = data
+        else:
+            cog_path = self.downloader_utils._get_cog_filepath(record["local_path"])
+            if not tile_cache.get(cache_key, cog_path):
+                return False
+        record["cog_path"] = self.downloader_utils._get_cog_filepath(record["local_path"])
+        record["cached"] = True
+        return True
+
+    def _encode(self, record: Dict) -> Dict:
+        if record.get("cached"):
+            return record
+        utils = self.downloader_utils
+        cog_path = utils._get_cog_filepath(record["local_path"])
+        cache_key = record.pop("tile_cache_key", None)
+        cog_profile = record.get("cog_profile")
+        if "image" in record:
+            image = record.pop("image")
+            if self.in_memory:
+                record["data"] = utils._encode_image_cog(image, cog_profile)
+                if cache_key:
+                    utils.tile_cache.put_bytes(cache_key, record["data"])
+            else:
+                utils._write_image_cog(image, cog_path, cog_profile)
+                if cache_key:
+                    utils.tile_cache.put(cache_key, cog_path)
+        else:
+            utils._translate_to_cog(record["raw_path"], cog_path, cog_profile)
+            os.remove(record.pop("raw_path"))
+        record["cog_path"] = cog_path
+        return record
+
+    def _persist(self, record: Dict) -> Dict:
+        target = self.target_for(record["cog_path"])
+        if "data" in record:
+            record["filepath"] = self.storage.save_bytes(record.pop("data"), target)
+        elif self.storage is not None:
+            record["filepath"] = self.storage.save_file(record["cog_path"], target)
+        else:
+            record["filepath"] = record["cog_path"]
+        return record
+
+    def _index(self, record: Dict) -> Dict:
+        if self.index is not None:
+            self.index(record)
+        return record
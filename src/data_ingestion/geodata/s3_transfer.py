@@ -0,0 +1,139 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+from ... import metrics
+
+MiB = 1024 * 1024
+
+_S3_CLIENT = None
+_S3_CLIENT_LOCK = threading.Lock()
+
+
+def get_s3_client(max_pool_connections: int = 64):
+    """
+    Returns the process-wide unsigned S3 client, creating it on first use.
+
+    boto3 clients are thread-safe, so one client (and its connection pool) is
+    shared by every download in the process.
+
+    Args:
+        max_pool_connections (int): Size of the client's connection pool. Only used
+            when the client is first created.
+    """
+    global _S3_CLIENT
+    with _S3_CLIENT_LOCK:
+        if _S3_CLIENT is None:
+            # boto3 takes a few hundred ms to import; only tasks reading s3:// pay for it.
+            import boto3
+            from botocore import UNSIGNED
+            from botocore.config import Config
+
+            _S3_CLIENT = boto3.session.Session().client(
+                "s3",
+                config=Config(
+                    signature_version=UNSIGNED,
+                    max_pool_connections=max_pool_connections,
+                    retries={"max_attempts": 5, "mode": "adaptive"},
+                ),
+            )
+        return _S3_CLIENT
+
+
+def parse_s3_url(s3_url: str) -> Tuple[str, str]:
+    """Splits an s3://bucket/key URL into (bucket, key)."""
+    bucket, *key_parts = s3_url.replace("s3://", "").split("/")
+    return bucket, "/".join(key_parts)
+
+
+class S3Downloader:
+    def __init__(
+        self,
+        multipart_threshold: int = 16 * MiB,
+        multipart_chunksize: int = 16 * MiB,
+        max_concurrency: int = 8,
+    ):
+        """
+        Downloads s3:// objects through the shared client with ranged multipart transfers.
+
+        Args:
+            multipart_threshold (int): Objects at least this large are fetched as parallel ranges.
+            multipart_chunksize (int): Size in bytes of each ranged part.
+            max_concurrency (int): Parallel ranges per object.
+        """
+        self.multipart_threshold = multipart_threshold
+        self.multipart_chunksize = multipart_chunksize
+        self.max_concurrency = max_concurrency
+        self._transfer_config = None
+
+    @property
+    def transfer_config(self):
+        if self._transfer_config is None:
+            from boto3.s3.transfer import TransferConfig
+
+            self._transfer_config = TransferConfig(
+                multipart_threshold=self.multipart_threshold,
+                multipart_chunksize=self.multipart_chunksize,
+                max_concurrency=self.max_concurrency,
+                use_threads=self.max_concurrency > 1,
+            )
+        return self._transfer_config
+
+    @property
+    def client(self):
+        return get_s3_client()
+
+    def download(self, s3_url: str, local_path: str) -> str:
+        """
+        Download a single s3:// object to a local path.
+
+        Returns:
+            str: The local path.
+        """
+        bucket, key = parse_s3_url(s3_url)
+        return self.download_key(bucket, key, local_path)
+
+    def download_key(self, bucket: str, key: str, local_path: str) -> str:
+        os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+        with metrics.span("s3_download"):
+            self.client.download_file(bucket, key, local_path, Config=self.transfer_config)
+        metrics.inc("s3_objects_downloaded")
+        metrics.inc("bytes_downloaded", os.path.getsize(local_path))
+        return local_path
+
+    def download_many(
+        self, bucket: str, keys_to_paths: Dict[str, str], max_workers: int = 16
+    ) -> List[Dict]:
+        """
+        Download many keys from one bucket in parallel.
+
+        Large keys additionally use ranged parts according to the transfer settings,
+        so the total number of connections is up to `max_workers * max_concurrency`.
+
+        Args:
+            bucket (str): Bucket name.
+            keys_to_paths (Dict[str, str]): Mapping of object key to local destination path.
+            max_workers (int): Number of keys downloaded at once.
+
+        Returns:
+            List[Dict]: One result per key with `key`, `local_path` and `error`
+            (None on success), in completion order.
+        """
+        results = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self.download_key, bucket, key, local_path): (key, local_path)
+                for key, local_path in keys_to_paths.items()
+            }
+            for future in as_completed(futures):
+                key, local_path = futures[future]
+                error: Optional[Exception] = None
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error(f"Failed to download s3://{bucket}/{key}: {e}")
+                    error = e
+                results.append({"key": key, "local_path": local_path, "error": error})
+        return results
@@ -0,0 +1,244 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+from ... import metrics
+
+GiB = 1024 * 1024 * 1024
+
+# Query parameters of signed URLs (Azure SAS, S3 presigned). They change with every
+# token, not with the content, so they are left out of the cache key.
+_SIGNATURE_PARAMS = {"st", "se", "sp", "sv", "sr", "sig", "spr", "skoid", "sktid", "skt", "ske", "sks", "skv"}
+
+
+def _default_cache_dir() -> str:
+    return os.environ.get(
+        "TILE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "data-platform-tile-cache")
+    )
+
+
+def _normalise_href(href: str) -> str:
+    parsed = urlparse(href)
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if key.lower() not in _SIGNATURE_PARAMS and not key.lower().startswith("x-amz-")
+    ]
+    return urlunparse(parsed._replace(query=urlencode(query)))
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    """Hard-links `src` to `dst` (replacing it), copying when linking is not possible."""
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    tmp_path = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+
+class TileCache:
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        """
+        Content-addressed on-disk cache of encoded bbox COGs.
+
+        Entries are keyed by a hash of (asset href, AOI, output profile), so the same
+        crop requested by two ports, or again by a retried run, is encoded once.
+        Files are written under a temporary name and renamed into place, and
+        eviction runs under a file lock, so every task on a node can share one
+        `cache_dir`. When the cache grows past `max_bytes`, the least recently used
+        entries are removed (recency is the file's mtime, refreshed on every hit).
+
+        Entries are hard-linked into their destination when cache and output share a
+        filesystem, so a hit costs no copy and no extra disk space.
+
+        Args:
+            cache_dir (str, optional): Cache directory. Defaults to `TILE_CACHE_DIR` or a
+                directory under the system temp dir.
+            max_bytes (int, optional): Size budget. Defaults to `TILE_CACHE_MAX_BYTES` or 5 GiB.
+        """
+        self.cache_dir = cache_dir or _default_cache_dir()
+        self.max_bytes = (
+            max_bytes if max_bytes is not None else int(os.environ.get("TILE_CACHE_MAX_BYTES", 5 * GiB))
+        )
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bytes_evicted": 0}
+
+    @staticmethod
+    def key(href: str, aoi: List[float], profile: Any, **extra) -> str:
+        """
+        Cache key of a crop: a SHA-256 of the href (without signature parameters), the
+        AOI, the output profile and any `extra` parameters that change the output.
+        """
+        payload = {
+            "href": _normalise_href(href),
+            "aoi": [round(float(v), 9) for v in aoi],
+            "profile": profile,
+            **extra,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.tif")
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += value
+        metrics.inc(f"tile_cache_{name}", value)
+
+    def _touch(self, path: str) -> bool:
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def get(self, key: str, dest_path: str) -> bool:
+        """
+        Materialises entry `key` at `dest_path`.
+
+        Returns:
+            bool: True on a hit, False if the entry is not cached.
+        """
+        path = self.path_for(key)
+        if self._touch(path):
+            try:
+                _link_or_copy(path, dest_path)
+                self._count("hits")
+                return True
+            except OSError as e:
+                # Evicted by another task between the touch and the link.
+                logging.debug(f"Tile cache entry {key} vanished: {e}")
+        self._count("misses")
+        return False
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        """Returns the content of entry `key`, or None if it is not cached."""
+        path = self.path_for(key)
+        if self._touch(path):
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                self._count("hits")
+                return data
+            except OSError:
+                pass
+        self._count("misses")
+        return None
+
+    def put(self, key: str, src_path: str) -> None:
+        """
+        Adds `src_path` to the cache as entry `key`. Failures are logged, not raised:
+        the cache must never fail a download.
+        """
+        try:
+            _link_or_copy(src_path, self.path_for(key))
+            self._stored(os.path.getsize(src_path))
+        except OSError as e:
+            logging.warning(f"Could not add {src_path} to the tile cache: {e}")
+
+    def put_bytes(self, key: str, data: bytes) -> None:
+        """Adds encoded bytes to the cache as entry `key`."""
+        path = self.path_for(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._stored(len(data))
+        except OSError as e:
+            logging.warning(f"Could not add entry {key} to the tile cache: {e}")
+
+    def _stored(self, size: int) -> None:
+        self._count("stores")
+        metrics.inc("tile_cache_bytes_stored", size)
+        self.evict()
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _entries(self) -> List[Tuple[str, os.stat_result]]:
+        entries = []
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".tif"):
+                    try:
+                        entries.append((entry.path, entry.stat()))
+                    except OSError:
+                        continue
+        return entries
+
+    def evict(self) -> int:
+        """
+        Removes least recently used entries until the cache fits its budget.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        with self._file_lock():
+            entries = self._entries()
+            total = sum(stat.st_size for _, stat in entries)
+            if total <= self.max_bytes:
+                return 0
+            removed = 0
+            for path, stat in sorted(entries, key=lambda e: e[1].st_mtime):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= stat.st_size
+                removed += 1
+                self._count("bytes_evicted", stat.st_size)
+            self._count("evictions", removed)
+            return removed
+
+    def size(self) -> Dict:
+        """Number of entries and total bytes currently on disk."""
+        entries = self._entries() if os.path.isdir(self.cache_dir) else []
+        return {"entries": len(entries), "bytes": sum(stat.st_size for _, stat in entries)}
+
+    def report(self) -> Dict:
+        """Returns the hit/miss/eviction counts of this process and the hit rate."""
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_SHARED_CACHE: Optional[TileCache] = None
+_SHARED_CACHE_LOCK = threading.Lock()
+
+
+def get_tile_cache() -> Optional[TileCache]:
+    """
+    Returns the process-wide tile cache, or None when `TILE_CACHE_MAX_BYTES` is 0.
+    """
+    global _SHARED_CACHE
+    if int(os.environ.get("TILE_CACHE_MAX_BYTES", 5 * GiB)) <= 0:
+        return None
+    with _SHARED_CACHE_LOCK:
+        if _SHARED_CACHE is None or _SHARED_CACHE.cache_dir != _default_cache_dir():
+            _SHARED_CACHE = TileCache()
+        return _SHARED_CACHE
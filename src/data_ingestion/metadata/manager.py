@@ -2,42 +2,240 @@ import os
 from datetime import datetime
 import json
 import shutil
+import threading
+import time
 import pystac
-import subprocess
+from contextlib import contextmanager
 from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from ... import metrics
+from .state_index import open_state_index
+
+# pypgstac (and, through its loader, smart_open with the cloud SDKs) takes about a
+# second to import, so it is only loaded once a task actually talks to pgSTAC.
+if TYPE_CHECKING:
+    from pypgstac.db import PgstacDB
+
+
+_PGSTAC_DBS: Dict[str, "PgstacDB"] = {}
+_PGSTAC_DBS_LOCK = threading.Lock()
+
+
+def _get_pgstac_db(dsn: str) -> "PgstacDB":
+    """
+    Returns the process-wide pypgstac database handle for a DSN.
+
+    The handle owns a psycopg connection pool, so every loader created in the
+    same process reuses the same connection instead of opening a new one.
+    """
+    with _PGSTAC_DBS_LOCK:
+        db = _PGSTAC_DBS.get(dsn)
+        if db is None:
+            from pypgstac.db import PgstacDB
+
+            db = PgstacDB(dsn=dsn)
+            _PGSTAC_DBS[dsn] = db
+        return db
+
+
+def pgstac_item_id(item_id: str, port_name: Optional[str]) -> str:
+    """
+    Id of a scene's item for one port in pgSTAC.
+
+    The catalog keeps one item per (scene, port) but pgSTAC keeps one row per
+    (collection, id), so the port is part of the id: without it the ports of a
+    scene would overwrite each other.
+    """
+    if not port_name:
+        return item_id
+    port = port_name.replace("/", "_").replace("\\", "_").replace(" ", "_")
+    return f"{item_id}_{port}"
 
 
 class PgStacLoader:
-    def __init__(self, dsn):
+    def __init__(self, dsn, batch_size: int = 100):
+        """
+        In-process pgSTAC loader.
+
+        Items are buffered and written in batches through pypgstac's Loader,
+        one transaction per batch. Repeated loads of the same item (scene and
+        port) before a flush are collapsed so only the latest version is written.
+        Items are stored under `pgstac_item_id`, with the scene id kept in the
+        `scene_id` property.
+
+        Args:
+            dsn (str): pgSTAC connection string.
+            batch_size (int): Number of distinct items buffered before an automatic flush.
+        """
         self.dsn = dsn
+        self.batch_size = batch_size
+        self.batch_stats: List[Dict] = []
+        self._pending_items: Dict[tuple, dict] = {}
+        self._loaded_collections = set()
+        self._lock = threading.Lock()
+        self._loader = None
+
+    def _get_loader(self):
+        if self._loader is None:
+            from pypgstac.load import Loader
+
+            self._loader = Loader(db=_get_pgstac_db(self.dsn))
+        return self._loader
 
     def load_collection(self, collection_path):
-        subprocess.run([
-            "pypgstac", "load", "collections", collection_path,
-            "--dsn", self.dsn, "--method" ,"insert_ignore",
-        ], check=True)
-       
+        with open(collection_path, "r") as f:
+            collection = json.load(f)
+
+        if collection["id"] in self._loaded_collections:
+            return
+
+        from pypgstac.load import Methods
+
+        self._get_loader().load_collections(
+            iter([collection]), insert_mode=Methods.insert_ignore
+        )
+        self._loaded_collections.add(collection["id"])
+
     def load_item(self, item_path):
-        subprocess.run([
-            "pypgstac", "load","items", item_path,
-            "--dsn", self.dsn, "--method" ,"insert_ignore",
-        ], check=True)
-        
+        with open(item_path, "r") as f:
+            self.add_item(json.load(f))
+
+    def add_item(self, item: dict) -> None:
+        """
+        Buffers an item for the next batch, replacing any pending version of it.
+        """
+        properties = item.get("properties", {})
+        scene_id = properties.get("scene_id", item["id"])
+        item = {
+            **item,
+            "id": pgstac_item_id(scene_id, properties.get("port_name")),
+            "properties": {**properties, "scene_id": scene_id},
+        }
+        with self._lock:
+            key = (item.get("collection"), item["id"])
+            self._pending_items.pop(key, None)
+            self._pending_items[key] = item
+            should_flush = len(self._pending_items) >= self.batch_size
+
+        if should_flush:
+            self.flush()
+
+    def existing_assets(
+        self, collection_id: str, pairs: Iterable[Tuple[str, Optional[str]]]
+    ) -> Dict[Tuple[str, str], Set[str]]:
+        """
+        Resolves which (item_id, port) pairs are already in pgSTAC, with one query.
+
+        The lookup runs on the pooled connection of the loader's DSN, by the
+        port-specific ids of `pgstac_item_id`.
+
+        Args:
+            collection_id (str): Collection id.
+            pairs: (item_id, port) candidates.
+
+        Returns:
+            Dict[Tuple[str, str], Set[str]]: Asset keys per (item_id, port) found in
+            pgSTAC. Pairs that are not loaded are absent.
+        """
+        wanted = {
+            pgstac_item_id(item_id, port): (item_id, port or "") for item_id, port in pairs
+        }
+        if not wanted:
+            return {}
+
+        with metrics.span("pgstac_query"):
+            rows = list(_get_pgstac_db(self.dsn).query(
+                """
+                SELECT id,
+                       ARRAY(SELECT jsonb_object_keys(coalesce(content->'assets', '{}'::jsonb)))
+                FROM pgstac.items
+                WHERE collection = %s AND id = ANY(%s)
+                """,
+                [collection_id, sorted(wanted)],
+            ))
 
+        found: Dict[Tuple[str, str], Set[str]] = {}
+        for row in rows:
+            if row is None:
+                continue
+            pgstac_id, asset_keys = row
+            if pgstac_id in wanted:
+                found.setdefault(wanted[pgstac_id], set()).update(asset_keys)
+        metrics.inc("pgstac_rows_read", len(rows))
+        metrics.inc("pgstac_existing_hits", len(found))
+        return found
+
+    def flush(self) -> Optional[Dict]:
+        """
+        Writes all buffered items to pgSTAC in a single transaction.
+
+        The buffer is cleared only once the transaction has committed, so a failed
+        batch is retried by the next flush (or `close`).
+
+        Returns:
+            dict: Batch statistics (item count and latency), or None if nothing was pending.
+        """
+        with self._lock:
+            if not self._pending_items:
+                return None
+            items = list(self._pending_items.values())
 
-    
+            from pypgstac.load import Methods
+
+            loader = self._get_loader()
+            start = time.perf_counter()
+            conn = loader.db.connect()
+            with conn.transaction():
+                loader.load_items(iter(items), insert_mode=Methods.upsert)
+            self._pending_items = {}
+            elapsed = time.perf_counter() - start
+            metrics.observe("pgstac_load", elapsed)
+            metrics.inc("pgstac_rows_loaded", len(items))
+
+            stats = {"items": len(items), "seconds": elapsed}
+            self.batch_stats.append(stats)
+            print(f"Loaded batch of {len(items)} items into pgSTAC in {elapsed:.3f}s")
+            return stats
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
 
 class MetadataManager:
-    def __init__(self, catalog_path: str, pgstac_dsn: str):
+    def __init__(self, catalog_path: str, pgstac_dsn: str, pgstac_batch_size: int = 100):
         """
         Initialize the metadata manager with the path to the STAC catalog.
+
+        Items destined for pgSTAC are buffered; call `flush()` (or use the
+        manager as a context manager) once the batch of work is done.
         """
         self.catalog_path = catalog_path
         self.catalog = None
+        self.state_index = open_state_index(catalog_path)
+
+        self.pypgstac_client = (
+            PgStacLoader(pgstac_dsn, batch_size=pgstac_batch_size) if pgstac_dsn else None
+        )
 
-        self.pypgstac_client = PgStacLoader(pgstac_dsn) if pgstac_dsn else None
-            
+    def flush(self) -> None:
+        """
+        Writes any items still buffered for pgSTAC.
+        """
+        if self.pypgstac_client:
+            self.pypgstac_client.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
 
     def _get_catalog_path(self) -> str:
         return os.path.join(self.catalog_path, "catalog.json")
@@ -118,34 +316,30 @@ class MetadataManager:
 
         return collection
 
-    def load_or_create_item(
+    def open_item(
         self,
         collection: pystac.Collection,
         item: pystac.Item,
         item_filename: str,
         aoi_geojson: dict,
         aoi: list,
-        new_band_key: str,
-        new_band_path: str,
         port_name: str,
     ) -> pystac.Item:
         """
-        Loads or creates a STAC item and adds a new band asset to it incrementally.
+        Loads a STAC item from disk or creates a new one, without persisting it.
 
         Args:
             collection: The STAC collection the item belongs to.
             item: A pystac.Item instance with id, datetime, and properties.
+            item_filename: Name of the item directory/JSON file in the catalog.
             aoi_geojson: Geometry in GeoJSON format.
             aoi: Bounding box list [minLon, minLat, maxLon, maxLat].
-            new_band_key: Asset key (e.g., "red", "green").
-            new_band_path: Path to the band GeoTIFF.
+            port_name: Name of the port the item was downloaded for.
 
         Returns:
-            The updated STAC item.
+            The in-memory STAC item.
         """
-        item_dir = self._get_item_dir(collection.id, item_filename)
         item_path = self._get_item_path(collection.id, item_filename)
-        os.makedirs(item_dir, exist_ok=True)
 
         if os.path.exists(item_path):
             item = pystac.Item.from_file(item_path)  ## TODO: check from the pgstac database of the item.id + region name => could "goulette" and "tunis" ports have the same item id, but different region names
@@ -157,36 +351,159 @@ class MetadataManager:
                 geometry=aoi_geojson,
                 bbox=aoi,
                 datetime=item.datetime or datetime.utcnow(),
-                properties=item.properties,
+                properties=dict(item.properties),
                 collection=collection.id,
             )
             item.properties['port_name'] = port_name
             print(f"New item '{item.id}' created.")
 
-        if new_band_key not in item.assets:
-            item.add_asset(
-                new_band_key,
-                pystac.Asset(
-                    href=new_band_path,
-                    media_type="image/tiff; application=geotiff",
-                    roles=["data"],
-                    title=f"{new_band_key.capitalize()} Band",
-                ),
-            )
-            print(f"Band '{new_band_key}' added.")
-        else:
-            print(f"Band '{new_band_key}' already exists, skipping.")
+        return item
+
+    def add_band(self, item: pystac.Item, band_key: str, band_path: str) -> bool:
+        """
+        Adds a band asset to an in-memory STAC item.
+
+        Args:
+            item: The STAC item returned by `open_item`.
+            band_key: Asset key (e.g., "red", "green").
+            band_path: Path to the band GeoTIFF.
+
+        Returns:
+            True if the band was added, False if it already existed.
+        """
+        if band_key in item.assets:
+            print(f"Band '{band_key}' already exists, skipping.")
+            return False
+
+        item.add_asset(
+            band_key,
+            pystac.Asset(
+                href=band_path,
+                media_type="image/tiff; application=geotiff",
+                roles=["data"],
+                title=f"{band_key.capitalize()} Band",
+            ),
+        )
+        print(f"Band '{band_key}' added.")
+        return True
+
+    @metrics.timed("catalog_commit")
+    def commit_item(
+        self, collection: pystac.Collection, item: pystac.Item, item_filename: str
+    ) -> pystac.Item:
+        """
+        Writes the item JSON to the catalog, records its assets in the local
+        state index and queues it for pgSTAC.
+
+        Args:
+            collection: The STAC collection the item belongs to.
+            item: The STAC item to persist.
+            item_filename: Name of the item directory/JSON file in the catalog.
+
+        Returns:
+            The persisted STAC item.
+        """
+        item_dir = self._get_item_dir(collection.id, item_filename)
+        item_path = self._get_item_path(collection.id, item_filename)
+        os.makedirs(item_dir, exist_ok=True)
 
         item.save_object(dest_href=str(item_path))
+        self.state_index.record_item(
+            collection.id,
+            item.id,
+            item.properties.get("port_name"),
+            {key: asset.href for key, asset in item.assets.items()},
+        )
 
-        
-        if self.pypgstac_client:
-            self.pypgstac_client.load_item(str(item_path))
+        if self.pypgstac_client:
+            self.pypgstac_client.add_item(item.to_dict())
 
         # try:
         #     Path(item_path).unlink() ## TODO :  removing the json files from the disk is crucial, we need to make sure it's an atomic process
         #     print(f"Temporary item file '{item_filename}' removed.")
         # except Exception as e:
         #     print(f"Warning: Could not remove temporary file '{item_filename}': {e}")
-        
-        return item
+
+        return item
+
+    @contextmanager
+    def assemble_item(
+        self,
+        collection: pystac.Collection,
+        item: pystac.Item,
+        item_filename: str,
+        aoi_geojson: dict,
+        aoi: list,
+        port_name: str,
+    ) -> Iterator[pystac.Item]:
+        """
+        Keeps a STAC item in memory while its assets are added, then persists it once.
+
+        The item is read from (or created for) the catalog on entry. Bands are
+        added with `add_band`, and on a clean exit the item is written to disk
+        and queued for pgSTAC a single time, whatever the number of bands. A new
+        item that got no band (e.g. all its downloads failed) is not written.
+
+        Example:
+            with manager.assemble_item(collection, item, name, geom, bbox, port) as stac_item:
+                for key, path in bands.items():
+                    manager.add_band(stac_item, key, path)
+
+        Yields:
+            The in-memory STAC item.
+        """
+        existed = os.path.exists(self._get_item_path(collection.id, item_filename))
+        stac_item = self.open_item(
+            collection=collection,
+            item=item,
+            item_filename=item_filename,
+            aoi_geojson=aoi_geojson,
+            aoi=aoi,
+            port_name=port_name,
+        )
+        assets_before = set(stac_item.assets)
+        yield stac_item
+        if existed or set(stac_item.assets) - assets_before:
+            self.commit_item(collection, stac_item, item_filename)
+        else:
+            print(f"No band added to new item '{item_filename}', not writing it.")
+
+    def load_or_create_item(
+        self,
+        collection: pystac.Collection,
+        item: pystac.Item,
+        item_filename: str,
+        aoi_geojson: dict,
+        aoi: list,
+        new_band_key: str,
+        new_band_path: str,
+        port_name: str,
+    ) -> pystac.Item:
+        """
+        Loads or creates a STAC item and adds a new band asset to it incrementally.
+
+        Every call reads and writes the item; prefer `assemble_item` when several
+        bands of the same item are downloaded together.
+
+        Args:
+            collection: The STAC collection the item belongs to.
+            item: A pystac.Item instance with id, datetime, and properties.
+            aoi_geojson: Geometry in GeoJSON format.
+            aoi: Bounding box list [minLon, minLat, maxLon, maxLat].
+            new_band_key: Asset key (e.g., "red", "green").
+            new_band_path: Path to the band GeoTIFF.
+
+        Returns:
+            The updated STAC item.
+        """
+        with self.assemble_item(
+            collection=collection,
+            item=item,
+            item_filename=item_filename,
+            aoi_geojson=aoi_geojson,
+            aoi=aoi,
+            port_name=port_name,
+        ) as stac_item:
+            self.add_band(stac_item, new_band_key, new_band_path)
+
+        return stac_item
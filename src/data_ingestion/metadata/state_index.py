@@ -0,0 +1,165 @@
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from ... import metrics
+
+
+class LocalStateIndex:
+    def __init__(self, db_path: str):
+        """
+        SQLite index of the assets already ingested per (collection, item_id, port).
+
+        Replaces globbing and parsing item JSON files for skip detection: lookups
+        are primary-key hits and many candidates are resolved in one query. The
+        database runs in WAL mode so several processes on a node can share it.
+
+        Args:
+            db_path (str): Path of the SQLite database file.
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS item_assets (
+                collection TEXT NOT NULL,
+                item_id TEXT NOT NULL,
+                port TEXT NOT NULL,
+                asset TEXT NOT NULL,
+                href TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (collection, item_id, port, asset)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.commit()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM item_assets LIMIT 1").fetchone() is None
+
+    def record_item(
+        self, collection: str, item_id: str, port: Optional[str], assets: Dict[str, str]
+    ) -> None:
+        """
+        Records (or refreshes) the assets of one item for one port.
+
+        Args:
+            collection (str): Collection id.
+            item_id (str): STAC item id.
+            port (str, optional): Port name the item was downloaded for.
+            assets (Dict[str, str]): Asset key to href.
+        """
+        now = time.time()
+        rows = [(collection, item_id, port or "", key, href, now) for key, href in assets.items()]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO item_assets (collection, item_id, port, asset, href, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (collection, item_id, port, asset)
+                DO UPDATE SET href = excluded.href, updated_at = excluded.updated_at
+                """,
+                rows,
+            )
+
+    def existing_assets(
+        self, collection: str, pairs: Iterable[Tuple[str, Optional[str]]]
+    ) -> Dict[Tuple[str, str], Set[str]]:
+        """
+        Resolves the recorded assets of many (item_id, port) pairs in one query.
+
+        Args:
+            collection (str): Collection id.
+            pairs: (item_id, port) candidates.
+
+        Returns:
+            Dict[Tuple[str, str], Set[str]]: Asset keys per (item_id, port) found in
+            the index. Pairs with nothing recorded are absent.
+        """
+        pairs = list({(item_id, port or "") for item_id, port in pairs})
+        if not pairs:
+            return {}
+
+        found: Dict[Tuple[str, str], Set[str]] = {}
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS candidates (item_id TEXT, port TEXT)"
+            )
+            self._conn.execute("DELETE FROM candidates")
+            self._conn.executemany("INSERT INTO candidates VALUES (?, ?)", pairs)
+            rows = self._conn.execute(
+                """
+                SELECT a.item_id, a.port, a.asset
+                FROM candidates c
+                JOIN item_assets a
+                  ON a.collection = ? AND a.item_id = c.item_id AND a.port = c.port
+                """,
+                (collection,),
+            ).fetchall()
+
+        for item_id, port, asset in rows:
+            found.setdefault((item_id, port), set()).add(asset)
+        metrics.inc("state_index_hits", len(found))
+        metrics.inc("state_index_misses", len(pairs) - len(found))
+        return found
+
+    def rebuild_from_catalog(self, catalog_path: str) -> int:
+        """
+        Backfills the index from the item JSON files of a catalog written by MetadataManager.
+
+        Returns:
+            int: Number of items indexed.
+        """
+        count = 0
+        pattern = os.path.join(catalog_path, "collections", "*", "*", "*.json")
+        for item_file in glob.glob(pattern):
+            try:
+                with open(item_file, "r") as f:
+                    item = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error reading {item_file}: {e}")
+                continue
+            if item.get("type") != "Feature" or not item.get("collection"):
+                continue
+            self.record_item(
+                item["collection"],
+                item["id"],
+                item.get("properties", {}).get("port_name"),
+                {key: asset.get("href") for key, asset in item.get("assets", {}).items()},
+            )
+            count += 1
+        return count
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open_state_index(catalog_path: str) -> LocalStateIndex:
+    """
+    Opens the state index stored next to a catalog, backfilling it on first use.
+
+    Each call opens a SQLite connection (and checks whether a backfill is needed),
+    so open it once per step and close it, e.g. `with open_state_index(path) as index:`.
+    """
+    index = LocalStateIndex(os.path.join(catalog_path, "state_index.sqlite"))
+    if index.is_empty():
+        count = index.rebuild_from_catalog(catalog_path)
+        if count:
+            print(f"Indexed {count} existing items from {catalog_path}.")
+    return index
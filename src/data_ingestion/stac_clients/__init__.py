@@ -1,11 +1,28 @@
 # from .copernicus import CopernicusSTACClient
 import json
+import os
+import threading
+from functools import lru_cache
 from pathlib import Path
 
-from .element84 import Element84STACClient
-from .planetary import PlanetarySTACClient
+from .catalog_cache import CollectionCatalogCache
 
+# Element84 assets are public: read them from S3 without credentials.
+os.environ["AWS_NO_SIGN_REQUEST"] = "YES"
 
+# The client classes pull in pystac_client (and planetary_computer), so they are
+# only imported when a client is created or the class is accessed.
+_LAZY_CLIENTS = {
+    "Element84STACClient": ".element84",
+    "PlanetarySTACClient": ".planetary",
+}
+
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+_COLLECTION_CACHE = CollectionCatalogCache()
+
+
+@lru_cache(maxsize=None)
 def load_collection_config(config_filename: str) -> dict:
     """
     Loads the STAC collection-to-endpoint mapping from a JSON config file.
@@ -28,9 +45,33 @@ def load_collection_config(config_filename: str) -> dict:
 
 
 def _get_stac_client(url: str):
+    """
+    Returns the process-wide STAC client for an endpoint, opening it on first use.
+    """
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(url)
+        if client is None:
+            client = _create_stac_client(url)
+            _CLIENTS[url] = client
+        return client
+
+
+def __getattr__(name: str):
+    if name in _LAZY_CLIENTS:
+        import importlib
+
+        return getattr(importlib.import_module(_LAZY_CLIENTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _create_stac_client(url: str):
     if "planetarycomputer" in url:
+        from .planetary import PlanetarySTACClient
+
         return PlanetarySTACClient(url)
     elif "earth-search.aws" in url:
+        from .element84 import Element84STACClient
+
         return Element84STACClient(url)
     # elif "copernicus" in url:
     #     return CopernicusSTACClient(url)
@@ -42,6 +83,9 @@ def _validate_collection_exists(client, collection_id: str) -> bool:
     """
     Checks if the specified collection_id exists in the STAC client's catalog.
 
+    The endpoint's collection list is served from a TTL cache shared by the
+    tasks of a node (see `CollectionCatalogCache`).
+
     Args:
         client: A STAC client instance.
         collection_id (str): The collection ID to validate.
@@ -51,7 +95,12 @@ def _validate_collection_exists(client, collection_id: str) -> bool:
     """
     collection_id = collection_id.lower()
 
-    available_ids = [col.lower() for col in client.get_available_collections()]
+    available_ids = [
+        col.lower()
+        for col in _COLLECTION_CACHE.get_collections(
+            client.url, client.get_available_collections
+        )
+    ]
 
     if collection_id in available_ids:
         return True
@@ -1,5 +1,11 @@
+import time
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Optional
+
+from shapely.geometry import box, shape
+
+from ... import metrics
+from .spatial import BBoxIndex, cluster_bboxes
 
 
 class BaseSTACClient(ABC):
@@ -38,6 +44,69 @@ class BaseSTACClient(ABC):
         }
         return self.aoi_geojson
 
+    def iter_search(
+        self,
+        aoi,
+        product,
+        datetime_range,
+        filters,
+        max_items: Optional[int],
+        page_size: int = 100,
+        count: bool = False,
+    ) -> Iterator[Any]:
+        """
+        Stream STAC Items page by page instead of materialising the whole result.
+
+        Items are yielded as soon as their page arrives, so callers can start
+        downloading while later pages are still being fetched. Statistics for the
+        running search are kept in `self.last_search_stats`: `pages`, `items`,
+        `page_seconds` (fetch latency of each page, excluding time spent by the
+        consumer) and `matched` (total hits reported by the API when `count=True`).
+
+        Args:
+            aoi (List[float]): Bounding box as [min_lon, min_lat, max_lon, max_lat].
+            product (str): Collection or product name.
+            datetime_range (str): ISO8601 datetime or range (e.g., "2023-01-01/2023-02-01").
+            filters (Dict[str, Any]): Additional query filters.
+            max_items (int, optional): Maximum number of items to yield (None for all).
+            page_size (int): Number of items requested per page.
+            count (bool): Ask the API for the total number of matches (one extra request).
+
+        Yields:
+            STAC Items matching the search.
+        """
+        if aoi:
+            self.aoi_geojson = self.create_aoi_geojson_from_aoi(aoi)
+
+        item_search = self.client.search(
+            collections=[product],
+            datetime=datetime_range,
+            # intersects=self.aoi_geojson,
+            bbox=aoi,
+            query=filters,
+            max_items=max_items,
+            limit=page_size,
+        )
+
+        stats = {"pages": 0, "items": 0, "page_seconds": [], "matched": None}
+        self.last_search_stats = stats
+        if count:
+            stats["matched"] = item_search.matched()
+
+        pages = item_search.pages()
+        while True:
+            start = time.perf_counter()
+            page = next(pages, None)
+            if page is None:
+                break
+            stats["pages"] += 1
+            stats["items"] += len(page.items)
+            stats["page_seconds"].append(time.perf_counter() - start)
+            metrics.observe("stac_page", stats["page_seconds"][-1])
+            metrics.inc("stac_items", len(page.items))
+            yield from page.items
+
+    @metrics.timed("stac_search")
     def search(self, aoi, product, datetime_range, filters, max_items):
         """
         Search the STAC API for items intersecting the specified AOI,
@@ -52,20 +121,83 @@ class BaseSTACClient(ABC):
         Returns:
             List[Any]: List of matching STAC Items (up to max_items=1).
         """
-        if aoi:
-            self.aoi_geojson = self.create_aoi_geojson_from_aoi(aoi)
-
         return list(
-            self.client.search(
-                collections=[product],
-                datetime=datetime_range,
-                # intersects=self.aoi_geojson,
-                bbox=aoi,
-                query=filters,
+            self.iter_search(
+                aoi=aoi,
+                product=product,
+                datetime_range=datetime_range,
+                filters=filters,
                 max_items=max_items,
-            ).get_items()
+            )
         )
 
+    @metrics.timed("stac_search_many")
+    def search_many(
+        self,
+        aois: Dict[str, List[float]],
+        product,
+        datetime_range,
+        filters,
+        max_items: Optional[int],
+        max_cluster_extent: float = 1.0,
+        page_size: int = 100,
+    ) -> Dict[str, List[Any]]:
+        """
+        Search for many AOIs at once and assign each returned item to every AOI it intersects.
+
+        Nearby AOIs are merged into a few clustered extents, each searched once, so
+        neighbouring ports sharing the same scenes do not fetch them again. Results
+        are mapped back to AOIs with an in-memory grid index on the item bboxes, then
+        checked against the item footprint, as a per-AOI search would be.
+
+        Args:
+            aois (Dict[str, List[float]]): Bounding box per key (e.g. port name).
+            product (str): Collection or product name.
+            datetime_range (str): ISO8601 datetime or range (e.g., "2023-01-01/2023-02-01").
+            filters (Dict[str, Any]): Additional query filters.
+            max_items (int, optional): Maximum number of items per AOI (None for all).
+            max_cluster_extent (float): Maximum width/height in degrees of a merged search extent.
+            page_size (int): Number of items requested per page.
+
+        Returns:
+            Dict[str, List[Any]]: Matching STAC Items per AOI key, in API order.
+        """
+        results: Dict[str, List[Any]] = {key: [] for key in aois}
+        index = BBoxIndex(aois, cell_size=max_cluster_extent)
+        clusters = cluster_bboxes(aois, max_cluster_extent)
+        search_stats = []
+
+        for extent, members in clusters:
+            open_members = set(members)
+            for item in self.iter_search(
+                aoi=extent,
+                product=product,
+                datetime_range=datetime_range,
+                filters=filters,
+                max_items=None,
+                page_size=page_size,
+            ):
+                footprint = shape(item.geometry) if item.geometry else None
+                for key in index.query(item.bbox):
+                    if footprint is not None and not footprint.intersects(box(*aois[key])):
+                        continue
+                    if max_items is None or len(results[key]) < max_items:
+                        if all(existing.id != item.id for existing in results[key]):
+                            results[key].append(item)
+                    if max_items is not None and len(results[key]) >= max_items:
+                        open_members.discard(key)
+                if max_items is not None and not open_members:
+                    break
+            search_stats.append(self.last_search_stats)
+
+        self.last_search_many_stats = {
+            "aois": len(aois),
+            "searches": len(clusters),
+            "pages": sum(stats["pages"] for stats in search_stats),
+            "items": sum(stats["items"] for stats in search_stats),
+        }
+        return results
+
     def get_available_collections(self) -> List[str]:
         try:
             return [collection.id for collection in self.client.get_collections()]
@@ -0,0 +1,118 @@
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from ... import metrics
+
+
+def _default_cache_dir() -> str:
+    return os.environ.get(
+        "STAC_CACHE_DIR", os.path.join(tempfile.gettempdir(), "data-platform-stac-cache")
+    )
+
+
+class CollectionCatalogCache:
+    def __init__(self, cache_dir: Optional[str] = None, ttl_seconds: Optional[float] = None):
+        """
+        TTL cache of the collection ids offered by each STAC endpoint.
+
+        Entries are kept in memory and mirrored to a JSON file, so every task
+        running on the same node (sharing `cache_dir`) reuses one fetch per TTL.
+
+        Args:
+            cache_dir (str, optional): Directory of the shared cache file. Defaults to
+                `STAC_CACHE_DIR` or a directory under the system temp dir.
+            ttl_seconds (float, optional): Entry lifetime. Defaults to
+                `STAC_COLLECTIONS_TTL` or one hour.
+        """
+        self.cache_dir = cache_dir or _default_cache_dir()
+        self.ttl_seconds = (
+            ttl_seconds
+            if ttl_seconds is not None
+            else float(os.environ.get("STAC_COLLECTIONS_TTL", 3600))
+        )
+        self.cache_path = os.path.join(self.cache_dir, "stac_collections.json")
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, entry: Optional[Dict]) -> bool:
+        return bool(entry) and time.time() - entry["fetched_at"] < self.ttl_seconds
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(f"{self.cache_path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_file(self) -> Dict[str, Dict]:
+        try:
+            with open(self.cache_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_file(self, entries: Dict[str, Dict]) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def get_collections(self, endpoint: str, fetch: Callable[[], List[str]]) -> List[str]:
+        """
+        Returns the collection ids of an endpoint, calling `fetch` only on a cache miss.
+
+        Args:
+            endpoint (str): STAC API root URL, used as cache key.
+            fetch (Callable): Returns the endpoint's collection ids.
+
+        Returns:
+            List[str]: Collection ids.
+        """
+        with self._lock:
+            entry = self._entries.get(endpoint)
+            if self._is_fresh(entry):
+                metrics.inc("stac_collection_cache_hits")
+                return entry["collections"]
+
+            try:
+                with self._file_lock():
+                    entries = self._read_file()
+                    entry = entries.get(endpoint)
+                    if not self._is_fresh(entry):
+                        metrics.inc("stac_collection_cache_misses")
+                        entry = {"fetched_at": time.time(), "collections": list(fetch())}
+                        entries[endpoint] = entry
+                        self._write_file(entries)
+                    else:
+                        metrics.inc("stac_collection_cache_hits")
+            except OSError as e:
+                print(f"Warning: STAC collection cache unavailable ({e}), fetching directly.")
+                metrics.inc("stac_collection_cache_misses")
+                entry = {"fetched_at": time.time(), "collections": list(fetch())}
+
+            self._entries[endpoint] = entry
+            return entry["collections"]
+
+    def invalidate(self, endpoint: Optional[str] = None) -> None:
+        """Drops one endpoint (or every endpoint) from the memory and disk caches."""
+        with self._lock:
+            if endpoint is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(endpoint, None)
+            try:
+                with self._file_lock():
+                    entries = self._read_file() if endpoint is not None else {}
+                    entries.pop(endpoint, None)
+                    self._write_file(entries)
+            except OSError:
+                pass
@@ -1,13 +1,33 @@
-import planetary_computer
+from typing import Dict, Optional
+
 from pystac_client import Client
 
 from .base import BaseSTACClient
+from .sas_cache import SASTokenCache, get_sas_token_cache
 
 
 class PlanetarySTACClient(BaseSTACClient):
-    def __init__(self, url: str):
-        self._client = Client.open(url, modifier=planetary_computer.sign_inplace)
+    def __init__(self, url: str, sas_cache: Optional[SASTokenCache] = None):
+        """
+        STAC client for the Planetary Computer.
+
+        Search results are signed with SAS tokens from `sas_cache` (by default the
+        process-wide cache, shared with other processes on the node through its
+        token file) rather than `planetary_computer.sign_inplace`, which keeps a
+        separate token cache per process and renews tokens only a minute before expiry.
+
+        Args:
+            url (str): STAC API URL.
+            sas_cache (SASTokenCache, optional): Token cache used for signing.
+        """
+        self.url = url
+        self.sas_cache = sas_cache or get_sas_token_cache()
+        self._client = Client.open(url, modifier=self.sas_cache.sign_inplace)
 
     @property
     def client(self):
         return self._client
+
+    def signing_stats(self) -> Dict:
+        """Hit rate and signing latency of the SAS token cache."""
+        return self.sas_cache.report()
@@ -0,0 +1,274 @@
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from ... import metrics
+from .catalog_cache import _default_cache_dir
+
+BLOB_STORAGE_DOMAIN = ".blob.core.windows.net"
+# Thumbnails and other public assets live in this account and must not be signed.
+PUBLIC_ACCOUNT = "ai4edatasetspublicassets"
+FSSPEC_OPTION_KEYS = ("table:storage_options", "xarray:storage_options")
+
+
+def _fetch_planetary_token(account: str, container: str) -> Tuple[str, float]:
+    """
+    Requests a SAS token from the Planetary Computer SAS API.
+
+    Returns:
+        Tuple[str, float]: The token and its expiry as a Unix timestamp.
+    """
+    import requests
+    from planetary_computer.sas import SASToken
+    from planetary_computer.settings import Settings
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    settings = Settings.get()
+    session = requests.Session()
+    session.mount(
+        "https://",
+        HTTPAdapter(max_retries=Retry(total=10, backoff_factor=0.8, status_forcelist=[429, 500, 502, 503, 504])),
+    )
+    response = session.get(
+        f"{settings.sas_url}/{account}/{container}",
+        headers={"Ocp-Apim-Subscription-Key": settings.subscription_key} if settings.subscription_key else None,
+        timeout=30,
+    )
+    response.raise_for_status()
+    token = SASToken(**response.json())
+    return token.token, token.expiry.timestamp()
+
+
+class SASTokenCache:
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        refresh_margin: Optional[float] = None,
+        fetch: Callable[[str, str], Tuple[str, float]] = _fetch_planetary_token,
+    ):
+        """
+        Cache of Planetary Computer SAS tokens, keyed by (storage account, container).
+
+        A token is reused until `refresh_margin` seconds before its expiry, so
+        signed hrefs handed to downloads stay valid for at least that long. Tokens
+        are kept in memory and mirrored to a JSON file (readable by the owner only),
+        so every task on a node shares one token per container instead of each
+        starting cold. Fetches are serialised per container within the process and
+        by a file lock across processes.
+
+        Args:
+            cache_dir (str, optional): Directory of the shared token file. Defaults to
+                `STAC_CACHE_DIR` or a directory under the system temp dir.
+            refresh_margin (float, optional): Seconds before expiry at which a token is
+                renewed. Defaults to `PC_SAS_REFRESH_MARGIN` or 600.
+            fetch (Callable): Returns (token, expiry timestamp) for (account, container).
+        """
+        self.cache_dir = cache_dir or _default_cache_dir()
+        self.refresh_margin = (
+            refresh_margin
+            if refresh_margin is not None
+            else float(os.environ.get("PC_SAS_REFRESH_MARGIN", 600))
+        )
+        self.cache_path = os.path.join(self.cache_dir, "pc_sas_tokens.json")
+        self.fetch = fetch
+        self._tokens: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self.stats = {
+            "hits": 0,
+            "file_hits": 0,
+            "fetches": 0,
+            "fetch_seconds": 0.0,
+            "signed_hrefs": 0,
+            "sign_calls": 0,
+            "sign_seconds": 0.0,
+        }
+
+    def _is_fresh(self, entry: Optional[Dict]) -> bool:
+        return bool(entry) and entry["expiry"] - time.time() > self.refresh_margin
+
+    def _count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.stats[name] += value
+
+    @contextmanager
+    def _file_lock(self):
+        """Holds the token file lock. Yields False when the cache directory is unusable."""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            lock_file = open(f"{self.cache_path}.lock", "w")
+        except OSError as e:
+            print(f"Warning: SAS token cache file unavailable ({e}), fetching directly.")
+            yield False
+            return
+        with lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_file(self) -> Dict[str, Dict]:
+        try:
+            with open(self.cache_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_file(self, entries: Dict[str, Dict]) -> None:
+        try:
+            # mkstemp creates the file with mode 0600, so tokens stay private to the user.
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({key: entry for key, entry in entries.items() if entry["expiry"] > time.time()}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Warning: could not write the SAS token cache file ({e}).")
+
+    def _fetch(self, account: str, container: str) -> Dict:
+        start = time.perf_counter()
+        token, expiry = self.fetch(account, container)
+        elapsed = time.perf_counter() - start
+        self._count("fetches")
+        self._count("fetch_seconds", elapsed)
+        metrics.inc("sas_token_misses")
+        metrics.observe("sas_token_fetch", elapsed)
+        return {"token": token, "expiry": expiry}
+
+    def get_token(self, account: str, container: str) -> str:
+        """
+        Returns a SAS token for a container, fetching one only when no cached token
+        is valid for at least `refresh_margin` more seconds.
+        """
+        key = f"{account}/{container}"
+        with self._lock:
+            entry = self._tokens.get(key)
+            if self._is_fresh(entry):
+                self.stats["hits"] += 1
+                metrics.inc("sas_token_hits")
+                return entry["token"]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another thread may have refreshed it while we waited.
+            entry = self._tokens.get(key)
+            if self._is_fresh(entry):
+                self._count("hits")
+                metrics.inc("sas_token_hits")
+                return entry["token"]
+
+            # Only cache file problems are handled here: fetch errors (requests'
+            # exceptions are OSErrors too) propagate to the caller.
+            with self._file_lock() as locked:
+                entries = self._read_file() if locked else {}
+                entry = entries.get(key)
+                if self._is_fresh(entry):
+                    self._count("file_hits")
+                    metrics.inc("sas_token_hits")
+                else:
+                    entry = self._fetch(account, container)
+                    if locked:
+                        entries[key] = entry
+                        self._write_file(entries)
+
+            with self._lock:
+                self._tokens[key] = entry
+            return entry["token"]
+
+    def sign_url(self, url: str) -> str:
+        """
+        Appends a SAS token to an Azure Blob Storage URL.
+
+        Other URLs, public assets and URLs that already carry a SAS are returned unchanged.
+        """
+        parsed = urlparse(url.rstrip("/"))
+        if not parsed.netloc.endswith(BLOB_STORAGE_DOMAIN) or parsed.netloc.startswith(f"{PUBLIC_ACCOUNT}."):
+            return url
+        if set(parse_qs(parsed.query)) & {"st", "se", "sp"}:
+            return url
+
+        account = parsed.netloc.split(".")[0]
+        path = parsed.path.lstrip("/").split("/", 1)
+        if len(path) < 2:
+            return url
+        self._count("signed_hrefs")
+        return f"{url}?{self.get_token(account, path[0])}"
+
+    def _sign_asset(self, asset: Dict[str, Any]) -> None:
+        """Signs an asset dict in place, including fsspec (abfs://) storage options."""
+        asset["href"] = self.sign_url(asset["href"])
+
+        options = next((asset[k] for k in FSSPEC_OPTION_KEYS if k in asset), None)
+        if options is None:
+            open_kwargs = asset.get("xarray:open_kwargs", {})
+            options = open_kwargs.get("storage_options") or open_kwargs.get("backend_kwargs", {}).get("storage_options")
+        if options and options.get("account_name") and asset["href"].startswith(("abfs://", "az://")):
+            options["credential"] = self.get_token(options["account_name"], urlparse(asset["href"]).netloc)
+
+    def sign_inplace(self, obj: Any) -> None:
+        """
+        Signs the assets of a pystac Item, ItemCollection or Collection, or of item /
+        FeatureCollection dicts, in place.
+
+        Drop-in replacement for `planetary_computer.sign_inplace` as a pystac-client
+        `modifier`: signing an item only needs one token per container from the cache.
+        """
+        start = time.perf_counter()
+        self._sign_object(obj)
+        elapsed = time.perf_counter() - start
+        self._count("sign_calls")
+        self._count("sign_seconds", elapsed)
+        metrics.observe("sas_sign", elapsed)
+
+    def _sign_object(self, obj: Any) -> None:
+        if isinstance(obj, dict):
+            for feature in obj.get("features", []):
+                self._sign_object(feature)
+            for asset in obj.get("assets", {}).values():
+                self._sign_asset(asset)
+            return
+
+        if hasattr(obj, "items") and not hasattr(obj, "assets"):
+            # ItemCollection
+            for item in obj:
+                self._sign_object(item)
+            return
+
+        for asset in getattr(obj, "assets", {}).values():
+            fields = {"href": asset.href, **asset.extra_fields}
+            self._sign_asset(fields)
+            asset.href = fields.pop("href")
+            asset.extra_fields.update(fields)
+
+    def report(self) -> Dict:
+        """
+        Returns the cache statistics with the hit rate (memory and file hits over
+        token lookups) and the mean latency of a fetch and of a signing call.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["file_hits"] + stats["fetches"]
+        stats["hit_rate"] = (stats["hits"] + stats["file_hits"]) / lookups if lookups else 0.0
+        stats["mean_fetch_seconds"] = stats["fetch_seconds"] / stats["fetches"] if stats["fetches"] else 0.0
+        stats["mean_sign_seconds"] = stats["sign_seconds"] / stats["sign_calls"] if stats["sign_calls"] else 0.0
+        return stats
+
+
+_SHARED_CACHE: Optional[SASTokenCache] = None
+_SHARED_CACHE_LOCK = threading.Lock()
+
+
+def get_sas_token_cache() -> SASTokenCache:
+    """Returns the process-wide SAS token cache."""
+    global _SHARED_CACHE
+    with _SHARED_CACHE_LOCK:
+        if _SHARED_CACHE is None:
+            _SHARED_CACHE = SASTokenCache()
+        return _SHARED_CACHE
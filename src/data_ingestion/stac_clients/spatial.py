@@ -0,0 +1,78 @@
+import math
+from collections import defaultdict
+from typing import Dict, Hashable, List, Sequence, Set, Tuple
+
+BBox = Sequence[float]
+
+
+def bbox_union(a: BBox, b: BBox) -> List[float]:
+    return [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+
+
+def bbox_intersects(a: BBox, b: BBox) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def cluster_bboxes(
+    bboxes: Dict[Hashable, BBox], max_extent: float
+) -> List[Tuple[List[float], List[Hashable]]]:
+    """
+    Greedily groups bounding boxes into clusters whose merged extent stays small.
+
+    A bbox joins the first cluster whose union with it is at most `max_extent`
+    degrees wide and high; otherwise it starts a new cluster.
+
+    Args:
+        bboxes: Mapping of key (e.g. port name) to [min_lon, min_lat, max_lon, max_lat].
+        max_extent (float): Maximum width/height in degrees of a merged cluster.
+
+    Returns:
+        List of (merged bbox, member keys).
+    """
+    clusters: List[Tuple[List[float], List[Hashable]]] = []
+    for key, bbox in sorted(bboxes.items(), key=lambda kv: (kv[1][0], kv[1][1])):
+        for i, (extent, members) in enumerate(clusters):
+            merged = bbox_union(extent, bbox)
+            if merged[2] - merged[0] <= max_extent and merged[3] - merged[1] <= max_extent:
+                clusters[i] = (merged, members + [key])
+                break
+        else:
+            clusters.append((list(bbox), [key]))
+    return clusters
+
+
+class BBoxIndex:
+    def __init__(self, bboxes: Dict[Hashable, BBox], cell_size: float = 1.0):
+        """
+        In-memory uniform grid index answering "which bboxes intersect this bbox".
+
+        Args:
+            bboxes: Mapping of key to [min_lon, min_lat, max_lon, max_lat].
+            cell_size (float): Grid cell size in degrees.
+        """
+        self.cell_size = cell_size
+        self.bboxes = dict(bboxes)
+        self._cells: Dict[Tuple[int, int], Set[Hashable]] = defaultdict(set)
+        for key, bbox in self.bboxes.items():
+            for cell in self._cells_for(bbox):
+                self._cells[cell].add(key)
+
+    def _cells_for(self, bbox: BBox):
+        x0, y0 = math.floor(bbox[0] / self.cell_size), math.floor(bbox[1] / self.cell_size)
+        x1, y1 = math.floor(bbox[2] / self.cell_size), math.floor(bbox[3] / self.cell_size)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield x, y
+
+    def query(self, bbox: BBox) -> List[Hashable]:
+        """Returns the keys whose bbox intersects `bbox`."""
+        cells_x = math.floor(bbox[2] / self.cell_size) - math.floor(bbox[0] / self.cell_size) + 1
+        cells_y = math.floor(bbox[3] / self.cell_size) - math.floor(bbox[1] / self.cell_size) + 1
+        if cells_x * cells_y > len(self.bboxes):
+            # A query larger than the whole index is cheaper as a plain scan.
+            return [key for key, other in self.bboxes.items() if bbox_intersects(other, bbox)]
+
+        candidates = set()
+        for cell in self._cells_for(bbox):
+            candidates |= self._cells.get(cell, set())
+        return [key for key in candidates if bbox_intersects(self.bboxes[key], bbox)]
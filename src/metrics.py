@@ -0,0 +1,243 @@
+import functools
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """
+        Process-wide counters and timed spans for the ingestion path.
+
+        Counters are plain running totals (bytes downloaded, range requests, pgSTAC
+        rows, cache hits, ...). Spans aggregate, per name, how often a block ran,
+        its total and maximum wall time and how many runs raised. Nested spans are
+        aggregated independently, so a parent's time includes its children's.
+
+        Everything is guarded by one lock and costs a `perf_counter` call and a
+        dict update per event, so it is cheap enough to leave on in production.
+        """
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {}
+        self.spans: Dict[str, Dict] = {}
+        self.started_at = time.time()
+
+    def inc(self, name: str, value: float = 1) -> None:
+        """Adds `value` to counter `name`."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float, error: bool = False) -> None:
+        """Records one run of span `name` that took `seconds`."""
+        with self._lock:
+            span = self.spans.get(name)
+            if span is None:
+                span = self.spans[name] = {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "errors": 0}
+            span["count"] += 1
+            span["seconds"] += seconds
+            span["max_seconds"] = max(span["max_seconds"], seconds)
+            span["errors"] += int(error)
+
+    @contextmanager
+    def span(self, name: str):
+        """
+        Times the enclosed block as one run of span `name`.
+
+        Example:
+            with metrics.span("cog_encode"):
+                cog_translate(...)
+        """
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, error)
+
+    def timed(self, name: Optional[str] = None) -> Callable:
+        """
+        Decorator timing every call of a function as span `name` (defaults to the function name).
+        """
+
+        def decorator(func: Callable) -> Callable:
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def snapshot(self) -> Dict:
+        """
+        Returns a JSON-serialisable copy of the current counters and spans.
+        """
+        with self._lock:
+            return {
+                "started_at": self.started_at,
+                "wall_seconds": time.time() - self.started_at,
+                "counters": dict(self.counters),
+                "spans": {name: dict(span) for name, span in self.spans.items()},
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters = {}
+            self.spans = {}
+            self.started_at = time.time()
+
+
+REGISTRY = MetricsRegistry()
+
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+span = REGISTRY.span
+timed = REGISTRY.timed
+snapshot = REGISTRY.snapshot
+reset = REGISTRY.reset
+
+
+def merge_snapshots(snapshots: Iterable[Optional[Dict]]) -> Dict:
+    """
+    Combines the snapshots of several tasks: counters and span totals are summed,
+    `max_seconds` keeps the largest value and `wall_seconds` the longest task.
+    """
+    merged = {"tasks": 0, "wall_seconds": 0.0, "counters": {}, "spans": {}}
+    for snap in snapshots:
+        if not snap:
+            continue
+        merged["tasks"] += snap.get("tasks", 1)
+        merged["wall_seconds"] = max(merged["wall_seconds"], snap.get("wall_seconds", 0.0))
+        for name, value in snap.get("counters", {}).items():
+            merged["counters"][name] = merged["counters"].get(name, 0) + value
+        for name, span_stats in snap.get("spans", {}).items():
+            total = merged["spans"].setdefault(
+                name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "errors": 0}
+            )
+            total["count"] += span_stats["count"]
+            total["seconds"] += span_stats["seconds"]
+            total["max_seconds"] = max(total["max_seconds"], span_stats["max_seconds"])
+            total["errors"] += span_stats["errors"]
+    return merged
+
+
+def format_summary(snap: Dict) -> str:
+    """
+    Renders a snapshot as a table of spans (slowest first) followed by the counters.
+    """
+    lines = [f"{'span':<28} {'count':>7} {'seconds':>10} {'mean':>9} {'max':>9} {'errors':>7}"]
+    for name, s in sorted(snap.get("spans", {}).items(), key=lambda kv: -kv[1]["seconds"]):
+        mean = s["seconds"] / s["count"] if s["count"] else 0.0
+        lines.append(
+            f"{name:<28} {s['count']:>7} {s['seconds']:>10.3f} {mean:>9.3f} {s['max_seconds']:>9.3f} {s['errors']:>7}"
+        )
+    for name, value in sorted(snap.get("counters", {}).items()):
+        lines.append(f"{name:<28} {value:>18,.0f}")
+    return "\n".join(lines)
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in sorted(labels.items()):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{_metric_name(key)}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def to_prometheus(snap: Dict, labels: Optional[Dict[str, str]] = None, prefix: str = "ingest") -> str:
+    """
+    Renders a snapshot in the Prometheus text exposition format.
+
+    Counters become `<prefix>_<name>_total`; spans become `<prefix>_span_seconds_total`,
+    `<prefix>_span_runs_total`, `<prefix>_span_errors_total` and
+    `<prefix>_span_max_seconds`, labelled with `span="<name>"`.
+
+    Args:
+        snap (dict): Snapshot from `snapshot()` or `merge_snapshots()`.
+        labels (dict, optional): Labels added to every sample (e.g. flow, step, task).
+        prefix (str): Metric name prefix.
+    """
+    labels = labels or {}
+    lines = []
+    for name, value in sorted(snap.get("counters", {}).items()):
+        metric = f"{prefix}_{_metric_name(name)}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_labels(labels)} {value}")
+
+    span_metrics = [
+        ("span_seconds_total", "counter", "seconds"),
+        ("span_runs_total", "counter", "count"),
+        ("span_errors_total", "counter", "errors"),
+        ("span_max_seconds", "gauge", "max_seconds"),
+    ]
+    spans = snap.get("spans", {})
+    for suffix, metric_type, field in span_metrics:
+        if not spans:
+            break
+        metric = f"{prefix}_{suffix}"
+        lines.append(f"# TYPE {metric} {metric_type}")
+        for name, s in sorted(spans.items()):
+            lines.append(f"{metric}{_labels({**labels, 'span': name})} {s[field]}")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(
+    snap: Dict, path: str, labels: Optional[Dict[str, str]] = None
+) -> str:
+    """
+    Writes a snapshot atomically, as JSON for `.json` paths and otherwise in the
+    Prometheus textfile format (e.g. for node_exporter's textfile collector,
+    which expects a `.prom` extension).
+
+    Returns:
+        str: The written path.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    if path.endswith(".json"):
+        content = json.dumps({**snap, "labels": labels or {}}, indent=2)
+    else:
+        content = to_prometheus(snap, labels)
+
+    # node_exporter must never read a half-written file.
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return path
+
+
+def export_task_metrics(
+    metrics_dir: Optional[str], name: str, labels: Optional[Dict[str, str]] = None
+) -> Dict:
+    """
+    Snapshots the registry and, when `metrics_dir` is set, writes it there as
+    `<name>.prom` and `<name>.json`.
+
+    Returns:
+        Dict: The snapshot, to be stored as a flow artifact.
+    """
+    snap = snapshot()
+    if metrics_dir:
+        base = os.path.join(metrics_dir, _metric_name(name))
+        write_metrics(snap, f"{base}.prom", labels)
+        write_metrics(snap, f"{base}.json", labels)
+        print(f"Metrics written to {base}.prom / .json")
+    return snap
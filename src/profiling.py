@@ -0,0 +1,282 @@
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+PROFILE_ENV = "INGEST_PROFILE"
+PROFILE_DIR_ENV = "INGEST_PROFILE_DIR"
+PROFILE_INTERVAL_ENV = "INGEST_PROFILE_INTERVAL"
+MODES = ("cprofile", "sample")
+
+
+def profile_mode() -> Optional[str]:
+    """
+    Returns the profiling mode selected by `INGEST_PROFILE`, or None when profiling is off.
+
+    `cprofile` runs the deterministic profiler, `sample` a low-overhead stack sampler
+    covering every thread. Unset, empty, "0", "off" or "false" disable profiling.
+    """
+    value = os.environ.get(PROFILE_ENV, "").strip().lower()
+    if value in ("", "0", "off", "false"):
+        return None
+    if value not in MODES:
+        logging.warning(f"Unknown {PROFILE_ENV}={value!r}, expected one of {MODES}; profiling disabled")
+        return None
+    return value
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.01):
+        """
+        Statistical profiler sampling the Python stacks of all threads.
+
+        Every `interval` seconds a background thread records the current stack of
+        each other thread. Stacks are kept in the collapsed format used by
+        flamegraph.pl and speedscope (`thread;frame;frame count`), so the output
+        can be rendered as a flame graph directly.
+
+        Args:
+            interval (float): Seconds between samples.
+        """
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            frames.append(names.get(thread_id, str(thread_id)).replace(";", "_"))
+            self.stacks[";".join(reversed(frames))] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        """Returns the stacks in collapsed format, one `stack count` line each."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def summary(self, limit: int = 25) -> str:
+        """Top frames by inclusive and by self samples."""
+        inclusive: Counter = Counter()
+        leaf: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            for frame in set(frames):
+                inclusive[frame] += count
+            if frames:
+                leaf[frames[-1]] += count
+
+        lines = [f"{self.samples} samples every {self.interval * 1000:.0f} ms", "", "inclusive:"]
+        lines += [f"{count:>8}  {frame}" for frame, count in inclusive.most_common(limit)]
+        lines += ["", "self:"]
+        lines += [f"{count:>8}  {frame}" for frame, count in leaf.most_common(limit)]
+        return "\n".join(lines)
+
+
+class ProfileSession:
+    def __init__(self, mode: str, name: str):
+        """
+        State of one profiled run (typically one Metaflow step).
+
+        Besides the profiler itself it aggregates the wall time of every call to a
+        `profile_method`-wrapped function, from any thread.
+        """
+        self.mode = mode
+        self.name = name
+        self.method_calls: Dict[str, Dict] = {}
+        self.worker_stats: Optional[pstats.Stats] = None
+        self._lock = threading.Lock()
+
+    def record_call(self, name: str, seconds: float) -> None:
+        with self._lock:
+            calls = self.method_calls.setdefault(name, {"count": 0, "seconds": 0.0})
+            calls["count"] += 1
+            calls["seconds"] += seconds
+
+    def add_worker_profile(self, profiler: cProfile.Profile) -> None:
+        with self._lock:
+            if self.worker_stats is None:
+                self.worker_stats = pstats.Stats(profiler)
+            else:
+                self.worker_stats.add(profiler)
+
+
+_SESSION: Optional[ProfileSession] = None
+_local = threading.local()
+
+
+@contextmanager
+def profiling(name: str, output_dir: Optional[str] = None, mode: Optional[str] = None):
+    """
+    Profiles the enclosed block and writes the results to `output_dir`.
+
+    In `cprofile` mode the result is `<name>.prof` (open with snakeviz, or turn into
+    a flame graph with flameprof) plus a text summary. In `sample` mode it is
+    `<name>.collapsed`, ready for flamegraph.pl or speedscope, plus a summary.
+
+    Yields:
+        Dict: Filled on exit with `mode`, `name`, `seconds`, `summary`, `method_calls`,
+        `collapsed` (sample mode only) and `files`.
+    """
+    global _SESSION
+    mode = mode or profile_mode()
+    result: Dict = {"mode": mode, "name": name, "files": []}
+    if mode is None:
+        yield result
+        return
+
+    session = ProfileSession(mode, name)
+    _SESSION = session
+    profiler = None
+    sampler = None
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        _local.active = True
+    else:
+        sampler = SamplingProfiler(float(os.environ.get(PROFILE_INTERVAL_ENV, 0.01))).start()
+
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["seconds"] = time.perf_counter() - start
+        _SESSION = None
+        if profiler is not None:
+            profiler.disable()
+            _local.active = False
+            stats = pstats.Stats(profiler)
+            if session.worker_stats is not None:
+                stats.add(session.worker_stats)
+            stream = io.StringIO()
+            stats.stream = stream
+            stats.sort_stats("cumulative").print_stats(40)
+            result["summary"] = stream.getvalue()
+        else:
+            sampler.stop()
+            result["summary"] = sampler.summary()
+            result["collapsed"] = sampler.collapsed()
+        result["method_calls"] = session.method_calls
+
+        if output_dir:
+            try:
+                os.makedirs(output_dir, exist_ok=True)
+                base = os.path.join(output_dir, name)
+                if profiler is not None:
+                    stats.dump_stats(f"{base}.prof")
+                    result["files"].append(f"{base}.prof")
+                else:
+                    with open(f"{base}.collapsed", "w") as f:
+                        f.write(result["collapsed"])
+                    result["files"].append(f"{base}.collapsed")
+                with open(f"{base}.txt", "w") as f:
+                    f.write(result["summary"])
+                result["files"].append(f"{base}.txt")
+                print(f"Profile of {name} written to {base}.*")
+            except OSError as e:
+                print(f"Warning: could not write profile of {name} to {output_dir}: {e}")
+
+
+def profile_method(func: Callable) -> Callable:
+    """
+    Decorator for downloader methods that may run on worker threads.
+
+    When profiling is off at import time the function is returned unchanged, so
+    there is no overhead at all. Otherwise calls made during a profiling session
+    are timed per method; in `cprofile` mode a call on a thread the session's
+    profiler does not cover (Python < 3.12) gets its own profiler, merged into the
+    session's profile when it returns.
+    """
+    if profile_mode() is None:
+        return func
+
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        session = _SESSION
+        if session is None:
+            return func(*args, **kwargs)
+
+        profiler = None
+        if session.mode == "cprofile" and not getattr(_local, "active", False):
+            try:
+                profiler = cProfile.Profile()
+                profiler.enable()
+                _local.active = True
+            except ValueError:
+                # Python 3.12+ profiles every thread from the session's profiler.
+                profiler = None
+
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            session.record_call(name, time.perf_counter() - start)
+            if profiler is not None:
+                profiler.disable()
+                _local.active = False
+                session.add_worker_profile(profiler)
+
+    return wrapper
+
+
+def profile_step(func: Callable) -> Callable:
+    """
+    Decorator for Metaflow steps, placed below `@step`.
+
+    With `INGEST_PROFILE` set, the step runs inside `profiling()`. The result is
+    stored as the `profile` artifact, and the files go to `INGEST_PROFILE_DIR`,
+    or to `<metadata_path>/profiles` when that is not set. Without it the step
+    function is returned unchanged.
+    """
+    if profile_mode() is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        try:
+            from metaflow import current
+
+            name = f"{current.flow_name}_{current.run_id}_{func.__name__}_{current.task_id}"
+        except Exception:
+            name = f"{func.__name__}_{os.getpid()}_{int(time.time())}"
+
+        output_dir = os.environ.get(PROFILE_DIR_ENV) or os.path.join(
+            getattr(self, "metadata_path", "."), "profiles"
+        )
+        with profiling(name, output_dir) as result:
+            func(self, *args, **kwargs)
+        self.profile = result
+
+    return wrapper
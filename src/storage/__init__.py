@@ -0,0 +1,15 @@
+def get_storage(storage_type: str = "local"):
+    """
+    Returns a storage backend by name ("local" or "gcs").
+
+    The GCS backend is imported lazily so local runs don't need google-cloud-storage.
+    """
+    if storage_type == "local":
+        from .local_utils import LocalStorage
+
+        return LocalStorage()
+    if storage_type == "gcs":
+        from .gcs_utils import GCSStorage
+
+        return GCSStorage()
+    raise ValueError(f"Unknown storage type: {storage_type}")
@@ -1,26 +1,121 @@
+import io
 import os
+import time
+from typing import Dict, List, Tuple
 from urllib.parse import urlparse
 
 from google.cloud import storage
+from google.cloud.storage import transfer_manager
+from requests.adapters import HTTPAdapter
 
+from .. import metrics
+
+MiB = 1024 * 1024
 
 
 class GCSStorage:
-    def __init__(self):
+    def __init__(self, max_workers: int = 16, chunk_size: int = 16 * MiB):
+        """
+        Google Cloud Storage backend.
+
+        Args:
+            max_workers (int): Parallel uploads in `save_files`; also sizes the client's
+                connection pool so the workers don't queue on connections.
+            chunk_size (int): Resumable upload chunk size. Objects larger than this are
+                uploaded in chunks (must be a multiple of 256 KiB).
+        """
         key_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
         if not key_path:
             raise ValueError("GOOGLE_APPLICATION_CREDENTIALS env var not set")
         self.client = storage.Client.from_service_account_json(key_path)
+        self.client._http.mount(
+            "https://", HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        )
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
 
-    def save_file(self, local_path: str, gcs_url: str) -> str:
+    def _blob(self, gcs_url: str) -> storage.Blob:
         parsed = urlparse(gcs_url)
         bucket = self.client.bucket(parsed.netloc)
-        blob = bucket.blob(parsed.path.lstrip("/"))
-        blob.upload_from_filename(local_path)
-        print(f"Uploaded to GCS: {gcs_url}")
+        return bucket.blob(parsed.path.lstrip("/"), chunk_size=self.chunk_size)
+
+    @staticmethod
+    def _remove_local(local_path: str) -> None:
         try:
             os.remove(local_path)
             print(f"Local file '{local_path}' deleted after upload.")
         except OSError as e:
             print(f"Warning: Failed to delete local file '{local_path}': {e}")
+
+    def save_file(self, local_path: str, gcs_url: str) -> str:
+        blob = self._blob(gcs_url)
+        with metrics.span("gcs_upload"):
+            blob.upload_from_filename(local_path)
+        metrics.inc("bytes_uploaded", os.path.getsize(local_path))
+        print(f"Uploaded to GCS: {gcs_url}")
+        self._remove_local(local_path)
+        return gcs_url
+
+    def save_files(
+        self, pairs: List[Tuple[str, str]], delete_local: bool = True
+    ) -> List[Dict]:
+        """
+        Uploads many local files in parallel.
+
+        Args:
+            pairs: (local_path, gcs_url) tuples.
+            delete_local (bool): Delete each local file once it is uploaded.
+
+        Returns:
+            List[Dict]: One result per pair, in input order, with `local_path`,
+            `target`, `bytes` and `error` (None on success).
+        """
+        pairs = list(pairs)
+        if not pairs:
+            return []
+
+        start = time.perf_counter()
+        outcomes = transfer_manager.upload_many(
+            [(local_path, self._blob(gcs_url)) for local_path, gcs_url in pairs],
+            worker_type=transfer_manager.THREAD,
+            max_workers=self.max_workers,
+            raise_exception=False,
+        )
+
+        results = []
+        total_bytes = 0
+        for (local_path, gcs_url), outcome in zip(pairs, outcomes):
+            error = outcome if isinstance(outcome, Exception) else None
+            size = None
+            if error is None:
+                size = os.path.getsize(local_path)
+                total_bytes += size
+                if delete_local:
+                    self._remove_local(local_path)
+            else:
+                print(f"Failed to upload {local_path} to {gcs_url}: {error}")
+            results.append(
+                {"local_path": local_path, "target": gcs_url, "bytes": size, "error": error}
+            )
+
+        elapsed = time.perf_counter() - start
+        metrics.observe("gcs_upload_batch", elapsed)
+        metrics.inc("bytes_uploaded", total_bytes)
+        print(
+            f"Uploaded {sum(r['error'] is None for r in results)}/{len(pairs)} files "
+            f"({total_bytes / MiB:.1f} MiB) to GCS in {elapsed:.2f}s"
+        )
+        return results
+
+    def save_bytes(
+        self, data: bytes, gcs_url: str, content_type: str = "image/tiff"
+    ) -> str:
+        """
+        Uploads an in-memory object (e.g. an encoded COG) without a local file.
+        """
+        blob = self._blob(gcs_url)
+        with metrics.span("gcs_upload"):
+            blob.upload_from_file(io.BytesIO(data), size=len(data), content_type=content_type)
+        metrics.inc("bytes_uploaded", len(data))
+        print(f"Uploaded to GCS: {gcs_url}")
         return gcs_url
@@ -0,0 +1,154 @@
+import csv
+import io
+import time
+from typing import Dict, Iterable, List, Optional
+
+import psycopg2
+
+COLUMNS = ("item_id", "port", "asset", "filepath", "bytes", "seconds")
+
+
+class IngestionLogWriter:
+    def __init__(self, dsn: str, table: str = "ingestion_log"):
+        """
+        Bulk writer for the ingestion log, one row per (item_id, port, asset).
+
+        Records are streamed with COPY into a temporary staging table and merged
+        into the log with a single INSERT ... ON CONFLICT, in one transaction.
+
+        Args:
+            dsn (str): PostgreSQL connection string.
+            table (str): Name of the log table.
+        """
+        self.dsn = dsn
+        self.table = table
+        self.last_write_stats: Optional[Dict] = None
+
+    @staticmethod
+    def rows_from_downloads(downloads: Iterable[Optional[Dict]]) -> List[tuple]:
+        """
+        Flattens `download_items` results into one log row per downloaded asset.
+        """
+        rows = []
+        for rec in downloads:
+            if not rec:
+                continue
+            for asset in rec.get("downloaded_assets", []):
+                rows.append((
+                    rec["item_id"],
+                    rec.get("port") or "",
+                    asset["asset"],
+                    asset.get("filepath"),
+                    asset.get("bytes"),
+                    asset.get("seconds"),
+                ))
+        return rows
+
+    def ensure_table(self, cur) -> None:
+        """
+        Creates the log table, or migrates the old (item_id PRIMARY KEY, port) layout.
+        """
+        cur.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                item_id TEXT NOT NULL,
+                port TEXT NOT NULL DEFAULT '',
+                asset TEXT NOT NULL DEFAULT '',
+                filepath TEXT,
+                bytes BIGINT,
+                seconds DOUBLE PRECISION,
+                ingested_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (item_id, port, asset)
+            )
+            """
+        )
+
+        cur.execute(
+            """
+            SELECT c.conname, array_agg(a.attname::text ORDER BY a.attname)
+            FROM pg_constraint c
+            JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = ANY(c.conkey)
+            WHERE c.conrelid = to_regclass(%s) AND c.contype = 'p'
+            GROUP BY c.conname
+            """,
+            (self.table,),
+        )
+        primary_key = cur.fetchone()
+        if primary_key and sorted(primary_key[1]) == ["asset", "item_id", "port"]:
+            return
+
+        print(f"Migrating {self.table} to a (item_id, port, asset) primary key.")
+        cur.execute(
+            f"""
+            ALTER TABLE {self.table}
+                ADD COLUMN IF NOT EXISTS asset TEXT NOT NULL DEFAULT '',
+                ADD COLUMN IF NOT EXISTS filepath TEXT,
+                ADD COLUMN IF NOT EXISTS bytes BIGINT,
+                ADD COLUMN IF NOT EXISTS seconds DOUBLE PRECISION,
+                ADD COLUMN IF NOT EXISTS ingested_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            """
+        )
+        cur.execute(f"UPDATE {self.table} SET port = '' WHERE port IS NULL")
+        cur.execute(
+            f"ALTER TABLE {self.table} ALTER COLUMN port SET DEFAULT '', ALTER COLUMN port SET NOT NULL"
+        )
+        if primary_key:
+            cur.execute(f'ALTER TABLE {self.table} DROP CONSTRAINT "{primary_key[0]}"')
+        cur.execute(f"ALTER TABLE {self.table} ADD PRIMARY KEY (item_id, port, asset)")
+
+    def write(self, downloads: Iterable[Optional[Dict]]) -> int:
+        """
+        Writes the download results of a run to the log.
+
+        Args:
+            downloads: `download_items` results (None entries are ignored).
+
+        Returns:
+            int: Total number of rows in the log after the write.
+        """
+        rows = self.rows_from_downloads(downloads)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(["" if value is None else value for value in row])
+        buffer.seek(0)
+
+        columns = ", ".join(COLUMNS)
+        update = ", ".join(f"{col} = EXCLUDED.{col}" for col in COLUMNS[3:])
+
+        start = time.perf_counter()
+        with psycopg2.connect(self.dsn) as conn:
+            with conn.cursor() as cur:
+                self.ensure_table(cur)
+                merged = 0
+                if rows:
+                    cur.execute(
+                        f"""
+                        CREATE TEMP TABLE {self.table}_staging
+                        (LIKE {self.table} INCLUDING DEFAULTS) ON COMMIT DROP
+                        """
+                    )
+                    cur.copy_expert(
+                        f"COPY {self.table}_staging ({columns}) FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (port, asset))",
+                        buffer,
+                    )
+                    cur.execute(
+                        f"""
+                        INSERT INTO {self.table} ({columns})
+                        SELECT DISTINCT ON (item_id, port, asset) {columns}
+                        FROM {self.table}_staging
+                        ORDER BY item_id, port, asset
+                        ON CONFLICT (item_id, port, asset)
+                        DO UPDATE SET {update}, ingested_at = now()
+                        """
+                    )
+                    merged = cur.rowcount
+                cur.execute(f"SELECT COUNT(*) FROM {self.table}")
+                total = cur.fetchone()[0]
+        conn.close()
+
+        elapsed = time.perf_counter() - start
+        self.last_write_stats = {"rows": len(rows), "merged": merged, "seconds": elapsed}
+        print(f"Wrote {len(rows)} ingestion log rows ({merged} merged) in {elapsed:.3f}s")
+        return total
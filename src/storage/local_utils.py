@@ -1,4 +1,6 @@
 import os
+import tempfile
+from typing import Dict, List, Tuple
 
 
 
@@ -7,3 +9,31 @@ class LocalStorage:
         if not os.path.exists(local_path):
             raise FileNotFoundError(f"{local_path} does not exist.")
         return local_path
+
+    def save_files(
+        self, pairs: List[Tuple[str, str]], delete_local: bool = True
+    ) -> List[Dict]:
+        """
+        Same contract as `GCSStorage.save_files`; files already live on local disk.
+        """
+        results = []
+        for local_path, target_path in pairs:
+            error = None
+            size = None
+            try:
+                self.save_file(local_path, target_path)
+                size = os.path.getsize(local_path)
+            except OSError as e:
+                error = e
+            results.append(
+                {"local_path": local_path, "target": local_path, "bytes": size, "error": error}
+            )
+        return results
+
+    def save_bytes(self, data: bytes, target_path: str, content_type: str = "image/tiff") -> str:
+        os.makedirs(os.path.dirname(target_path) or ".", exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target_path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, target_path)
+        return target_path
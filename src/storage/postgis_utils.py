@@ -1,14 +1,35 @@
-from dotenv import load_dotenv
 import os
 
-load_dotenv()  # loads variables from .env
 
-user = os.getenv("PGSTAC_USER")
-password = os.getenv("PGSTAC_PASSWORD")
-host = os.getenv("PGSTAC_HOST")
-port = os.getenv("PGSTAC_PORT")
-db = os.getenv("PGSTAC_DB")
+def get_pgstac_dsn(load_env: bool = True) -> str:
+    """
+    Builds the pgSTAC connection string from the PGSTAC_* environment variables.
 
-dsn = f"postgresql://{user}:{password}@{host}:{port}/{db}"
+    Importing this module has no side effects; `.env` is only read when the DSN
+    is requested.
 
-print(dsn)
\ No newline at end of file
+    Args:
+        load_env (bool): Load variables from a `.env` file first (python-dotenv).
+
+    Returns:
+        str: postgresql:// DSN.
+    """
+    if load_env:
+        from dotenv import load_dotenv
+
+        load_dotenv()  # loads variables from .env
+
+    user = os.getenv("PGSTAC_USER")
+    password = os.getenv("PGSTAC_PASSWORD")
+    host = os.getenv("PGSTAC_HOST")
+    port = os.getenv("PGSTAC_PORT")
+    db = os.getenv("PGSTAC_DB")
+
+    return f"postgresql://{user}:{password}@{host}:{port}/{db}"
+
+
+def __getattr__(name: str):
+    # `postgis_utils.dsn` used to be computed (and printed) at import time.
+    if name == "dsn":
+        return get_pgstac_dsn()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,29 @@
+import logging
+
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+from benchmarks.synthetic import write_synthetic_cog
+from src.data_ingestion.geodata.cog_encoding import MemoryBudget, translate_to_cog
+from src.data_ingestion.geodata.cog_profiles import CODECS, PREDICTOR_CODECS, rio_cogeo_options
+
+
+@pytest.mark.parametrize("codec", sorted(CODECS))
+def test_predictor_is_only_set_for_codecs_that_use_it(codec):
+    dst_kwargs = rio_cogeo_options({"codec": codec, "predictor": 2}, "uint16")["dst_kwargs"]
+
+    assert ("predictor" in dst_kwargs) == (codec in PREDICTOR_CODECS)
+
+
+def test_uncompressed_encode_has_no_predictor_warning(tmp_path, caplog):
+    source = str(tmp_path / "B04.tif")
+    write_synthetic_cog(source, 256, 256, from_origin(500000, 5000000, 10, 10), "EPSG:32632")
+    target = str(tmp_path / "B04_cog.tif")
+
+    with caplog.at_level(logging.WARNING):
+        translate_to_cog(source, target, {"codec": "none"}, MemoryBudget(total_bytes=1024 ** 3))
+
+    assert not [r for r in caplog.records if "PREDICTOR" in r.getMessage()]
+    with rasterio.open(target) as dst:
+        assert dst.compression is None
@@ -0,0 +1,24 @@
+from src.data_ingestion.geodata.concurrent_downloader import ConcurrentAssetDownloader
+from src.data_ingestion.geodata.download_utils import STACAssetDownloaderUtils
+
+
+def test_failed_bbox_fallback_is_recorded_as_the_download_error(tmp_path, monkeypatch):
+    utils = STACAssetDownloaderUtils()
+
+    def direct_read_fails(*args, **kwargs):
+        raise IOError("direct read failed")
+
+    monkeypatch.setattr(utils, "_tile_cog_to_cog", direct_read_fails)
+    request = {
+        "item_id": "S2A_TEST",
+        "asset": "B04",
+        "url": str(tmp_path / "missing_B04.tif"),
+        "local_path": str(tmp_path / "S2A_TEST_B04.tif"),
+        "download_type": "bbox",
+        "aoi": [9.1, 45.1, 9.2, 45.2],
+    }
+
+    [result] = ConcurrentAssetDownloader(utils, max_workers=1).download([request])
+
+    assert isinstance(result["error"], RuntimeError)
+    assert "Failed to create bbox GeoTIFF" in str(result["error"])
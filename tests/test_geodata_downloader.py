@@ -0,0 +1,64 @@
+import os
+from datetime import datetime, timezone
+
+import pystac
+import pytest
+from rasterio.transform import from_origin
+
+from benchmarks.standins import RangeFileServer
+from benchmarks.synthetic import write_synthetic_cog
+from src.data_ingestion.geodata import geodata_downloader
+
+
+class FakeStorage:
+    def __init__(self):
+        self.saved = []
+
+    def save_files(self, pairs, delete_local=True):
+        self.saved.extend(pairs)
+        return [{"local_path": src, "target": target, "bytes": os.path.getsize(src), "error": None}
+                for src, target in pairs]
+
+
+class FakeSTACClient:
+    def __init__(self, items):
+        self.items = items
+        self.last_search_stats = {"pages": 0, "items": 0}
+
+    def iter_search(self, aoi, product, datetime_range, filters, max_items=None, page_size=100):
+        self.last_search_stats = {"pages": 1, "items": len(self.items)}
+        return iter(self.items)
+
+
+def make_item(item_id, href):
+    geometry = {"type": "Polygon", "coordinates": [[(9, 45), (10, 45), (10, 46), (9, 46), (9, 45)]]}
+    item = pystac.Item(item_id, geometry, [9, 45, 10, 46], datetime(2025, 1, 5, tzinfo=timezone.utc), {})
+    item.add_asset("B04", pystac.Asset(href, media_type=pystac.MediaType.COG))
+    return item
+
+
+@pytest.fixture
+def served_band(tmp_path):
+    write_synthetic_cog(str(tmp_path / "served" / "B04.tif"), 256, 256, from_origin(500000, 5000000, 10, 10), "EPSG:32632")
+    with RangeFileServer(str(tmp_path / "served")) as server:
+        yield f"{server.url}/B04.tif"
+
+
+def test_download_assets_stores_and_catalogs_each_band(tmp_path, monkeypatch, served_band):
+    storage = FakeStorage()
+    stac_client = FakeSTACClient([make_item("S2A_TEST", served_band)])
+    monkeypatch.setattr(geodata_downloader, "get_storage", lambda storage_type: storage)
+    monkeypatch.setattr(geodata_downloader, "get_stac_client_from_collection", lambda name: stac_client)
+
+    service = geodata_downloader.STACDownloaderService(
+        collection_name="sentinel-2-l2a",
+        output_dir=str(tmp_path / "raster"),
+        pgstac_dsn=None,
+        catalog_metadata_path=str(tmp_path / "catalog"),
+        storage_prefix="gs://bucket/raster",
+    )
+    service.download_assets(["B04"], [9.1, 45.1, 9.2, 45.2], "2025-01-01/2025-02-01", download_type="all")
+
+    assert [target for _, target in storage.saved] == ["gs://bucket/raster/S2A_TEST/S2A_TEST_B04_cog.tif"]
+    item_files = [f for _, _, files in os.walk(tmp_path / "catalog") for f in files if f.startswith("S2A_TEST")]
+    assert item_files
@@ -0,0 +1,109 @@
+from contextlib import contextmanager
+
+import pytest
+
+from src.data_ingestion.metadata import manager as manager_module
+from src.data_ingestion.metadata.manager import PgStacLoader, pgstac_item_id
+
+
+class FakePgstacDB:
+    """pgSTAC stand-in that, like pgstac.items, keeps one row per (collection, id)."""
+
+    def __init__(self):
+        self.rows = {}
+        self.fail_next_load = False
+
+    @contextmanager
+    def transaction(self):
+        yield
+
+    def connect(self):
+        return self
+
+    def query(self, sql, params):
+        collection, ids = params
+        for (row_collection, row_id), item in self.rows.items():
+            if row_collection == collection and row_id in ids:
+                yield row_id, list(item.get("assets", {}))
+
+
+class FakeLoader:
+    def __init__(self, db):
+        self.db = db
+
+    def load_items(self, items, insert_mode):
+        if self.db.fail_next_load:
+            self.db.fail_next_load = False
+            raise RuntimeError("connection lost")
+        for item in items:
+            self.db.rows[(item["collection"], item["id"])] = item
+
+
+@pytest.fixture
+def loader(monkeypatch):
+    db = FakePgstacDB()
+    monkeypatch.setattr(manager_module, "_get_pgstac_db", lambda dsn: db)
+    loader = PgStacLoader("postgresql://fake", batch_size=100)
+    loader._loader = FakeLoader(db)
+    return loader
+
+
+def make_item(scene_id, port, assets):
+    return {
+        "type": "Feature",
+        "id": scene_id,
+        "collection": "sentinel-2-l2a",
+        "properties": {"port_name": port},
+        "assets": {key: {"href": f"/data/{scene_id}_{port}_{key}.tif"} for key in assets},
+    }
+
+
+def test_ports_of_one_scene_are_kept_in_one_batch(loader):
+    loader.add_item(make_item("S2A_T31", "rotterdam", ["red"]))
+    loader.add_item(make_item("S2A_T31", "antwerp", ["red", "green"]))
+    loader.flush()
+
+    rows = loader._loader.db.rows
+    assert set(rows) == {
+        ("sentinel-2-l2a", "S2A_T31_rotterdam"),
+        ("sentinel-2-l2a", "S2A_T31_antwerp"),
+    }
+    assert rows[("sentinel-2-l2a", "S2A_T31_antwerp")]["properties"]["scene_id"] == "S2A_T31"
+
+
+def test_ports_of_one_scene_survive_separate_batches(loader):
+    loader.add_item(make_item("S2A_T31", "rotterdam", ["red"]))
+    loader.flush()
+    loader.add_item(make_item("S2A_T31", "antwerp", ["green"]))
+    loader.flush()
+
+    existing = loader.existing_assets(
+        "sentinel-2-l2a", [("S2A_T31", "rotterdam"), ("S2A_T31", "antwerp"), ("S2A_T31", "hamburg")]
+    )
+    assert existing == {("S2A_T31", "rotterdam"): {"red"}, ("S2A_T31", "antwerp"): {"green"}}
+
+
+def test_reloading_an_item_keeps_its_id(loader):
+    item = make_item("S2A_T31", "rotterdam", ["red"])
+    loader.add_item(item)
+    loader.flush()
+    reloaded = loader._loader.db.rows[("sentinel-2-l2a", "S2A_T31_rotterdam")]
+    loader.add_item(reloaded)
+    loader.flush()
+
+    assert list(loader._loader.db.rows) == [("sentinel-2-l2a", "S2A_T31_rotterdam")]
+
+
+def test_failed_flush_keeps_the_batch(loader):
+    loader.add_item(make_item("S2A_T31", "rotterdam", ["red"]))
+    loader._loader.db.fail_next_load = True
+    with pytest.raises(RuntimeError):
+        loader.flush()
+
+    assert loader.flush()["items"] == 1
+    assert ("sentinel-2-l2a", "S2A_T31_rotterdam") in loader._loader.db.rows
+
+
+def test_pgstac_item_id_without_port():
+    assert pgstac_item_id("S2A_T31", None) == "S2A_T31"
+    assert pgstac_item_id("S2A_T31", "Port of Spain/West") == "S2A_T31_Port_of_Spain_West"
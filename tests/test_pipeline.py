@@ -0,0 +1,44 @@
+import itertools
+import threading
+
+import pytest
+
+from src.data_ingestion.geodata.pipeline import StagedPipeline
+
+
+def double(record):
+    return {**record, "value": record["value"] * 2}
+
+
+def test_run_yields_every_record_through_every_stage():
+    pipeline = StagedPipeline([("double", double, 2), ("again", double, 1)], queue_size=2)
+
+    results = sorted(r["value"] for r in pipeline.run({"value": i} for i in range(10)))
+
+    assert results == [i * 4 for i in range(10)]
+    assert pipeline.last_stats["stages"]["double"]["records"] == 10
+
+
+def test_abandoned_run_stops_its_threads():
+    before = set(threading.enumerate())
+    pipeline = StagedPipeline([("double", double, 3), ("again", double, 2)], queue_size=2)
+
+    results = pipeline.run({"value": i} for i in itertools.count())
+    next(results)
+    results.close()
+
+    assert set(threading.enumerate()) - before == set()
+
+
+def test_input_error_is_raised_after_the_records_read_before_it():
+    def records():
+        yield {"value": 1}
+        raise RuntimeError("listing failed")
+
+    pipeline = StagedPipeline([("double", double, 1)])
+
+    seen = []
+    with pytest.raises(RuntimeError, match="listing failed"):
+        for record in pipeline.run(records()):
+            seen.append(record["value"])
+    assert seen == [2]
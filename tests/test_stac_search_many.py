@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+from shapely.geometry import box, mapping, shape
+
+from src.data_ingestion.stac_clients.base import BaseSTACClient
+
+
+class FakeSTACClient(BaseSTACClient):
+    def __init__(self, items):
+        self.items = items
+
+    @property
+    def client(self):
+        return None
+
+    def iter_search(self, aoi, product, datetime_range, filters, max_items=None, page_size=100):
+        self.last_search_stats = {"pages": 1, "items": len(self.items)}
+        for item in self.items:
+            if shape(item.geometry).intersects(box(*aoi)):
+                yield item
+
+
+def make_item(item_id, geometry):
+    return SimpleNamespace(id=item_id, geometry=mapping(geometry), bbox=list(geometry.bounds))
+
+
+# A tilted footprint: its bbox covers both ports, the footprint only covers "west".
+DIAGONAL = shape({"type": "Polygon", "coordinates": [[(0, 0), (0.2, 0), (1.0, 0.8), (1.0, 1.0), (0, 0.2), (0, 0)]]})
+PORTS = {"west": [0.05, 0.05, 0.1, 0.1], "north_east": [0.1, 0.8, 0.2, 0.9]}
+
+
+def test_search_many_matches_per_port_search():
+    client = FakeSTACClient([make_item("scene_a", DIAGONAL), make_item("scene_b", box(0, 0.7, 0.5, 1.0))])
+
+    batched = client.search_many(PORTS, "sentinel-2-l2a", None, None, max_items=None)
+    per_port = {
+        name: list(client.iter_search(bbox, "sentinel-2-l2a", None, None)) for name, bbox in PORTS.items()
+    }
+
+    assert {k: [i.id for i in v] for k, v in batched.items()} == {k: [i.id for i in v] for k, v in per_port.items()}
+    assert [i.id for i in batched["north_east"]] == ["scene_b"]